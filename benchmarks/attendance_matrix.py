@@ -0,0 +1,111 @@
+"""Attendance analytics over a member x snapshot matrix vs. a loop over materialised snapshots
+
+Defaults model a 1000-member session with 10k snapshots. The NumPy rows are only
+benchmarked when NumPy is installed.
+Run from the repo root with `python3 -m benchmarks.attendance_matrix`
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from typing import Callable
+
+import cogs.utils.constants as constants
+from benchmarks.snapshot_storage import generate_session
+from cogs.utils.attendance_matrix import (
+    NUMPY_AVAILABLE,
+    AttendanceMatrix,
+    sample_weights,
+)
+from cogs.utils.snapshot_log import SnapshotLog
+
+
+def loop_analytics(snapshots: list[list[int]], grace: int) -> None:
+    """Per-snapshot, per-member bookkeeping, the way a report would be built without the matrix"""
+    counts: dict[int, int] = {}
+    first_seen: dict[int, int] = {}
+    last_seen: dict[int, int] = {}
+    current_run: dict[int, int] = {}
+    longest: dict[int, int] = {}
+    for index, snapshot in enumerate(snapshots):
+        for member in snapshot:
+            counts[member] = counts.get(member, 0) + 1
+            first_seen.setdefault(member, index)
+            current_run[member] = current_run.get(member, 0) + 1 if last_seen.get(member) == index - 1 else 1  # fmt: skip
+            longest[member] = max(longest.get(member, 0), current_run[member])
+            last_seen[member] = index
+
+    for threshold in constants.REPORT_PASSING_THRESHOLDS:
+        [member for member, count in counts.items() if count / len(snapshots) >= threshold]  # fmt: skip
+    [member for member, first in first_seen.items() if first > grace]
+    [member for member, last in last_seen.items() if last < len(snapshots) - 1 - grace]
+
+
+def matrix_analytics(matrix: AttendanceMatrix, grace: int) -> None:
+    # On schedule apart from every hundredth tick, which ran an interval late
+    snapshot_times: list[float] = [index * 3.0 + index // 100 * 3.0 for index in range(matrix.num_snapshots)]  # fmt: skip
+    matrix.ratios()
+    matrix.weighted_ratios(sample_weights(snapshot_times, 3.0, constants.SNAPSHOT_MAX_WEIGHT_INTERVALS))  # fmt: skip
+    matrix.longest_presence()
+    matrix.late_joins(grace)
+    matrix.early_leaves(grace)
+    matrix.passing(constants.REPORT_PASSING_THRESHOLDS)
+
+
+def timed(function: Callable, repeat: int) -> float:
+    best: float = float("inf")
+    for _ in range(repeat):
+        start: float = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--members", type=int, default=1_000)
+    parser.add_argument("--snapshots", type=int, default=10_000)
+    parser.add_argument("--churn", type=float, default=0.0005)
+    parser.add_argument("--grace", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    session: list[list[int]] = generate_session(args.members, args.snapshots, args.churn)  # fmt: skip
+
+    with tempfile.TemporaryDirectory() as directory:
+        log: SnapshotLog = SnapshotLog(os.path.join(directory, "snapshots.log"))
+        for snapshot in session:
+            log.append(snapshot)
+
+        rows: list[tuple[str, float]] = [
+            ("read log + loop", timed(lambda: loop_analytics(log.read(), args.grace), args.repeat)),  # fmt: skip
+            ("loop (snapshots in memory)", timed(lambda: loop_analytics(session, args.grace), args.repeat)),  # fmt: skip
+        ]
+
+        num_snapshots, intervals = log.member_intervals()
+        row_types: list[tuple[str, bool]] = [("bitset", False)]
+        if NUMPY_AVAILABLE:
+            row_types.append(("numpy", True))
+        for name, use_numpy in row_types:
+
+            def read_and_analyse() -> None:
+                matrix_analytics(
+                    AttendanceMatrix.from_intervals(*log.member_intervals(), use_numpy),
+                    args.grace,
+                )
+
+            rows.append((f"read intervals + {name} matrix", timed(read_and_analyse, args.repeat)))  # fmt: skip
+            matrix: AttendanceMatrix = AttendanceMatrix.from_intervals(num_snapshots, intervals, use_numpy)  # fmt: skip
+            rows.append((f"{name} matrix analytics only", timed(lambda: matrix_analytics(matrix, args.grace), args.repeat)))  # fmt: skip
+
+    print(
+        f"{args.members} members, {args.snapshots} snapshots, "
+        f"churn {args.churn}/member/tick, NumPy {'available' if NUMPY_AVAILABLE else 'not installed'}\n"
+    )
+    for name, duration in rows:
+        print(f"{name:<36}{duration * 1_000:>11.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Build time and peak memory of the attendance CSV export for a very large class
+
+Run from the repo root with `python3 -m benchmarks.csv_export`
+"""
+
+import argparse
+import os
+import random
+import time
+import tracemalloc
+from typing import Callable
+
+import cogs.utils.constants as constants
+from cogs.utils.csv_export import export_attendance_csv
+from cogs.utils.member_attendance import MemberAttendance
+
+
+def generate_records(rows: int, seed: int = 0) -> list[MemberAttendance]:
+    rng: random.Random = random.Random(seed)
+    started_at: float = time.time() - 4 * 3600
+    records: list[MemberAttendance] = []
+    for _ in range(rows):
+        first: int = rng.randrange(4800)
+        last: int = rng.randrange(first, 4800)
+        records.append(
+            MemberAttendance(
+                member_id=rng.getrandbits(63),
+                in_attendance=(last - first) >= 2400,
+                attendance_ratio=(last - first + 1) / 4800,
+                snapshots=last - first + 1,
+                first_seen=started_at + first * 3,
+                last_seen=started_at + last * 3,
+            )
+        )
+    return records
+
+
+def concatenated_csv(records: list[MemberAttendance]) -> str:
+    """The pre-streaming export: `str +=` per row (and only two columns)"""
+    csv_str: str = "user_id,in_attendance\n"
+    for record in records:
+        csv_str += f"{record.member_id},{record.in_attendance}\n"
+    return csv_str
+
+
+def measure(function: Callable[[], object]) -> tuple[float, int]:
+    """Best of three untraced runs, then peak memory from a separate traced run"""
+    duration: float = float("inf")
+    for _ in range(3):
+        start: float = time.perf_counter()
+        function()
+        duration = min(duration, time.perf_counter() - start)
+
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return duration, peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs="+", default=[5_000, 50_000, 200_000])  # fmt: skip
+    args = parser.parse_args()
+
+    print(f"{'rows':>8}{'export':>26}{'time':>12}{'peak memory':>16}{'file size':>14}")
+    for rows in args.rows:
+        records: list[MemberAttendance] = generate_records(rows)
+        results: list[tuple[str, Callable[[], object]]] = [
+            ("str += (2 columns)", lambda: concatenated_csv(records)),
+            (
+                "streamed",
+                lambda: export_attendance_csv(
+                    records, constants.DEFAULT_ATTACHMENT_SIZE_LIMIT_BYTES
+                ),
+            ),  # fmt: skip
+            ("streamed, forced gzip", lambda: export_attendance_csv(records, 0)),
+        ]
+        for name, function in results:
+            duration, peak = measure(function)
+            output = function()
+            if isinstance(output, str):
+                size: int = len(output.encode())
+            else:
+                size: int = output[0].seek(0, os.SEEK_END)
+                output[0].close()
+            print(
+                f"{rows:>8}{name:>26}{duration * 1_000:>9.1f} ms"
+                f"{peak / 1024 / 1024:>12.2f} MiB{size / 1024 / 1024:>10.2f} MiB"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Event-loop lag while a large snapshot history is read, inline vs. through the storage worker
+
+A ticker coroutine sleeps for `--tick` ms in a loop and records how late it wakes up,
+which is how late the gateway heartbeat and every interaction would be too.
+Run from the repo root with `python3 -m benchmarks.event_loop_lag`
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from typing import Awaitable, Callable
+
+from benchmarks.snapshot_storage import generate_session
+from cogs.enums.storage_backend import StorageBackendType
+from cogs.storage.base import StorageBackend
+from cogs.storage.shelve_backend import ShelveBackend
+from cogs.storage.sqlite_backend import SqliteBackend
+from cogs.storage.worker import StorageWorker
+
+SESSION_ID: int = 1
+
+
+async def measure_lag(
+    work: Callable[[], Awaitable[None]], tick: float
+) -> tuple[float, list[float]]:
+    """Run `work` once alongside the ticker, returning its duration and every tick's lag"""
+    lags: list[float] = []
+    done: asyncio.Event = asyncio.Event()
+
+    async def ticker() -> None:
+        while not done.is_set():
+            start: float = time.perf_counter()
+            await asyncio.sleep(tick)
+            lags.append(time.perf_counter() - start - tick)
+
+    ticker_task: asyncio.Task = asyncio.create_task(ticker())
+    await asyncio.sleep(tick)  # Let the ticker get going
+    start: float = time.perf_counter()
+    await work()
+    duration: float = time.perf_counter() - start
+    done.set()
+    await ticker_task
+
+    return duration, lags
+
+
+def create_backend(backend_type: StorageBackendType, directory: str) -> StorageBackend:
+    if backend_type == StorageBackendType.SQLITE:
+        return SqliteBackend(os.path.join(directory, "database.sqlite3"))
+
+    return ShelveBackend(
+        os.path.join(directory, "database"), os.path.join(directory, "snapshots")
+    )
+
+
+async def run(args: argparse.Namespace, directory: str) -> None:
+    backend_type: StorageBackendType = StorageBackendType(args.backend)
+    num_snapshots: int = int(args.hours * 3600 / args.interval)
+
+    backend: StorageBackend = create_backend(backend_type, directory)
+    started_at: float = time.time()
+    for index, snapshot in enumerate(generate_session(args.members, num_snapshots, args.churn)):  # fmt: skip
+        backend.append_snapshot(SESSION_ID, snapshot, started_at + index * args.interval)  # fmt: skip
+    backend.close()
+
+    inline: StorageBackend = create_backend(backend_type, directory)
+
+    async def read_inline() -> None:
+        inline.read_snapshots(SESSION_ID)
+
+    worker: StorageWorker = StorageWorker(lambda: create_backend(backend_type, directory))  # fmt: skip
+
+    async def read_through_worker() -> None:
+        await worker.call("read_snapshots", SESSION_ID)
+
+    print(
+        f"{args.backend} backend, {args.members} members, {num_snapshots} snapshots, "
+        f"{args.tick * 1_000:.0f} ms ticker\n"
+    )
+    print(f"{'read':<16}{'duration':>14}{'max lag':>14}{'median lag':>14}")
+    for name, work in (("inline", read_inline), ("storage worker", read_through_worker)):  # fmt: skip
+        duration, lags = await measure_lag(work, args.tick)
+        print(
+            f"{name:<16}{duration * 1_000:>11.1f} ms{max(lags) * 1_000:>11.2f} ms"
+            f"{statistics.median(lags) * 1_000:>11.2f} ms"
+        )
+
+    inline.close()
+    await worker.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--backend", choices=[backend.value for backend in StorageBackendType], default="shelve")  # fmt: skip
+    parser.add_argument("--members", type=int, default=300)
+    parser.add_argument("--hours", type=float, default=8.0)
+    parser.add_argument("--interval", type=int, default=3)
+    parser.add_argument("--churn", type=float, default=0.0005)
+    parser.add_argument("--tick", type=float, default=0.001)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(run(args, directory))
+
+
+if __name__ == "__main__":
+    main()
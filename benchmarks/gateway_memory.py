@@ -0,0 +1,235 @@
+"""Memory held by discord.py's caches under each gateway profile, for a simulated large guild
+
+A synthetic GUILD_CREATE (channels, roles, emojis, stickers and members in voice
+channels) and a stream of guild messages are fed straight into each client's
+connection state, without connecting to Discord, then the memory still held is
+measured with tracemalloc. Events a profile has no intent for are not fed, as
+Discord wouldn't send them.
+
+The `default + members` row is for comparison only: with the privileged members
+intent, discord.py chunks every guild on startup and caches every member.
+
+Run from the repo root with `python3 -m benchmarks.gateway_memory`
+"""
+
+import argparse
+import asyncio
+import gc
+import random
+import tracemalloc
+from typing import Any, Iterator
+
+import discord
+
+from cogs.enums.gateway_profile import GatewayProfile
+from cogs.utils.gateway_profile import client_options
+
+GUILD_ID: int = 1
+BOT_ID: int = 2
+JOINED_AT: str = "2024-01-01T00:00:00+00:00"
+
+
+def user_payload(user_id: int) -> dict[str, Any]:
+    return {
+        "id": str(user_id),
+        "username": f"user{user_id}",
+        "discriminator": "0",
+        "avatar": None,
+        "global_name": None,
+    }
+
+
+def member_payload(user_id: int) -> dict[str, Any]:
+    return {
+        "user": user_payload(user_id),
+        "roles": [],
+        "joined_at": JOINED_AT,
+        "deaf": False,
+        "mute": False,
+        "flags": 0,
+    }
+
+
+def member_ids(members: int) -> range:
+    return range(1_000, 1_000 + members)
+
+
+def voice_channel_id(index: int) -> int:
+    return 100 + index
+
+
+def text_channel_id(index: int) -> int:
+    return 10_000 + index
+
+
+def guild_payload(args: argparse.Namespace, all_members: bool) -> dict[str, Any]:
+    """The guild as sent on connect, with every member only if the guild is chunked"""
+    in_voice: list[int] = list(member_ids(args.voice_channels * args.members_per_channel))  # fmt: skip
+    members: list[int] = list(member_ids(args.members)) if all_members else in_voice
+    return {
+        "id": str(GUILD_ID),
+        "name": "Large guild",
+        "owner_id": str(BOT_ID),
+        "afk_timeout": 300,
+        "verification_level": 0,
+        "default_message_notifications": 0,
+        "explicit_content_filter": 0,
+        "mfa_level": 0,
+        "nsfw_level": 0,
+        "premium_tier": 0,
+        "preferred_locale": "en-US",
+        "features": [],
+        "member_count": args.members,
+        "large": True,
+        "roles": [
+            {
+                "id": str(GUILD_ID if index == 0 else 50_000 + index),
+                "name": f"role{index}",
+                "color": 0,
+                "hoist": False,
+                "position": index,
+                "permissions": "0",
+                "managed": False,
+                "mentionable": False,
+            }
+            for index in range(args.roles)
+        ],
+        "emojis": [
+            {
+                "id": str(60_000 + index),
+                "name": f"emoji{index}",
+                "roles": [],
+                "require_colons": True,
+                "managed": False,
+                "animated": False,
+                "available": True,
+            }
+            for index in range(args.emojis)
+        ],
+        "stickers": [],
+        "channels": [
+            {
+                "id": str(voice_channel_id(index)),
+                "type": 2,
+                "name": f"voice{index}",
+                "position": index,
+                "permission_overwrites": [],
+                "bitrate": 64_000,
+                "user_limit": 0,
+            }
+            for index in range(args.voice_channels)
+        ]
+        + [
+            {
+                "id": str(text_channel_id(index)),
+                "type": 0,
+                "name": f"text{index}",
+                "position": index,
+                "permission_overwrites": [],
+            }
+            for index in range(args.text_channels)
+        ],
+        "members": [member_payload(BOT_ID)] + [member_payload(member) for member in members],  # fmt: skip
+        "voice_states": [
+            {
+                "channel_id": str(voice_channel_id(index // args.members_per_channel)),
+                "user_id": str(member),
+                "session_id": f"session{member}",
+                "deaf": False,
+                "mute": False,
+                "self_deaf": False,
+                "self_mute": False,
+                "self_video": False,
+                "suppress": False,
+                "request_to_speak_timestamp": None,
+            }
+            for index, member in enumerate(in_voice)
+        ],
+        "threads": [],
+        "stage_instances": [],
+        "guild_scheduled_events": [],
+    }
+
+
+def message_payloads(args: argparse.Namespace) -> Iterator[dict[str, Any]]:
+    members: list[int] = list(member_ids(args.members))
+    for index in range(args.messages):
+        author: int = random.choice(members)
+        yield {
+            "id": str(1_000_000 + index),
+            "channel_id": str(text_channel_id(index % args.text_channels)),
+            "guild_id": str(GUILD_ID),
+            "author": user_payload(author),
+            "member": {key: value for key, value in member_payload(author).items() if key != "user"},  # fmt: skip
+            "content": "x" * 80,
+            "timestamp": JOINED_AT,
+            "edited_timestamp": None,
+            "tts": False,
+            "mention_everyone": False,
+            "mentions": [],
+            "mention_roles": [],
+            "attachments": [],
+            "embeds": [],
+            "pinned": False,
+            "type": 0,
+        }
+
+
+async def measure(args: argparse.Namespace, options: dict[str, Any]) -> tuple[int, int]:
+    """Bytes held after the guild and messages were received, and members in tracked channels"""
+    gc.collect()
+    tracemalloc.start()
+    client: discord.Client = discord.Client(**options)
+    state = client._connection
+    state.user = discord.ClientUser(state=state, data=user_payload(BOT_ID))
+    chunked: bool = client.intents.members and state._chunk_guilds
+    state.parse_guild_create(guild_payload(args, all_members=chunked))
+    if client.intents.guild_messages:
+        for message in message_payloads(args):
+            state.parse_message_create(message)
+
+    gc.collect()
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    guild: discord.Guild = client.get_guild(GUILD_ID)
+    in_channels: int = sum(
+        len(guild.get_channel(voice_channel_id(index)).members)
+        for index in range(args.voice_channels)
+    )
+    await client.close()
+    return held, in_channels
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--members", type=int, default=100_000)
+    parser.add_argument("--voice-channels", type=int, default=20)
+    parser.add_argument("--members-per-channel", type=int, default=40)
+    parser.add_argument("--text-channels", type=int, default=200)
+    parser.add_argument("--roles", type=int, default=250)
+    parser.add_argument("--emojis", type=int, default=250)
+    parser.add_argument("--messages", type=int, default=5_000)
+    args = parser.parse_args()
+    random.seed(0)
+
+    members_intent: dict[str, Any] = client_options(GatewayProfile.DEFAULT)
+    members_intent["intents"].members = True
+    members_intent["chunk_guilds_at_startup"] = True
+    profiles: list[tuple[str, dict[str, Any]]] = [
+        ("default + members", members_intent),
+        *((profile.value, client_options(profile)) for profile in GatewayProfile),
+    ]
+
+    print(
+        f"{args.members} members, {args.voice_channels * args.members_per_channel} in "
+        f"{args.voice_channels} voice channels, {args.messages} messages\n"
+    )
+    print(f"{'profile':<20}{'held MiB':>10}{'in voice channels':>19}")
+    for name, options in profiles:
+        held, in_channels = asyncio.run(measure(args, options))
+        print(f"{name:<20}{held / 1024 / 1024:>10.1f}{in_channels:>19}")
+
+
+if __name__ == "__main__":
+    main()
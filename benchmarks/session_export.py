@@ -0,0 +1,51 @@
+"""Size and speed of the raw session export, against the CSV export of the same session
+
+Run from the repo root with `python3 -m benchmarks.session_export`
+"""
+
+import argparse
+import time
+
+from benchmarks.snapshot_storage import generate_session
+from cogs.utils.attendance_matrix import AttendanceMatrix
+from cogs.utils.csv_export import attendance_csv_text
+from cogs.utils.member_attendance import MemberAttendance
+from cogs.utils.session_export import SessionExport, write_session_export
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--members", type=int, nargs="+", default=[30, 300])
+    parser.add_argument("--hours", type=float, nargs="+", default=[1.0, 3.0, 8.0])
+    parser.add_argument("--interval", type=int, default=3)
+    parser.add_argument("--churn", type=float, default=0.0005)
+    args = parser.parse_args()
+
+    print(f"{'members':>8}{'hours':>7}{'snapshots':>11}{'export KiB':>12}{'write ms':>10}{'read ms':>9}{'CSV KiB':>9}")  # fmt: skip
+    for members in args.members:
+        for hours in args.hours:
+            num_snapshots: int = int(hours * 3600 / args.interval)
+            session: list[list[int]] = generate_session(members, num_snapshots, args.churn)  # fmt: skip
+            matrix: AttendanceMatrix = AttendanceMatrix.from_snapshots(session)
+            snapshot_times: list[float] = [index * float(args.interval) for index in range(num_snapshots)]  # fmt: skip
+
+            start: float = time.perf_counter()
+            export: bytes = write_session_export(matrix, snapshot_times, {})
+            write_duration: float = time.perf_counter() - start
+            start = time.perf_counter()
+            SessionExport(export).times()
+            read_duration: float = time.perf_counter() - start
+
+            # The CSV only has one summary row per member
+            csv: str = attendance_csv_text(
+                MemberAttendance(member, ratio >= 0.5, ratio, snapshots=count)
+                for (member, ratio), count in zip(matrix.ratios().items(), matrix.counts().values())  # fmt: skip
+            )
+            print(
+                f"{members:>8}{hours:>7.1f}{num_snapshots:>11}{len(export) / 1024:>12.1f}"
+                f"{write_duration * 1_000:>10.1f}{read_duration * 1_000:>9.1f}{len(csv) / 1024:>9.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
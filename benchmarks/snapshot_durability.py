@@ -0,0 +1,88 @@
+"""Disk I/O of each snapshot durability mode, for a session driven through `shelve_utils`
+
+Every mode takes the same synthetic session, one `take_member_snapshot` per tick
+like the scheduler, then stops it (`persist_snapshots`). Write syscalls and bytes
+are read from /proc/self/io, so they're only reported on Linux.
+Run from the repo root with `python3 -m benchmarks.snapshot_durability`
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from typing import Union
+
+import cogs.utils.shelve_utils as shelve_utils
+from benchmarks.snapshot_storage import generate_session
+from cogs.enums.snapshot_durability import SnapshotDurability
+from cogs.enums.storage_backend import StorageBackendType
+
+SESSION_ID: int = 1
+
+
+def io_counters() -> Union[dict[str, int], None]:
+    try:
+        with open("/proc/self/io") as handle:
+            return {
+                key: int(value)
+                for key, value in (
+                    line.split(": ") for line in handle.read().splitlines()
+                )
+            }
+    except OSError:
+        return None
+
+
+async def run(
+    backend: StorageBackendType,
+    durability: SnapshotDurability,
+    session: list[list[int]],
+) -> tuple[float, Union[dict[str, int], None]]:
+    shelve_utils.open_storage(backend, durability)
+    await shelve_utils.clear_all_sessions()
+
+    before: Union[dict[str, int], None] = io_counters()
+    start: float = time.perf_counter()
+    for snapshot in session:
+        await shelve_utils.take_member_snapshot(SESSION_ID, snapshot)
+    await shelve_utils.persist_snapshots(SESSION_ID)
+    duration: float = time.perf_counter() - start
+    after: Union[dict[str, int], None] = io_counters()
+
+    await shelve_utils.close_storage()
+    if before is None or after is None:
+        return duration, None
+    return duration, {key: after[key] - before[key] for key in ("syscw", "wchar")}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--members", type=int, default=200)
+    parser.add_argument("--hours", type=float, default=1.0)
+    parser.add_argument("--interval", type=int, default=3)
+    parser.add_argument("--churn", type=float, default=0.0005)
+    args = parser.parse_args()
+
+    num_snapshots: int = int(args.hours * 3600 / args.interval)
+    session: list[list[int]] = generate_session(args.members, num_snapshots, args.churn)  # fmt: skip
+    print(f"{args.members} members, {num_snapshots} snapshots\n")
+    print(f"{'backend':<8}{'durability':<16}{'total ms':>10}{'write calls':>13}{'written KiB':>13}")  # fmt: skip
+
+    working_directory: str = os.getcwd()
+    for backend in StorageBackendType:
+        for durability in SnapshotDurability:
+            with tempfile.TemporaryDirectory() as directory:
+                os.chdir(directory)
+                try:
+                    duration, io = asyncio.run(run(backend, durability, session))
+                finally:
+                    os.chdir(working_directory)
+
+            writes: str = f"{io['syscw']:>13}" if io else f"{'n/a':>13}"
+            written: str = f"{io['wchar'] / 1024:>13.1f}" if io else f"{'n/a':>13}"
+            print(f"{backend.value:<8}{durability.value:<16}{duration * 1_000:>10.1f}{writes}{written}")  # fmt: skip
+
+
+if __name__ == "__main__":
+    main()
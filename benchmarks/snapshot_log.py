@@ -0,0 +1,87 @@
+"""Per-tick write cost of the snapshot log vs. the old whole-list shelve rewrite
+
+Run from the repo root with `python3 -m benchmarks.snapshot_log`
+"""
+
+import argparse
+import os
+import random
+import shelve
+import tempfile
+import time
+
+from cogs.utils.snapshot_log import SnapshotLog
+
+
+def bench_shelve_rewrite(
+    path: str, snapshots: list[list[int]], every: int
+) -> list[float]:
+    """The pre-log implementation: unpickle the whole list, append, pickle it back"""
+    with shelve.open(path) as handle:
+        handle["snapshots"] = []
+
+    timings: list[float] = []
+    for index, snapshot in enumerate(snapshots):
+        start: float = time.perf_counter()
+        with shelve.open(path) as handle:
+            temp_snapshots: list = handle["snapshots"]
+            temp_snapshots.append(snapshot)
+            handle["snapshots"] = temp_snapshots
+        if index % every == 0:
+            timings.append(time.perf_counter() - start)
+
+    return timings
+
+
+def bench_snapshot_log(
+    path: str, snapshots: list[list[int]], every: int
+) -> list[float]:
+    log: SnapshotLog = SnapshotLog(path)
+    log.truncate()
+
+    timings: list[float] = []
+    for index, snapshot in enumerate(snapshots):
+        start: float = time.perf_counter()
+        log.append(snapshot)
+        if index % every == 0:
+            timings.append(time.perf_counter() - start)
+
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--snapshots", type=int, default=10_000)
+    parser.add_argument("--members", type=int, default=50)
+    parser.add_argument("--sample-every", type=int, default=1_000)
+    parser.add_argument(
+        "--skip-shelve",
+        action="store_true",
+        help="Only benchmark the snapshot log (the shelve rewrite is quadratic)",
+    )
+    args = parser.parse_args()
+
+    members: list[int] = [random.getrandbits(63) for _ in range(args.members)]
+    snapshots: list[list[int]] = [members] * args.snapshots
+
+    with tempfile.TemporaryDirectory() as directory:
+        results: dict[str, list[float]] = {
+            "snapshot_log": bench_snapshot_log(
+                os.path.join(directory, "snapshots.log"), snapshots, args.sample_every
+            )
+        }
+        if not args.skip_shelve:
+            results["shelve_rewrite"] = bench_shelve_rewrite(
+                os.path.join(directory, "database"), snapshots, args.sample_every
+            )
+
+    print(f"{'snapshot #':>12}" + "".join(f"{name:>18}" for name in results))
+    for row, index in enumerate(range(0, args.snapshots, args.sample_every)):
+        timings: str = "".join(
+            f"{results[name][row] * 1_000:>15.3f} ms" for name in results
+        )
+        print(f"{index:>12}{timings}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Size and read time of the snapshot storage formats for one synthetic session
+
+Defaults model a 300-member, 4-hour class at the default 3-second interval.
+Run from the repo root with `python3 -m benchmarks.snapshot_storage`
+"""
+
+import argparse
+import os
+import pickle
+import random
+import struct
+import tempfile
+import time
+from array import array
+from collections import Counter
+from typing import Callable
+
+from cogs.utils.snapshot_log import SnapshotLog
+
+
+def generate_session(
+    members: int, snapshots: int, churn: float, seed: int = 0
+) -> list[list[int]]:
+    """Every member has a `churn` chance per tick of leaving (or rejoining) the VC"""
+    rng: random.Random = random.Random(seed)
+    pool: list[int] = [rng.getrandbits(63) for _ in range(members)]
+    present: set[int] = set(pool)
+    session: list[list[int]] = []
+    for _ in range(snapshots):
+        for member in pool:
+            if rng.random() < churn:
+                present.symmetric_difference_update((member,))
+        session.append(list(present))
+    return session
+
+
+def framed_encode(session: list[list[int]]) -> bytes:
+    """The uncompressed `<I` count + `<Q` ids record format used before delta encoding"""
+    return b"".join(
+        struct.pack("<I", len(snapshot)) + array("Q", snapshot).tobytes()
+        for snapshot in session
+    )
+
+
+def framed_decode(data: bytes) -> list[list[int]]:
+    snapshots: list[list[int]] = []
+    offset: int = 0
+    while offset < len(data):
+        (count,) = struct.unpack_from("<I", data, offset)
+        start: int = offset + 4
+        offset = start + count * 8
+        snapshot: array = array("Q")
+        snapshot.frombytes(data[start:offset])
+        snapshots.append(snapshot.tolist())
+    return snapshots
+
+
+def timed(function: Callable, repeat: int) -> float:
+    best: float = float("inf")
+    for _ in range(repeat):
+        start: float = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--members", type=int, default=300)
+    parser.add_argument("--hours", type=float, default=4.0)
+    parser.add_argument("--interval", type=int, default=3)
+    parser.add_argument("--churn", type=float, default=0.0005)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    num_snapshots: int = int(args.hours * 3600 / args.interval)
+    session: list[list[int]] = generate_session(args.members, num_snapshots, args.churn)
+
+    def count_members(snapshots: list[list[int]]) -> Counter:
+        return Counter(member for snapshot in snapshots for member in snapshot)
+
+    pickled: bytes = pickle.dumps(session)
+    framed: bytes = framed_encode(session)
+
+    with tempfile.TemporaryDirectory() as directory:
+        log: SnapshotLog = SnapshotLog(os.path.join(directory, "snapshots.log"))
+        for snapshot in session:
+            log.append(snapshot)
+
+        rows: list[tuple[str, int, float, float]] = [
+            (
+                "shelve pickle (list[list[int]])",
+                len(pickled),
+                timed(lambda: pickle.loads(pickled), args.repeat),
+                timed(lambda: count_members(pickle.loads(pickled)), args.repeat),
+            ),
+            (
+                "framed log (uint64 ids)",
+                len(framed),
+                timed(lambda: framed_decode(framed), args.repeat),
+                timed(lambda: count_members(framed_decode(framed)), args.repeat),
+            ),
+            (
+                "delta/run-length log",
+                log.size(),
+                timed(log.read, args.repeat),
+                # Reopened each time, as after a restart
+                timed(lambda: SnapshotLog(log.path).member_counts(), args.repeat),
+            ),
+        ]
+
+    print(
+        f"{args.members} members, {num_snapshots} snapshots "
+        f"({args.hours}h @ {args.interval}s), churn {args.churn}/member/tick\n"
+    )
+    print(f"{'format':<34}{'size':>14}{'read all':>14}{'counts':>14}")
+    for name, size, read_time, count_time in rows:
+        print(
+            f"{name:<34}{size / 1024:>11.1f} KiB"
+            f"{read_time * 1_000:>11.1f} ms{count_time * 1_000:>11.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
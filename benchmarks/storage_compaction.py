@@ -0,0 +1,116 @@
+"""How far the database grows past its live data, and what retention and compaction get back
+
+Simulates `--days` of classes through `shelve_utils`: every class checkpoints its
+session once a minute (`save_sessions`, like the attendance cog), takes polling
+snapshots, is archived with a result for every member and then cleared. The
+database's file size and live data are reported after that, after dropping the
+archived results older than `--keep-days`, and after compacting.
+Run from the repo root with `python3 -m benchmarks.storage_compaction`
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import cogs.utils.shelve_utils as shelve_utils
+from benchmarks.snapshot_storage import generate_session
+from cogs.enums.storage_backend import StorageBackendType
+from cogs.enums.tracking_mode import TrackingMode
+from cogs.storage.base import StorageStats
+from cogs.utils.session_archive import ArchivedSession
+from cogs.utils.sessions import AttendanceSession
+
+SECONDS_PER_DAY: int = 24 * 60 * 60
+CHECKPOINT_SECONDS: int = 60
+
+
+async def simulate(args: argparse.Namespace) -> None:
+    started_at: float = time.time() - args.days * SECONDS_PER_DAY
+    for day in range(args.days):
+        for index in range(args.classes_per_day):
+            channel_id: int = 100 + index
+            class_started_at: float = started_at + day * SECONDS_PER_DAY + index * args.hours * 3600  # fmt: skip
+            session: AttendanceSession = AttendanceSession(
+                channel_id=channel_id,
+                snapshot_interval=args.interval,
+                tracking_mode=TrackingMode.POLLING,
+                is_running=True,
+                started_at=class_started_at,
+                archive_id=int(class_started_at * 1_000),
+            )
+            num_snapshots: int = int(args.hours * 3600 / args.interval)
+            snapshots: list[list[int]] = generate_session(args.members, num_snapshots, args.churn)  # fmt: skip
+            snapshots_per_checkpoint: int = max(1, CHECKPOINT_SECONDS // args.interval)
+            for snapshot_index, snapshot in enumerate(snapshots):
+                taken_at: float = class_started_at + snapshot_index * args.interval
+                await shelve_utils.take_member_snapshot(channel_id, snapshot, taken_at)
+                if snapshot_index % snapshots_per_checkpoint == 0:
+                    session.checkpointed_at = taken_at
+                    session.checkpoint_snapshots = snapshot_index
+                    await shelve_utils.save_sessions({channel_id: session})
+
+            session.is_running = False
+            session.stopped_at = class_started_at + args.hours * 3600
+            await shelve_utils.archive_session(
+                ArchivedSession(
+                    archive_id=session.archive_id,
+                    channel_id=channel_id,
+                    started_at=class_started_at,
+                    ended_at=session.stopped_at,
+                    tracking_mode=session.tracking_mode.value,
+                    snapshot_interval=args.interval,
+                    minimum_attendance_rate=0.5,
+                    class_size=args.members,
+                ),
+                {member: (0.9, True) for member in range(args.members)},
+            )
+            await shelve_utils.clear_snapshots(channel_id)
+            await shelve_utils.save_sessions({})
+
+
+def describe(stage: str, stats: StorageStats, seconds: float = 0.0) -> None:
+    print(f"{stage:<24}{stats.file_bytes / 1024:>12.1f}{stats.live_bytes / 1024:>12.1f}{stats.fragmentation:>10.1%}{seconds * 1_000:>10.1f}")  # fmt: skip
+
+
+async def run(backend: StorageBackendType, args: argparse.Namespace) -> None:
+    shelve_utils.open_storage(backend)
+    await simulate(args)
+    describe(f"{backend.value}, {args.days} days", await shelve_utils.get_storage_stats())  # fmt: skip
+
+    start: float = time.perf_counter()
+    await shelve_utils.drop_archived_sessions(time.time() - args.keep_days * SECONDS_PER_DAY)  # fmt: skip
+    describe(f"  kept {args.keep_days} days", await shelve_utils.get_storage_stats(), time.perf_counter() - start)  # fmt: skip
+
+    start = time.perf_counter()
+    await shelve_utils.compact_storage()
+    describe("  compacted", await shelve_utils.get_storage_stats(), time.perf_counter() - start)  # fmt: skip
+    await shelve_utils.close_storage()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--keep-days", type=int, default=7, help="Archived results kept by retention")  # fmt: skip
+    parser.add_argument("--classes-per-day", type=int, default=3)
+    parser.add_argument("--members", type=int, default=100)
+    parser.add_argument("--hours", type=float, default=1.0)
+    parser.add_argument("--interval", type=int, default=15)
+    parser.add_argument("--churn", type=float, default=0.0005)
+    args = parser.parse_args()
+
+    print(f"{args.classes_per_day} classes a day of {args.members} members\n")
+    print(f"{'':<24}{'file KiB':>12}{'live KiB':>12}{'dead':>10}{'ms':>10}")
+    working_directory: str = os.getcwd()
+    for backend in StorageBackendType:
+        with tempfile.TemporaryDirectory() as directory:
+            os.chdir(directory)
+            try:
+                asyncio.run(run(backend, args))
+            finally:
+                os.chdir(working_directory)
+
+
+if __name__ == "__main__":
+    main()
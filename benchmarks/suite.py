@@ -0,0 +1,246 @@
+"""Offline benchmark suite for the snapshot, report and presence hot paths
+
+Every benchmark runs against a synthetic session for each combination of
+`--members`, `--hours` and `--backend`, recording the best/median duration and
+peak traced memory. Results are written as JSON so runs from two commits can be
+compared, e.g.
+
+    python3 -m benchmarks.suite --output before.json
+    git checkout <other commit>
+    python3 -m benchmarks.suite --output after.json --compare before.json
+
+Run from the repo root.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Union
+
+import discord
+
+import cogs.utils.constants as constants
+import cogs.utils.shelve_utils as shelve_utils
+from benchmarks.snapshot_storage import generate_session
+from cogs.enums.report_filter import ReportFilter
+from cogs.enums.storage_backend import StorageBackendType
+from cogs.utils.attendance_tally import AttendanceTally
+from cogs.utils.csv_export import export_attendance_csv
+from cogs.utils.member_attendance import MemberAttendance
+from cogs.utils.report_pages import ReportPages
+
+SESSION_ID: int = 1
+INSTRUCTOR_ID: int = 1
+
+
+@dataclass
+class Result:
+    benchmark: str
+    backend: str
+    members: int
+    snapshots: int
+    best_seconds: float
+    median_seconds: float
+    peak_bytes: int
+
+    @property
+    def key(self) -> tuple:
+        return (self.benchmark, self.backend, self.members, self.snapshots)
+
+
+async def measure(
+    work: Callable[[], Awaitable[Any]], repeat: int
+) -> tuple[float, float, int]:
+    """Best and median of `repeat` untraced runs, then the peak memory of one traced run"""
+    durations: list[float] = []
+    for _ in range(repeat):
+        start: float = time.perf_counter()
+        await work()
+        durations.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    await work()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return min(durations), statistics.median(durations), peak
+
+
+def member_attendance(tally: AttendanceTally) -> list[MemberAttendance]:
+    """The per-member result `get_attendance` builds from a tally"""
+    rate: float = constants.DEFAULT_MINIMUM_ATTENDANCE_RATE_PERCENTAGE
+    return [
+        MemberAttendance(
+            member_id=member,
+            in_attendance=count / tally.num_snapshots >= rate,
+            attendance_ratio=count / tally.num_snapshots,
+            snapshots=count,
+        )
+        for member, count in tally.totals.items()
+    ]
+
+
+async def run_session(
+    backend: StorageBackendType,
+    session: list[list[int]],
+    members: int,
+    repeat: int,
+) -> list[Result]:
+    shelve_utils.open_storage(backend)
+    await shelve_utils.load_settings()
+    await shelve_utils.clear_all_sessions()
+
+    results: list[Result] = []
+
+    def record(name: str, timings: tuple[float, float, int]) -> None:
+        results.append(Result(name, backend.value, members, len(session), *timings))
+
+    # Time whole ticks through the async facade, one snapshot per call like the scheduler
+    ticks: list[float] = []
+    for snapshot in session:
+        start: float = time.perf_counter()
+        await shelve_utils.take_member_snapshot(SESSION_ID, snapshot)
+        ticks.append(time.perf_counter() - start)
+    record("take_member_snapshot", (min(ticks), statistics.median(ticks), 0))
+
+    async def read_snapshots() -> None:
+        await shelve_utils.get_snapshots(SESSION_ID)
+
+    record("get_snapshots", await measure(read_snapshots, repeat))
+
+    async def rebuild_tally() -> None:
+        shelve_utils._tallies.clear()
+        await shelve_utils.get_attendance_tally(SESSION_ID)
+
+    record("attendance_tally_rebuild", await measure(rebuild_tally, repeat))
+
+    async def presence_count() -> None:
+        len((await shelve_utils.get_attendance_tally(SESSION_ID)).totals)
+
+    record("presence_members_tracked", await measure(presence_count, repeat))
+
+    tally: AttendanceTally = await shelve_utils.get_attendance_tally(SESSION_ID)
+
+    async def build_report() -> None:
+        records: list[MemberAttendance] = member_attendance(tally)
+        header: discord.Embed = discord.Embed(title="Attendance Report", description="x" * 400)  # fmt: skip
+        budget: int = constants.MAXIMUM_MESSAGE_EMBED_CHARACTERS - len(header)
+        ReportPages(records, budget).render(ReportFilter.ALL, 0)
+
+    record("report_first_page", await measure(build_report, repeat))
+
+    records: list[MemberAttendance] = member_attendance(tally)
+    pages: ReportPages = ReportPages(records, constants.MAXIMUM_MESSAGE_EMBED_CHARACTERS)  # fmt: skip
+
+    async def render_last_page() -> None:
+        pages.render(ReportFilter.ALL, pages.num_pages(ReportFilter.ALL) - 1)
+
+    record("report_render_page", await measure(render_last_page, repeat))
+
+    async def export_csv() -> None:
+        export_attendance_csv(records, constants.DEFAULT_ATTACHMENT_SIZE_LIMIT_BYTES)[0].close()  # fmt: skip
+
+    record("csv_export", await measure(export_csv, repeat))
+
+    await shelve_utils.close_storage()
+    return results
+
+
+def git_revision() -> Union[str, None]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: list[Result], baseline_path: str, threshold: float) -> None:
+    with open(baseline_path) as handle:
+        baseline: dict[tuple, dict] = {
+            Result(**result).key: result for result in json.load(handle)["results"]
+        }
+
+    print(f"\nCompared to {baseline_path} (median, flagged if over {threshold:.0%} slower)")  # fmt: skip
+    for result in results:
+        previous: Union[dict, None] = baseline.get(result.key)
+        if previous is None or previous["median_seconds"] == 0:
+            continue
+        change: float = result.median_seconds / previous["median_seconds"] - 1
+        flag: str = "  <-- regression" if change > threshold else ""
+        print(f"{' '.join(map(str, result.key)):<58}{change:>+9.1%}{flag}")
+
+
+async def run(args: argparse.Namespace) -> list[Result]:
+    results: list[Result] = []
+    for members in args.members:
+        for hours in args.hours:
+            num_snapshots: int = int(hours * 3600 / args.interval)
+            session: list[list[int]] = generate_session(members, num_snapshots, args.churn)  # fmt: skip
+            for backend in args.backend:
+                with tempfile.TemporaryDirectory() as directory:
+                    # Storage paths are relative to the working directory
+                    cwd: str = os.getcwd()
+                    os.chdir(directory)
+                    try:
+                        results += await run_session(StorageBackendType(backend), session, members, args.repeat)  # fmt: skip
+                    finally:
+                        os.chdir(cwd)
+
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)  # fmt: skip
+    parser.add_argument("--members", type=int, nargs="+", default=[50, 300])
+    parser.add_argument("--hours", type=float, nargs="+", default=[1.0, 4.0])
+    parser.add_argument("--interval", type=int, default=3)
+    parser.add_argument("--churn", type=float, default=0.0005)
+    parser.add_argument("--backend", nargs="+", choices=[backend.value for backend in StorageBackendType], default=[backend.value for backend in StorageBackendType])  # fmt: skip
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="Compare against a previous --output file")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    args = parser.parse_args()
+
+    results: list[Result] = asyncio.run(run(args))
+
+    print(f"{'benchmark':<28}{'backend':>8}{'members':>9}{'snapshots':>11}{'best':>12}{'median':>12}{'peak':>12}")  # fmt: skip
+    for result in results:
+        print(
+            f"{result.benchmark:<28}{result.backend:>8}{result.members:>9}{result.snapshots:>11}"
+            f"{result.best_seconds * 1_000:>9.3f} ms{result.median_seconds * 1_000:>9.3f} ms"
+            f"{result.peak_bytes / 1024:>8.0f} KiB"
+        )
+
+    if args.output:
+        with open(args.output, "w") as handle:
+            json.dump(
+                {
+                    "revision": git_revision(),
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "arguments": vars(args),
+                    "results": [asdict(result) for result in results],
+                },
+                handle,
+                indent=2,
+            )
+
+    if args.compare:
+        compare(results, args.compare, args.threshold)
+
+
+if __name__ == "__main__":
+    main()
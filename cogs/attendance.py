@@ -1,22 +1,47 @@
+import asyncio
 import logging
-import os
 import textwrap
 import time
 from datetime import datetime
-from typing import Union
+from functools import partial
+from typing import Callable, Optional, Union
 
 import discord
 from discord import app_commands
 from discord.ext import commands, tasks
 
+import cogs.utils.clock as clock
 import cogs.utils.constants as constants
 import cogs.utils.descriptions as descriptions
+import cogs.utils.metrics as metrics
+import cogs.utils.sharding as sharding
 import cogs.utils.shelve_utils as shelve_utils
 from cogs.base.common import CommonBaseCog
 from cogs.enums.embed_type import EmbedType
+from cogs.enums.tracking_mode import TrackingMode
 from cogs.presence import PresenceCommandsCog
+from cogs.utils.attendance_matrix import (
+    AttendanceMatrix,
+    MatrixReport,
+    passing_members,
+    sample_weights,
+)
+from cogs.utils.attendance_tally import AttendanceTally
 from cogs.utils.macro import send_embed
-from cogs.views.attendance_export import AttendanceExportButtons
+from cogs.utils.member_attendance import MemberAttendance
+from cogs.utils.scheduler import SnapshotScheduler, TickStats
+from cogs.utils.session_archive import (
+    ArchivedSession,
+    ArchiveResults,
+    MemberHistoryEntry,
+    MemberRollup,
+)
+from cogs.utils.session_export import write_session_export
+from cogs.utils.sessions import AttendanceSession
+from cogs.utils.voice_intervals import VoiceIntervalTracker
+from cogs.views.attendance_report import AttendanceReportView
+
+SessionChannel = Union[discord.VoiceChannel, discord.StageChannel]
 
 
 @app_commands.guild_only()
@@ -27,32 +52,160 @@ class AttendanceCommandsCog(
     def __init__(self, client: commands.Bot) -> None:
         self.client = client
         self.logger = logging.getLogger(f"cogs.{self.__cog_name__}")
-        self.voice_channel = 0
+        self.sessions: dict[int, AttendanceSession] = {}
+        self.scheduler: SnapshotScheduler = SnapshotScheduler(self.take_session_snapshot)  # fmt: skip
+        # Sessions that were running when the bot went down, resumed once it's ready
+        self.interrupted_sessions: set[int] = set()
+
+    async def cog_load(self) -> None:
+        self.sessions = await shelve_utils.get_sessions()
+        self.interrupted_sessions = {session.session_id for session in self.running_sessions()}  # fmt: skip
+        if self.client.is_ready():
+            await self.resume_interrupted_sessions()  # Reloaded while connected
+
+    @commands.Cog.listener()
+    async def on_ready(self) -> None:
+        await self.resume_interrupted_sessions()
+
+    async def resume_interrupted_sessions(self) -> None:
+        """Pick sessions that were running before a restart back up from their last checkpoint
+
+        The time between the checkpoint and now wasn't tracked and is recorded as
+        a gap. A session whose channel no longer exists is stopped instead.
+        """
+        resumed_at: float = clock.now()
+        for session_id in sorted(self.interrupted_sessions):
+            session: AttendanceSession = self.sessions[session_id]
+            interrupted_at: float = await self.interrupted_at(session, resumed_at)
+            session.gaps.append((interrupted_at, resumed_at))
+
+            channel: Union[SessionChannel, None] = self.client.get_channel(session.channel_id)  # fmt: skip
+            if session.voice_tracker is not None and session.voice_tracker.is_running:
+                # Nobody is credited for the gap, `start` excludes it from the session length
+                session.voice_tracker.stop(interrupted_at)
+            if channel is None:
+                self.logger.info(f"Channel {session.channel_id} is gone, stopping its interrupted session")  # fmt: skip
+                await self.stop_session_tracking(session)
+                continue
+
+            if session.tracking_mode is TrackingMode.VOICE_EVENTS:
+                session.voice_tracker.start([member.id for member in channel.members], resumed_at)  # fmt: skip
+                if not self.reconcile_task.is_running():
+                    self.reconcile_task.start()
+            else:
+                self.scheduler.add(session.session_id, session.snapshot_interval, session.started_at)  # fmt: skip
+            self.logger.info(f"Resumed the session in {channel.name} after {resumed_at - interrupted_at:.0f} seconds untracked")  # fmt: skip
+
+        if self.interrupted_sessions:
+            self.interrupted_sessions.clear()
+            await self.checkpoint_sessions()
+            self.update_presence_task()
+
+    async def interrupted_at(
+        self, session: AttendanceSession, resumed_at: float
+    ) -> float:
+        """Best estimate of when an interrupted session was last tracked"""
+        checkpointed_at: float = session.checkpointed_at or session.started_at or resumed_at  # fmt: skip
+        if session.tracking_mode is TrackingMode.VOICE_EVENTS:
+            return min(checkpointed_at, resumed_at)
+
+        # Snapshots taken after the checkpoint were a snapshot interval apart
+        tally: AttendanceTally = await shelve_utils.get_attendance_tally(session.session_id)  # fmt: skip
+        snapshots_since: int = tally.num_snapshots - session.checkpoint_snapshots
+        return min(checkpointed_at + snapshots_since * session.snapshot_interval, resumed_at)  # fmt: skip
+
+    async def checkpoint_sessions(self) -> None:
+        """Persist how far every running session has got, so it can be resumed after a restart"""
+        checkpointed_at: float = clock.now()
+        for session in self.running_sessions():
+            if session.session_id in self.interrupted_sessions:
+                continue  # Keep the checkpoint it was interrupted at until it's resumed
+
+            session.checkpointed_at = checkpointed_at
+            if session.tracking_mode is TrackingMode.POLLING:
+                # The checkpoint can only count snapshots that made it to disk
+                await shelve_utils.flush_snapshots(session.session_id)
+                tally: AttendanceTally = await shelve_utils.get_attendance_tally(session.session_id)  # fmt: skip
+                session.checkpoint_snapshots = tally.num_snapshots
+
+        await shelve_utils.save_sessions(self.sessions)
+
+    def running_sessions(self) -> list[AttendanceSession]:
+        return [session for session in self.sessions.values() if session.is_running]
+
+    async def num_members_tracked(
+        self, session: Union[AttendanceSession, None] = None
+    ) -> int:
+        """Members seen by one session, or by every running session if none is given"""
+        if session is None:
+            return sum([await self.num_members_tracked(running) for running in self.running_sessions()])  # fmt: skip
+
+        if session.tracking_mode is TrackingMode.VOICE_EVENTS:
+            return len(session.voice_tracker.totals) if session.voice_tracker else 0
+        tally: AttendanceTally = await shelve_utils.get_attendance_tally(session.session_id)  # fmt: skip
+        return len(tally.totals)
+
+    async def resolve_session(
+        self,
+        interaction: discord.Interaction,
+        channel: Union[SessionChannel, None],
+        running: bool,
+    ) -> Union[AttendanceSession, None]:
+        """Pick the session an optional channel selector refers to
+
+        Without a selector, the only running (or stopped) session is used. An error
+        is sent and None returned when there is no such session or it's ambiguous.
+        """
+        state: str = "running" if running else "stopped"
+        if channel is not None:
+            session: Union[AttendanceSession, None] = self.sessions.get(channel.id)
+            if session is None or session.is_running != running:
+                await send_embed(
+                    interaction,
+                    embed_type=EmbedType.ERROR,
+                    message=f"There is no {state} session in {channel.mention}",
+                )
+                return None
+            return session
+
+        candidates: list[AttendanceSession] = [
+            session
+            for session in self.sessions.values()
+            if session.is_running == running and session.in_guild(interaction.guild_id)
+        ]
+        if len(candidates) == 1:
+            return candidates[0]
+
+        if len(candidates) == 0:
+            message: str = f"There are no {state} sessions"
+        else:
+            channels: str = ", ".join(f"<#{session.channel_id}>" for session in candidates)  # fmt: skip
+            message: str = (
+                f"There are multiple {state} sessions ({channels}), pick one with the `channel` option"
+            )
+        await send_embed(interaction, embed_type=EmbedType.ERROR, message=message)
+        return None
 
     @app_commands.command(name="start", description=descriptions.ATTENDANCE_START_SESSION)  # fmt: skip
     @app_commands.describe(channel=descriptions.ATTENDANCE_START_SESSION_CHANNEL)  # fmt: skip
+    @app_commands.describe(interval=descriptions.ATTENDANCE_START_SESSION_INTERVAL)  # fmt: skip
     async def start_session(
         self,
         interaction: discord.Interaction,
-        channel: Union[discord.VoiceChannel, discord.StageChannel],
+        channel: SessionChannel,
+        interval: Optional[app_commands.Range[int, 3, 900]] = None,
     ) -> None:
-        if self.snapshot_task.is_running():
+        existing_session: Union[AttendanceSession, None] = self.sessions.get(channel.id)
+        if existing_session is not None and existing_session.is_running:
             await send_embed(
                 interaction,
                 embed_type=EmbedType.ERROR,
-                message=f"A session is already running in {self.client.get_channel(self.voice_channel).mention}",
+                message=f"A session is already running in {channel.mention}",
             )
             return
 
         vc_members: list[int] = list(map(lambda member: member.id, channel.members))  # fmt: skip
-        instructors: list[int] = shelve_utils.get_instructors()
-        valid_instructor_in_channel: bool = False
-        for instructor in instructors:
-            if instructor in vc_members:
-                valid_instructor_in_channel = True
-                break
-
-        if not valid_instructor_in_channel:
+        if not self.instructor_in_channel(channel):
             await send_embed(
                 interaction,
                 embed_type=EmbedType.ERROR,
@@ -60,17 +213,47 @@ class AttendanceCommandsCog(
             )
             return
 
-        should_clear: bool = shelve_utils.get_auto_clear_on_new_session()
-        if should_clear:
-            cleared_success: bool = shelve_utils.clear_snapshots()
-
-        task_interval: int = shelve_utils.get_snapshot_interval()
-        self.voice_channel = channel.id
-        self.snapshot_task.change_interval(seconds=task_interval)
-        self.snapshot_task.start()
+        should_clear: bool = shelve_utils.get_auto_clear_on_new_session(channel.guild.id)  # fmt: skip
+        if should_clear and existing_session is not None:
+            cleared_success: bool = await self.clear_session(existing_session)
+        elif should_clear:
+            cleared_success: bool = True
+
+        tracking_mode: TrackingMode = shelve_utils.get_tracking_mode(channel.guild.id)
+        task_interval: int = interval or shelve_utils.get_snapshot_interval(channel.guild.id)  # fmt: skip
+        session: AttendanceSession = self.sessions.get(channel.id) or AttendanceSession(
+            channel_id=channel.id,
+            snapshot_interval=task_interval,
+            tracking_mode=tracking_mode,
+        )
+        session.snapshot_interval = task_interval
+        session.tracking_mode = tracking_mode
+        session.guild_id = channel.guild.id
+        session.is_running = True
+        started_at: float = clock.now()
+        if session.started_at is None:
+            session.started_at = started_at
+            session.archive_id = int(session.started_at * 1_000)
+        elif session.stopped_at is not None:
+            session.gaps.append(
+                (session.stopped_at, started_at)
+            )  # Resuming a stopped session
+        session.stopped_at = None
+        self.sessions[session.session_id] = session
+
+        if tracking_mode is TrackingMode.VOICE_EVENTS:
+            if session.voice_tracker is None:
+                session.voice_tracker = VoiceIntervalTracker(channel.id)
+            session.voice_tracker.start(vc_members)
+            if not self.reconcile_task.is_running():
+                self.reconcile_task.start()
+            tracking_message: str = "tracking members as they join and leave"
+        else:
+            self.scheduler.add(session.session_id, task_interval, session.started_at)
+            tracking_message: str = f"taking snapshots every {task_interval} seconds"
 
-        status_cog: PresenceCommandsCog = self.client.get_cog("presence")
-        status_cog.presence_task.start()
+        await self.checkpoint_sessions()
+        self.update_presence_task()
 
         auto_clear_message: str = ""
         if should_clear and cleared_success:
@@ -81,71 +264,90 @@ class AttendanceCommandsCog(
             auto_clear_message = "Snapshot auto clear is disabled"
 
         message_is_ephemeral: bool = (
-            shelve_utils.get_important_attendance_responses_are_ephemeral()
+            shelve_utils.get_important_attendance_responses_are_ephemeral(
+                interaction.guild_id
+            )
         )
         await send_embed(
             interaction,
             is_ephemeral=message_is_ephemeral,
-            message=f"Started a session in {channel.mention} and taking snapshots every {task_interval} seconds! **{auto_clear_message}**",
+            message=f"Started a session in {channel.mention} and {tracking_message}! **{auto_clear_message}**",
         )
 
     @app_commands.command(name="stop", description=descriptions.ATTENDANCE_STOP_SESSION)  # fmt: skip
-    async def stop_session(self, interaction: discord.Interaction) -> None:
-        if not self.snapshot_task.is_running():
-            await send_embed(
-                interaction,
-                embed_type=EmbedType.ERROR,
-                message="A session is not currently running, so there is nothing to stop",
-            )
+    @app_commands.describe(channel=descriptions.ATTENDANCE_SESSION_CHANNEL)  # fmt: skip
+    async def stop_session(
+        self,
+        interaction: discord.Interaction,
+        channel: Optional[SessionChannel] = None,
+    ) -> None:
+        session: Union[AttendanceSession, None] = await self.resolve_session(
+            interaction, channel, running=True
+        )
+        if session is None:
             return
 
-        self.voice_channel = 0
-        self.snapshot_task.cancel()
-
-        status_cog: PresenceCommandsCog = self.client.get_cog("presence")
-        status_cog.presence_task.cancel()
+        await self.stop_session_tracking(session)
 
         message_is_ephemeral: bool = (
-            shelve_utils.get_important_attendance_responses_are_ephemeral()
+            shelve_utils.get_important_attendance_responses_are_ephemeral(
+                interaction.guild_id
+            )
         )
         await send_embed(
             interaction,
             is_ephemeral=message_is_ephemeral,
-            message="Successfully stopped the active session, no longer taking snapshots",
+            message=f"Successfully stopped the session in <#{session.channel_id}>, no longer taking snapshots",
         )
 
     @app_commands.command(name="stats", description=descriptions.ATTENDANCE_STATS_SESSION)  # fmt: skip
+    @app_commands.describe(channel=descriptions.ATTENDANCE_SESSION_CHANNEL)  # fmt: skip
     async def get_stats_for_current_session(
-        self, interaction: discord.Interaction
+        self,
+        interaction: discord.Interaction,
+        channel: Optional[SessionChannel] = None,
     ) -> None:
-        if not self.snapshot_task.is_running():
-            await send_embed(
-                interaction,
-                embed_type=EmbedType.ERROR,
-                message="No active session is running to get stats for",
-            )
+        session: Union[AttendanceSession, None] = await self.resolve_session(
+            interaction, channel, running=True
+        )
+        if session is None:
             return
 
-        snapshot_interval: int = shelve_utils.get_snapshot_interval()
-        snapshots: list[int] = shelve_utils.get_snapshots()
-        num_snapshots: int = len(snapshots)
-        # Since the exact starting timestamp is not recorded, we can guess the
-        # rough start time (within one `snapshot_interval`), which is close enough
-        assumed_session_length: int = num_snapshots * snapshot_interval
-        assumed_started_timestamp: datetime = datetime.fromtimestamp(
-            int(time.time()) - assumed_session_length
-        )
+        if session.tracking_mode is TrackingMode.VOICE_EVENTS:
+            tracker: VoiceIntervalTracker = session.voice_tracker
+            started_timestamp: datetime = datetime.fromtimestamp(tracker.started_at)
+            message: str = textwrap.dedent(
+                f"""
+                - **Channel**: <#{session.channel_id}>
+                - **Tracking Mode**: `{TrackingMode.VOICE_EVENTS.value}`
+                - **Members Tracked**: `{len(tracker.totals)}`
+                - **Members In Channel**: `{len(tracker.open_intervals)}`
+                - **Start Time**: {discord.utils.format_dt(started_timestamp)} ({discord.utils.format_dt(started_timestamp, style='R')})
+                """
+            )
+        else:
+            snapshot_interval: int = session.snapshot_interval
+            tally: AttendanceTally = await shelve_utils.get_attendance_tally(session.session_id)  # fmt: skip
+            num_snapshots: int = tally.num_snapshots
+            started_timestamp: datetime = datetime.fromtimestamp(session.started_at)
+            tick_stats: TickStats = self.scheduler.stats(session.session_id)
 
-        message: str = textwrap.dedent(
-            f"""
-            - **Number of Snapshots**: `{num_snapshots}`
-            - **Snapshot Interval**: `{snapshot_interval}` seconds
-            - **Start Time**: ~{discord.utils.format_dt(assumed_started_timestamp)} ({discord.utils.format_dt(assumed_started_timestamp, style='R')})
-            """
-        )
+            message: str = textwrap.dedent(
+                f"""
+                - **Channel**: <#{session.channel_id}>
+                - **Number of Snapshots**: `{num_snapshots}`
+                - **Snapshot Interval**: `{snapshot_interval}` seconds
+                - **Missed / Late Snapshots**: `{tick_stats.missed}` / `{tick_stats.late}`
+                - **Snapshot Jitter**: `{tick_stats.mean_lateness * 1_000:.1f}` ms mean, `{tick_stats.jitter * 1_000:.1f}` ms std. dev., `{tick_stats.max_lateness * 1_000:.1f}` ms max
+                - **Tracked For**: `{session.tracked_seconds(clock.now()) / 60:.1f}` minutes
+                - **Start Time**: {discord.utils.format_dt(started_timestamp)} ({discord.utils.format_dt(started_timestamp, style='R')})
+                """
+            )
 
         message_is_ephemeral: bool = (
-            shelve_utils.get_important_attendance_responses_are_ephemeral()
+            shelve_utils.get_important_attendance_responses_are_ephemeral(
+                interaction.guild_id
+            )
         )
         await send_embed(
             interaction,
@@ -155,8 +357,17 @@ class AttendanceCommandsCog(
         )
 
     @app_commands.command(name="get", description=descriptions.ATTENDANCE_GET_ATTENDANCE)  # fmt: skip
-    async def get_attendance(self, interaction: discord.Interaction) -> None:
-        if self.snapshot_task.is_running():
+    @app_commands.describe(channel=descriptions.ATTENDANCE_SESSION_CHANNEL)  # fmt: skip
+    @app_commands.describe(from_minute=descriptions.ATTENDANCE_GET_FROM_MINUTE)  # fmt: skip
+    @app_commands.describe(to_minute=descriptions.ATTENDANCE_GET_TO_MINUTE)  # fmt: skip
+    async def get_attendance(
+        self,
+        interaction: discord.Interaction,
+        channel: Optional[SessionChannel] = None,
+        from_minute: Optional[app_commands.Range[int, 0]] = None,
+        to_minute: Optional[app_commands.Range[int, 1]] = None,
+    ) -> None:
+        if channel is not None and channel.id in self.sessions and self.sessions[channel.id].is_running:  # fmt: skip
             await send_embed(
                 interaction,
                 embed_type=EmbedType.ERROR,
@@ -175,122 +386,268 @@ class AttendanceCommandsCog(
             )
             return
 
-        snapshots: list[int] = shelve_utils.get_snapshots()
+        session: Union[AttendanceSession, None] = await self.resolve_session(
+            interaction, channel, running=False
+        )
+        if session is None:
+            return
 
-        if len(snapshots) == 0:
+        is_windowed: bool = from_minute is not None or to_minute is not None
+        if is_windowed and session.tracking_mode is TrackingMode.VOICE_EVENTS:
+            await send_embed(
+                interaction,
+                embed_type=EmbedType.ERROR,
+                message="Reports over part of a session are only available for polling sessions",
+            )
+            return
+        if (
+            from_minute is not None
+            and to_minute is not None
+            and to_minute <= from_minute
+        ):
             await send_embed(
                 interaction,
                 embed_type=EmbedType.ERROR,
-                message="No available stopshot data to report attendance with",
+                message="`to_minute` must be after `from_minute`",
             )
             return
 
-        attendance_total: dict = {}
-        for snapshot in snapshots:
-            for member in snapshot:
-                if member in attendance_total:
-                    attendance_total[member] += 1
-                else:
-                    attendance_total[member] = 1
-
-        num_snapshots: int = len(snapshots)
-        attendance_met: dict = {}
-        attendance_rate: float = shelve_utils.get_attendance_rate()
-        instructors: list[int] = shelve_utils.get_instructors()
+        # Everything above is checked from memory, loading and analysing the session
+        # can take longer than Discord waits for a response for a large class
+        await interaction.response.defer()
+        report_started_at: float = time.perf_counter()
+        if session.tracking_mode is TrackingMode.VOICE_EVENTS:
+            tracker: Union[VoiceIntervalTracker, None] = session.voice_tracker
+            if tracker is None or tracker.session_duration() == 0:
+                await send_embed(
+                    interaction,
+                    embed_type=EmbedType.ERROR,
+                    message="No available voice tracking data to report attendance with",
+                )
+                return
+
+            attendance_ratios: dict[int, float] = tracker.attendance_ratios()
+            snapshot_counts: dict[int, int] = {}
+            longest_presence: dict[int, int] = {}
+            seen_between: dict[int, tuple[float, float]] = {
+                member: tracker.seen_between(member) for member in attendance_ratios
+            }
+            grace: float = constants.ATTENDANCE_GRACE_SECONDS
+            late_joins: set[int] = {
+                member
+                for member, (first_seen, _) in seen_between.items()
+                if first_seen - tracker.started_at > grace
+            }
+            early_leaves: set[int] = {
+                member
+                for member, (_, last_seen) in seen_between.items()
+                if (tracker.stopped_at or clock.now()) - last_seen > grace
+            }
+            session_length: float = tracker.session_duration()
+            started_timestamp: datetime = datetime.fromtimestamp(tracker.started_at)
+            session_summary: str = f"- **Members Tracked**: `{len(tracker.totals)}`"
+            start_time: str = discord.utils.format_dt(started_timestamp)
+            build_session_export: Union[Callable[[], bytes], None] = None
+        else:
+            started_at: float = session.started_at or clock.now()
+            window_start: Union[float, None] = None
+            window_end: Union[float, None] = None
+            if from_minute is not None:
+                window_start = started_at + from_minute * 60
+            if to_minute is not None:
+                window_end = started_at + to_minute * 60
+            matrix: AttendanceMatrix = await shelve_utils.get_attendance_matrix(
+                session.session_id, window_start, window_end
+            )
+            num_snapshots: int = matrix.num_snapshots
+
+            if num_snapshots == 0:
+                await send_embed(
+                    interaction,
+                    embed_type=EmbedType.ERROR,
+                    message="No available stopshot data to report attendance with",
+                )
+                return
+
+            window_times: list[float] = await self.snapshot_times(session, matrix)
+            # A large class over a long session takes tens of milliseconds to analyse
+            report: MatrixReport = await asyncio.to_thread(
+                matrix.report,
+                window_times,
+                session.snapshot_interval,
+                constants.SNAPSHOT_MAX_WEIGHT_INTERVALS,
+                constants.ATTENDANCE_GRACE_SECONDS // session.snapshot_interval,
+            )
+            attendance_ratios: dict[int, float] = report.attendance_ratios
+            snapshot_counts: dict[int, int] = report.snapshot_counts
+            longest_presence: dict[int, int] = report.longest_presence
+            seen_between: dict[int, tuple[float, float]] = report.seen_between
+            late_joins: set[int] = report.late_joins
+            early_leaves: set[int] = report.early_leaves
+            if is_windowed:
+                session_length: float = window_times[-1] - window_times[0] + session.snapshot_interval  # fmt: skip
+                started_timestamp: datetime = datetime.fromtimestamp(window_times[0])
+                session_summary: str = f"- **Total Snapshots**: `{num_snapshots}` (minutes `{from_minute or 0}`-`{to_minute if to_minute is not None else 'end'}` of the session)"  # fmt: skip
+            else:
+                session_length: float = session.tracked_seconds(clock.now())
+                started_timestamp: datetime = datetime.fromtimestamp(started_at)
+                session_summary: str = f"- **Total Snapshots**: `{num_snapshots}`"
+            start_time: str = discord.utils.format_dt(started_timestamp)
+            build_session_export: Union[Callable[[], bytes], None] = partial(
+                write_session_export,
+                matrix,
+                window_times,
+                {
+                    "channel_id": session.channel_id,
+                    "snapshot_interval": session.snapshot_interval,
+                    "started_at": started_at,
+                    "from_minute": from_minute,
+                    "to_minute": to_minute,
+                },
+            )
+
+        member_attendance: list[MemberAttendance] = []
+        attendance_rate: float = shelve_utils.get_attendance_rate(interaction.guild_id)
+        instructors: set[int] = shelve_utils.get_instructors(interaction.guild_id)
         instructors_present: list[int] = []
-        for member, attendance_count in attendance_total.items():
+        for member, attendance_ratio in attendance_ratios.items():
             if member in instructors:
                 instructors_present.append(member)
                 continue
 
-            if attendance_count / num_snapshots >= attendance_rate:
-                attendance_met[member] = True
-            else:
-                attendance_met[member] = False
+            first_seen, last_seen = seen_between.get(member, (None, None))
+            member_attendance.append(
+                MemberAttendance(
+                    member_id=member,
+                    in_attendance=attendance_ratio >= attendance_rate,
+                    attendance_ratio=attendance_ratio,
+                    snapshots=snapshot_counts.get(member),
+                    first_seen=first_seen,
+                    last_seen=last_seen,
+                    longest_presence=longest_presence.get(member),
+                )
+            )
 
-        should_clear: bool = shelve_utils.get_auto_clear_after_attendance_report()
-        if should_clear:
-            cleared_success: bool = shelve_utils.clear_snapshots()
+        # Every threshold from one sort of the class's ratios, alongside the configured rate
+        thresholds: list[float] = sorted({*constants.REPORT_PASSING_THRESHOLDS, attendance_rate})  # fmt: skip
+        passing: dict[float, list[int]] = passing_members(
+            {record.member_id: record.attendance_ratio for record in member_attendance},
+            thresholds,
+        )
+        passing_summary: str = " · ".join(
+            f"`{threshold:.0%}` {len(passing[threshold])}" for threshold in thresholds
+        )
+        students: set[int] = {record.member_id for record in member_attendance}
 
-        embeds: list[discord.Embed] = []
+        should_clear: bool = shelve_utils.get_auto_clear_after_attendance_report(
+            interaction.guild_id
+        )
+        if should_clear:
+            cleared_success: bool = await self.clear_session(session)
 
-        # Embed 1
-        # - Attendance report header message
+        # Header embed, shown above every page
         # - Stats (total attended, total snapshots, present instructors, auto clear snapshots on/off + success/fail)
 
-        snapshot_interval: int = shelve_utils.get_snapshot_interval()
-        assumed_session_length: int = num_snapshots * snapshot_interval
-        assumed_started_timestamp: datetime = datetime.fromtimestamp(
-            int(time.time()) - assumed_session_length
-        )
-
         header_embed: discord.Embed = discord.Embed(
             title="Attendance Report",
             description=textwrap.dedent(
                 f"""
-                - **Class Size**: `{len(attendance_met.keys())}`
-                - **Total Snapshots**: `{len(snapshots)}`
+                - **Channel**: <#{session.channel_id}>
+                - **Class Size**: `{len(member_attendance)}`
+                {session_summary}
+                - **Session Length**: `{session_length / 60:.1f}` minutes
+                - **Interruptions**: `{len(session.gaps)}` (`{session.untracked_seconds() / 60:.1f}` minutes untracked)
+                - **Passing At**: {passing_summary}
+                - **Joined Late / Left Early**: `{len(late_joins & students)}` / `{len(early_leaves & students)}`
                 - **Instructors Present**: {', '.join([f'<@{instructor}>' for instructor in instructors_present])}
                 - **Auto Clear Snapshots**: {'`on`' if should_clear else '`off`'} {'(success)' if should_clear and cleared_success else ''}
-                - **Start Time**: ~{discord.utils.format_dt(assumed_started_timestamp)} ({discord.utils.format_dt(assumed_started_timestamp, style='R')})
+                - **Start Time**: {start_time} ({discord.utils.format_dt(started_timestamp, style='R')})
                 """
             ),
         )
 
-        embeds.append(header_embed)
+        # Members are only rendered a page at a time, as the report is paged through
+        view = AttendanceReportView(
+            self.client,
+            member_attendance,
+            header_embed,
+            build_session_export=build_session_export,
+        )
+        embeds: list[discord.Embed] = view.render()
+        metrics.REPORT_SECONDS.observe(time.perf_counter() - report_started_at)
+        await interaction.followup.send(embeds=embeds, view=view)
+        view.message = await interaction.original_response()
 
-        # Check if there are zero non-instructor users
-        if len(attendance_met.keys()) == 0:
-            embed: discord.Embed = discord.Embed(
-                description="No students attended this session"
+    @app_commands.command(name="history", description=descriptions.ATTENDANCE_HISTORY)  # fmt: skip
+    @app_commands.describe(member=descriptions.ATTENDANCE_HISTORY_MEMBER)  # fmt: skip
+    @app_commands.describe(days=descriptions.ATTENDANCE_HISTORY_DAYS)  # fmt: skip
+    async def get_member_history(
+        self,
+        interaction: discord.Interaction,
+        member: discord.Member,
+        days: Optional[app_commands.Range[int, 1, 365]] = None,
+    ) -> None:
+        since: Union[float, None] = clock.now() - days * 86_400 if days else None
+        history: list[MemberHistoryEntry] = [
+            entry
+            for entry in await shelve_utils.get_member_history(member.id, since)
+            if entry.session.guild_id in (None, interaction.guild_id)
+        ]
+        if not history:
+            await send_embed(
+                interaction,
+                embed_type=EmbedType.ERROR,
+                message=f"There are no archived sessions for {member.mention}{f' in the last {days} days' if days else ''}",
             )
-            embeds.append(embed)
-        else:
-            # Embed 2, 3, ...
-            # - List of attended/absent members
-
-            message: str = ""
-            for member, did_attend in attendance_met.items():
-                pre_format: str = f"- <@{member}>"
-                if did_attend:
-                    message += f"{pre_format} ✅ **ATTENDED**\n"
-                else:
-                    message += f"{pre_format} ❌ **ABSENT**\n"
-
-                if len(message) >= constants.MAXMIMUM_EMBED_DESCRIPTION_LENGTH:
-                    if len(embeds) >= constants.MAXMIMUM_EMBEDS_PER_MESSAGE:
-                        # Do not add any embeds past 10, Discord API only allows up to 10 embeds per response
-                        break
-
-                    self.logger.info(
-                        "Max description length exceeded, appending new embed"
-                    )
-                    embed: discord.Embed = discord.Embed(description=message)
-                    embeds.append(embed)
-                    message = ""
-            else:
-                if (
-                    len(message) > 0
-                    and len(embeds) < constants.MAXMIMUM_EMBEDS_PER_MESSAGE
-                ):
-                    embed: discord.Embed = discord.Embed(description=message)
-                    embeds.append(embed)
-
-        content: str = ""
-        if len(embeds) >= constants.MAXMIMUM_EMBEDS_PER_MESSAGE:
-            content = ":bangbang: The amount of students present in this attendance report has exceeded the message length allowed by the Discord API. Therefore this message only shows a truncated list of students and their attendance."
-
-        view = AttendanceExportButtons(self.client, attendance_met)
-        await interaction.response.send_message(
-            content=content,
-            embeds=embeds,
-            view=view,
+            return
+
+        rollup: MemberRollup = MemberRollup.from_history(history)
+        message: str = textwrap.dedent(
+            f"""
+            - **Member**: {member.mention}
+            - **Period**: {f'last {days} days' if days else 'all archived sessions'}
+            - **Sessions**: `{rollup.sessions}`
+            - **Attended**: `{rollup.attended}` (`{rollup.attended / rollup.sessions:.0%}`)
+            - **Average Attendance Rate**: `{rollup.average_ratio:.0%}`
+
+            """
+        )
+
+        # Newest first, as many as fit in one embed
+        for shown, entry in enumerate(reversed(history)):
+            ended_timestamp: datetime = datetime.fromtimestamp(entry.session.ended_at)
+            line: str = f"- <#{entry.session.channel_id}> {discord.utils.format_dt(ended_timestamp, style='d')} {'✅' if entry.in_attendance else '❌'} `{entry.attendance_ratio:.0%}`\n"  # fmt: skip
+            if len(message) + len(line) > constants.MAXMIMUM_EMBED_DESCRIPTION_LENGTH:
+                message += f"...and {len(history) - shown} older session(s)"
+                break
+            message += line
+
+        message_is_ephemeral: bool = (
+            shelve_utils.get_important_attendance_responses_are_ephemeral(
+                interaction.guild_id
+            )
+        )
+        await send_embed(
+            interaction,
+            is_ephemeral=message_is_ephemeral,
+            message=message,
+            title="Attendance history",
         )
-        view.message = await interaction.original_response()
 
     @app_commands.command(name="clear", description=descriptions.ATTENDANCE_CLEAR_ATTENDANCE)  # fmt: skip
-    async def clear_attendance(self, interaction: discord.Interaction) -> None:
-        success: bool = shelve_utils.clear_snapshots()
+    @app_commands.describe(channel=descriptions.ATTENDANCE_SESSION_CHANNEL)  # fmt: skip
+    async def clear_attendance(
+        self,
+        interaction: discord.Interaction,
+        channel: Optional[SessionChannel] = None,
+    ) -> None:
+        session: Union[AttendanceSession, None] = await self.resolve_session(
+            interaction, channel, running=False
+        )
+        if session is None:
+            return
+
+        success: bool = await self.clear_session(session)
         if not success:
             await send_embed(
                 interaction,
@@ -300,43 +657,228 @@ class AttendanceCommandsCog(
             return
 
         message_is_ephemeral: bool = (
-            shelve_utils.get_important_attendance_responses_are_ephemeral()
+            shelve_utils.get_important_attendance_responses_are_ephemeral(
+                interaction.guild_id
+            )
         )
         await send_embed(
             interaction,
             is_ephemeral=message_is_ephemeral,
-            message="Successfully cleared attendance snapshots",
+            message=f"Successfully cleared attendance snapshots for <#{session.channel_id}>",
         )
 
-    @tasks.loop()
-    async def snapshot_task(self) -> None:
-        try:
-            target_vc_memberlist: list[discord.Member] = self.client.get_channel(self.voice_channel).members  # fmt: skip
-        except AttributeError:
+    async def take_session_snapshot(self, session_id: int) -> None:
+        """Scheduler callback, takes one snapshot for a polling session"""
+        session: AttendanceSession = self.sessions[session_id]
+        channel: Union[SessionChannel, None] = self.client.get_channel(session.channel_id)  # fmt: skip
+        if channel is None:
             return
-        members_as_ids: list[int] = list(map(lambda member: member.id, target_vc_memberlist))  # fmt: skip
-        instructors: list[int] = shelve_utils.get_instructors()
-        valid_instructor_in_channel: bool = False
-        for instructor in instructors:
-            if instructor in members_as_ids:
-                valid_instructor_in_channel = True
-                break
 
-        if not valid_instructor_in_channel:
-            self.snapshot_task.cancel()
+        members_as_ids: list[int] = list(map(lambda member: member.id, channel.members))  # fmt: skip
+        if not self.instructor_in_channel(channel):
+            self.logger.info(f"No instructors left in {channel.name}, stopping its session")  # fmt: skip
+            # Stopping archived the session, a snapshot now would be missing from its results
+            await self.stop_session_tracking(session)
+            return
 
-            status_cog: PresenceCommandsCog = self.client.get_cog("presence")
-            status_cog.presence_task.cancel()
+        tally: AttendanceTally = await shelve_utils.get_attendance_tally(session_id)
+        self.logger.info(f"Taking member snapshot #{tally.num_snapshots} in {channel.name}")  # fmt: skip
+        await shelve_utils.take_member_snapshot(session_id, members_as_ids)
+
+        if clock.now() - (session.checkpointed_at or 0) >= constants.SESSION_CHECKPOINT_SECONDS:  # fmt: skip
+            await self.checkpoint_sessions()
+
+    @commands.Cog.listener()
+    async def on_voice_state_update(
+        self,
+        member: discord.Member,
+        before: discord.VoiceState,
+        after: discord.VoiceState,
+    ) -> None:
+        before_channel: Union[int, None] = before.channel.id if before.channel else None
+        after_channel: Union[int, None] = after.channel.id if after.channel else None
+        if before_channel == after_channel:
+            return  # Mute, deafen, stream, etc.
+
+        left_session: Union[AttendanceSession, None] = self.sessions.get(before_channel)  # fmt: skip
+        if self.is_tracking_voice_events(left_session):
+            left_session.voice_tracker.member_left(member.id)
+            if shelve_utils.is_instructor(member.guild.id, member.id) and not self.instructor_in_channel(before.channel):  # fmt: skip
+                self.logger.info(f"No instructors left in {before.channel.name}, stopping its session")  # fmt: skip
+                await self.stop_session_tracking(left_session)
+
+        joined_session: Union[AttendanceSession, None] = self.sessions.get(after_channel)  # fmt: skip
+        if self.is_tracking_voice_events(joined_session):
+            joined_session.voice_tracker.member_joined(member.id)
+
+    @tasks.loop(seconds=constants.VOICE_RECONCILE_TASK_LOOP_SECONDS)
+    async def reconcile_task(self) -> None:
+        """Fallback pass so a missed gateway event can't corrupt interval totals"""
+        for session in self.running_sessions():
+            if not self.is_tracking_voice_events(session):
+                continue
+
+            channel: Union[SessionChannel, None] = self.client.get_channel(session.channel_id)  # fmt: skip
+            if channel is None:
+                continue
 
-        self.logger.info(f"Taking member snapshot #{self.snapshot_task.current_loop}")
-        shelve_utils.take_member_snapshot(members_as_ids)
+            corrections: int = session.voice_tracker.reconcile(
+                member.id for member in channel.members
+            )
+            if corrections > 0:
+                self.logger.info(f"Reconciled {corrections} missed voice state update(s) in {channel.name}")  # fmt: skip
+
+        await self.checkpoint_sessions()
+
+    @staticmethod
+    def is_tracking_voice_events(session: Union[AttendanceSession, None]) -> bool:
+        return (
+            session is not None
+            and session.is_running
+            and session.tracking_mode is TrackingMode.VOICE_EVENTS
+        )
+
+    def instructor_in_channel(self, channel: SessionChannel) -> bool:
+        instructors: set[int] = shelve_utils.get_instructors(channel.guild.id)
+        return not instructors.isdisjoint(member.id for member in channel.members)
+
+    async def stop_session_tracking(self, session: AttendanceSession) -> None:
+        self.scheduler.remove(session.session_id)
+        if session.voice_tracker is not None and session.voice_tracker.is_running:
+            session.voice_tracker.stop()
+        session.is_running = False
+        session.stopped_at = clock.now()
+        await shelve_utils.persist_snapshots(session.session_id)
+        await shelve_utils.save_sessions(self.sessions)
+        await self.archive_session(session)
+
+        if not any(map(self.is_tracking_voice_events, self.sessions.values())):
+            self.reconcile_task.cancel()
+        self.update_presence_task()
+
+    async def attendance_ratios(self, session: AttendanceSession) -> dict[int, float]:
+        if session.tracking_mode is TrackingMode.VOICE_EVENTS:
+            tracker: Union[VoiceIntervalTracker, None] = session.voice_tracker
+            return tracker.attendance_ratios() if tracker is not None else {}
+
+        # Each snapshot is weighted by the time it stands for, the same as in reports
+        matrix: AttendanceMatrix = await shelve_utils.get_attendance_matrix(session.session_id)  # fmt: skip
+        if matrix.num_snapshots == 0:
+            return {}
+        snapshot_times: list[float] = await self.snapshot_times(session, matrix)
+        weights: list[float] = sample_weights(snapshot_times, session.snapshot_interval, constants.SNAPSHOT_MAX_WEIGHT_INTERVALS)  # fmt: skip
+        return await asyncio.to_thread(matrix.weighted_ratios, weights)
+
+    async def snapshot_times(
+        self, session: AttendanceSession, matrix: AttendanceMatrix
+    ) -> list[float]:
+        """When each of the matrix's snapshots was taken"""
+        first_index: int = matrix.first_snapshot
+        end_index: int = first_index + matrix.num_snapshots
+        snapshot_times: list[float] = await shelve_utils.get_snapshot_times(session.session_id)  # fmt: skip
+        if len(snapshot_times) < end_index:
+            # Snapshots taken before they were timed, assume they were taken on schedule
+            started_at: float = session.started_at or clock.now()
+            snapshot_times = [started_at + index * session.snapshot_interval for index in range(end_index)]  # fmt: skip
+        return snapshot_times[first_index:end_index]
+
+    def session_guild_id(self, session: AttendanceSession) -> Union[int, None]:
+        """The guild whose settings apply to a session"""
+        if session.guild_id is not None:
+            return session.guild_id
+        # Sessions started before they recorded their guild
+        channel: Union[SessionChannel, None] = self.client.get_channel(session.channel_id)  # fmt: skip
+        return channel.guild.id if channel is not None else None
+
+    async def archive_session(self, session: AttendanceSession) -> None:
+        """Keep a stopped session's results for `/attendance history`
+
+        Resuming the session and stopping it again replaces its archived results.
+        """
+        attendance_ratios: dict[int, float] = await self.attendance_ratios(session)
+        if session.archive_id is None or not attendance_ratios:
+            return
+
+        guild_id: Union[int, None] = self.session_guild_id(session)
+        attendance_rate: float = shelve_utils.get_attendance_rate(guild_id)
+        instructors: set[int] = shelve_utils.get_instructors(guild_id)
+        results: ArchiveResults = {
+            member: (attendance_ratio, attendance_ratio >= attendance_rate)
+            for member, attendance_ratio in attendance_ratios.items()
+            if member not in instructors
+        }
+        archived_session: ArchivedSession = ArchivedSession(
+            archive_id=session.archive_id,
+            channel_id=session.channel_id,
+            started_at=session.started_at,
+            ended_at=session.stopped_at or clock.now(),
+            tracking_mode=session.tracking_mode.value,
+            snapshot_interval=session.snapshot_interval,
+            minimum_attendance_rate=attendance_rate,
+            class_size=len(results),
+            guild_id=session.guild_id,
+        )
+        await shelve_utils.archive_session(archived_session, results)
+
+    async def clear_session(self, session: AttendanceSession) -> bool:
+        self.scheduler.forget(session.session_id)
+        success: bool = await shelve_utils.clear_snapshots(session.session_id)
+        self.sessions.pop(session.session_id, None)
+        await shelve_utils.save_sessions(self.sessions)
+
+        return success
+
+    async def apply_retention(
+        self,
+        clear_before: Union[float, None],
+        downsample_before: Union[float, None],
+        factor: int = constants.SNAPSHOT_DOWNSAMPLE_FACTOR,
+    ) -> tuple[int, int]:
+        """Clear stopped sessions that stopped before `clear_before`, downsample polling ones that stopped before `downsample_before`
+
+        Returns how many sessions were cleared and downsampled. Cleared sessions
+        keep their archived results for `/attendance history`.
+        """
+        cleared: int = 0
+        downsampled: int = 0
+        for session in list(self.sessions.values()):
+            if session.is_running or session.stopped_at is None:
+                continue
+
+            if clear_before is not None and session.stopped_at < clear_before:
+                await self.clear_session(session)
+                cleared += 1
+            elif (
+                downsample_before is not None
+                and session.stopped_at < downsample_before
+                and session.tracking_mode is TrackingMode.POLLING
+                and not session.downsampled
+            ):
+                await shelve_utils.downsample_snapshots(session.session_id, factor)
+                session.snapshot_interval *= factor
+                session.downsampled = True
+                downsampled += 1
+
+        if downsampled:
+            await shelve_utils.save_sessions(self.sessions)
+        return cleared, downsampled
+
+    def update_presence_task(self) -> None:
+        status_cog: PresenceCommandsCog = self.client.get_cog("presence")
+        if not self.running_sessions():
+            status_cog.presence_task.cancel()
+        elif not status_cog.presence_task.is_running():
+            status_cog.presence_task.start()
 
-    def cog_unload(self) -> None:
-        self.voice_channel = 0
-        self.snapshot_task.cancel()
+    async def cog_unload(self) -> None:
+        # Running sessions are left running and checkpointed, to be resumed on the next load
+        self.scheduler.stop()
+        self.reconcile_task.cancel()
+        await self.checkpoint_sessions()
+        await shelve_utils.persist_snapshots()
 
 
 async def setup(client: commands.Bot) -> None:
     cog: AttendanceCommandsCog = AttendanceCommandsCog(client)
-    await client.add_cog(cog, guild=discord.Object(int(os.getenv("GUILD_ID"))))
+    await client.add_cog(cog, guilds=sharding.guild_objects())
     cog.logger.info("Cog loaded")
@@ -0,0 +1,8 @@
+from enum import Enum
+
+
+class GatewayProfile(Enum):
+    # discord.py's default intents and caches
+    DEFAULT = "default"
+    # Only what the bot reads: guilds, voice states and mention commands
+    LEAN = "lean"
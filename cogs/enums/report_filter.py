@@ -0,0 +1,7 @@
+from enum import Enum
+
+
+class ReportFilter(Enum):
+    ALL = "all"
+    ATTENDED = "attended"
+    ABSENT = "absent"
@@ -0,0 +1,10 @@
+from enum import Enum
+
+
+class SnapshotDurability(Enum):
+    # Write every snapshot as it's taken
+    EVERY_TICK = "every_tick"
+    # Buffer snapshots and write them in batches, and when a session stops
+    BATCHED = "batched"
+    # Batched, and fsync a session's snapshots when it stops and on shutdown
+    FSYNC_ON_STOP = "fsync_on_stop"
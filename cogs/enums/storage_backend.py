@@ -0,0 +1,6 @@
+from enum import Enum
+
+
+class StorageBackendType(Enum):
+    SHELVE = "shelve"
+    SQLITE = "sqlite"
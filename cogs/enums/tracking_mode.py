@@ -0,0 +1,6 @@
+from enum import Enum
+
+
+class TrackingMode(Enum):
+    POLLING = "polling"
+    VOICE_EVENTS = "voice events"
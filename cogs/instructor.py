@@ -1,11 +1,11 @@
 import logging
-import os
 
 import discord
 from discord import app_commands
 from discord.ext import commands
 
 import cogs.utils.descriptions as descriptions
+import cogs.utils.sharding as sharding
 import cogs.utils.shelve_utils as shelve_utils
 from cogs.base.common import CommonBaseCog
 from cogs.enums.embed_type import EmbedType
@@ -26,7 +26,9 @@ class InstructorCommandsCog(
     async def add_instructor(
         self, interaction: discord.Interaction, member: discord.Member
     ) -> None:
-        success: bool = shelve_utils.add_instructor(member.id)
+        success: bool = await shelve_utils.add_instructor(
+            interaction.guild_id, member.id
+        )
         if not success:
             await send_embed(
                 interaction,
@@ -44,7 +46,9 @@ class InstructorCommandsCog(
     async def remove_instructor(
         self, interaction: discord.Interaction, member: discord.Member
     ) -> None:
-        success: bool = shelve_utils.remove_instructor(member.id)
+        success: bool = await shelve_utils.remove_instructor(
+            interaction.guild_id, member.id
+        )
         if not success:
             await send_embed(
                 interaction,
@@ -60,7 +64,9 @@ class InstructorCommandsCog(
 
     @app_commands.command(name="show", description=descriptions.INSTRUCTOR_SHOW)  # fmt: skip
     async def show_instructors(self, interaction: discord.Interaction) -> None:
-        list_of_instructors: list[int] = shelve_utils.get_instructors()
+        list_of_instructors: set[int] = shelve_utils.get_instructors(
+            interaction.guild_id
+        )
         formatted_message: str = ", ".join(f"<@{instructor}>" for instructor in list_of_instructors)  # fmt: skip
         if formatted_message == "":
             formatted_message = "There are no instructors to show!"
@@ -74,5 +80,5 @@ class InstructorCommandsCog(
 
 async def setup(client: commands.Bot) -> None:
     cog: InstructorCommandsCog = InstructorCommandsCog(client)
-    await client.add_cog(cog, guild=discord.Object(int(os.getenv("GUILD_ID"))))
+    await client.add_cog(cog, guilds=sharding.guild_objects())
     cog.logger.info("Cog loaded")
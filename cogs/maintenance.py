@@ -0,0 +1,180 @@
+import logging
+import os
+import textwrap
+from datetime import datetime
+from typing import Union
+
+import discord
+from discord import Embed, app_commands
+from discord.ext import commands, tasks
+
+import cogs.utils.clock as clock
+import cogs.utils.constants as constants
+import cogs.utils.descriptions as descriptions
+import cogs.utils.interaction_checks as interaction_checks
+import cogs.utils.sharding as sharding
+import cogs.utils.shelve_utils as shelve_utils
+from cogs.base.common import CommonBaseCog
+from cogs.enums.embed_type import EmbedType
+from cogs.storage.base import StorageStats
+from cogs.utils.embed_generator import create_embed
+from cogs.utils.macro import send_embed
+
+SECONDS_PER_DAY: int = 24 * 60 * 60
+
+
+def _format_bytes(size: int) -> str:
+    if size < 1024:
+        return f"{size} B"
+    scaled: float = size / 1024
+    for unit in ("KiB", "MiB"):
+        if scaled < 1024:
+            return f"{scaled:.1f} {unit}"
+        scaled /= 1024
+    return f"{scaled:.1f} GiB"
+
+
+def _days_setting(name: str, default: float) -> float:
+    return float(os.getenv(name) or default)
+
+
+@app_commands.guild_only()
+class StorageCommandsCog(
+    CommonBaseCog,
+    name="storage",
+):
+    """Keeps the database from growing forever
+
+    Every `STORAGE_MAINTENANCE_TASK_LOOP_HOURS` the maintenance job applies
+    retention, then compacts the database if enough of it is dead space. The
+    shelve's dbm files never shrink on their own, deleted and rewritten keys
+    leave their old space behind. Retention is opt-in, in days (0 disables):
+
+    - `SESSION_RETENTION_DAYS`: stopped sessions are cleared, their archived results are kept
+    - `SNAPSHOT_DOWNSAMPLE_AFTER_DAYS`: stopped polling sessions keep every `SNAPSHOT_DOWNSAMPLE_FACTOR`-th snapshot
+    - `ARCHIVE_RETENTION_DAYS`: archived results are dropped from `/attendance history`
+
+    Every guild shares the one database, so only the bot's owner can use these commands.
+    """
+
+    def __init__(self, client: commands.Bot) -> None:
+        self.client = client
+        self.logger = logging.getLogger(f"cogs.{self.__cog_name__}")
+        self.session_retention_days: float = constants.DEFAULT_SESSION_RETENTION_DAYS
+        self.snapshot_downsample_after_days: float = constants.DEFAULT_SNAPSHOT_DOWNSAMPLE_AFTER_DAYS  # fmt: skip
+        self.archive_retention_days: float = constants.DEFAULT_ARCHIVE_RETENTION_DAYS
+        # (compacted at, bytes before, bytes after) of the last compaction since loading
+        self.last_compaction: Union[tuple[float, int, int], None] = None
+
+    async def cog_load(self) -> None:
+        self.session_retention_days = _days_setting("SESSION_RETENTION_DAYS", constants.DEFAULT_SESSION_RETENTION_DAYS)  # fmt: skip
+        self.snapshot_downsample_after_days = _days_setting("SNAPSHOT_DOWNSAMPLE_AFTER_DAYS", constants.DEFAULT_SNAPSHOT_DOWNSAMPLE_AFTER_DAYS)  # fmt: skip
+        self.archive_retention_days = _days_setting("ARCHIVE_RETENTION_DAYS", constants.DEFAULT_ARCHIVE_RETENTION_DAYS)  # fmt: skip
+        self.maintenance_task.start()
+
+    async def cog_unload(self) -> None:
+        self.maintenance_task.cancel()
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return await interaction_checks.user_is_owner(self.client, interaction)
+
+    async def cog_app_command_error(
+        self, interaction: discord.Interaction, error: app_commands.AppCommandError
+    ) -> None:
+        if isinstance(error, app_commands.CheckFailure):
+            await send_embed(
+                interaction,
+                embed_type=EmbedType.ERROR,
+                message="Sorry, only the bot's owner can use this command.",
+            )
+
+    def cutoff(self, days: float) -> Union[float, None]:
+        return clock.now() - days * SECONDS_PER_DAY if days > 0 else None
+
+    async def compact(self) -> tuple[int, int]:
+        """Compact the database, returning its size in bytes before and after"""
+        before: int = (await shelve_utils.get_storage_stats()).file_bytes
+        await shelve_utils.compact_storage()
+        after: int = (await shelve_utils.get_storage_stats()).file_bytes
+        self.last_compaction = (clock.now(), before, after)
+        self.logger.info(f"Compacted the database from {_format_bytes(before)} to {_format_bytes(after)}")  # fmt: skip
+
+        return before, after
+
+    @tasks.loop(hours=constants.STORAGE_MAINTENANCE_TASK_LOOP_HOURS)
+    async def maintenance_task(self) -> None:
+        attendance_cog: Union[commands.GroupCog, None] = self.client.get_cog("attendance")  # fmt: skip
+        clear_before: Union[float, None] = self.cutoff(self.session_retention_days)
+        downsample_before: Union[float, None] = self.cutoff(self.snapshot_downsample_after_days)  # fmt: skip
+        if attendance_cog is not None and (clear_before is not None or downsample_before is not None):  # fmt: skip
+            cleared, downsampled = await attendance_cog.apply_retention(clear_before, downsample_before)  # fmt: skip
+            if cleared or downsampled:
+                self.logger.info(f"Cleared {cleared} and downsampled {downsampled} stopped sessions")  # fmt: skip
+
+        if shelve_utils.storage_is_shared():
+            return  # The storage service applies archive retention and compacts the database
+
+        archive_before: Union[float, None] = self.cutoff(self.archive_retention_days)
+        if archive_before is not None:
+            dropped: int = await shelve_utils.drop_archived_sessions(archive_before)
+            if dropped:
+                self.logger.info(f"Dropped {dropped} archived sessions")
+
+        stats: StorageStats = await shelve_utils.get_storage_stats()
+        if stats.needs_compaction:
+            await self.compact()
+
+    @maintenance_task.before_loop
+    async def maintenance_task_before_loop(self) -> None:
+        # Sessions resumed on startup are left alone until they've been picked back up
+        await self.client.wait_until_ready()
+
+    @app_commands.command(name="stats", description=descriptions.STORAGE_STATS)  # fmt: skip
+    async def get_storage_stats(self, interaction: discord.Interaction) -> None:
+        stats: StorageStats = await shelve_utils.get_storage_stats()
+
+        def retention(days: float) -> str:
+            return f"`{days:g}` days" if days > 0 else "`off`"
+
+        last_compaction: str = "`never` (since the bot started)"
+        if self.last_compaction is not None:
+            compacted_at, before, after = self.last_compaction
+            last_compaction = f"{discord.utils.format_dt(datetime.fromtimestamp(compacted_at), style='R')}, `{_format_bytes(before)}` to `{_format_bytes(after)}`"  # fmt: skip
+
+        message: str = textwrap.dedent(
+            f"""
+            - **File Size**: `{_format_bytes(stats.file_bytes)}`
+            - **Live Data**: `{_format_bytes(stats.live_bytes)}`
+            - **Fragmentation**: `{stats.fragmentation:.1%}` (compacted automatically from `{constants.STORAGE_COMPACTION_MIN_FRAGMENTATION:.0%}` once over `{_format_bytes(constants.STORAGE_COMPACTION_MIN_BYTES)}`)
+            - **Snapshot Logs**: `{_format_bytes(stats.snapshot_bytes)}`
+            - **Last Compaction**: {last_compaction}
+            - **Stopped Sessions Kept For**: {retention(self.session_retention_days)}
+            - **Snapshots Downsampled After**: {retention(self.snapshot_downsample_after_days)} (every `{constants.SNAPSHOT_DOWNSAMPLE_FACTOR}` snapshots down to one)
+            - **Archived Results Kept For**: {retention(self.archive_retention_days)}
+            """
+        )
+        await send_embed(interaction, message=message, title="Storage stats")
+
+    @app_commands.command(name="compact", description=descriptions.STORAGE_COMPACT)  # fmt: skip
+    async def compact_storage(self, interaction: discord.Interaction) -> None:
+        if shelve_utils.storage_is_shared():
+            await send_embed(
+                interaction,
+                embed_type=EmbedType.ERROR,
+                message="The storage service compacts the database shared by every shard itself",
+            )
+            return
+
+        # Rewriting a real database takes longer than Discord waits for a response
+        await interaction.response.defer(ephemeral=True)
+        before, after = await self.compact()
+        embed: Embed = await create_embed(
+            f"Compacted the database from `{_format_bytes(before)}` to `{_format_bytes(after)}`"
+        )
+        await interaction.followup.send(embed=embed, ephemeral=True)
+
+
+async def setup(client: commands.Bot) -> None:
+    cog: StorageCommandsCog = StorageCommandsCog(client)
+    await client.add_cog(cog, guilds=sharding.guild_objects())
+    cog.logger.info("Cog loaded")
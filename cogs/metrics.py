@@ -0,0 +1,74 @@
+import logging
+import os
+from typing import Union
+
+import discord
+from aiohttp import web
+from discord import app_commands
+from discord.ext import commands
+
+import cogs.utils.constants as constants
+import cogs.utils.metrics as metrics
+import cogs.utils.sharding as sharding
+import cogs.utils.shelve_utils as shelve_utils
+from cogs.utils.command_tree import observe_command
+
+
+class MetricsCog(
+    commands.Cog,
+    name="metrics",
+):
+    """Serves `cogs.utils.metrics` in the Prometheus text format when `METRICS_PORT` is set
+
+    The hooks themselves always run, they're cheap enough to leave on; only the
+    HTTP endpoint is opt-in. Gauges are refreshed when scraped. Commands are
+    timed by the bot's `TimedCommandTree`.
+    """
+
+    def __init__(self, client: commands.Bot) -> None:
+        self.client = client
+        self.logger = logging.getLogger(f"cogs.{self.__cog_name__}")
+        self.runner: Union[web.AppRunner, None] = None
+
+    async def cog_load(self) -> None:
+        port: Union[str, None] = os.getenv("METRICS_PORT")
+        if not port:
+            return
+
+        host: str = os.getenv("METRICS_HOST") or constants.DEFAULT_METRICS_HOST
+        app: web.Application = web.Application()
+        app.router.add_get(constants.METRICS_ENDPOINT, self.serve_metrics)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, host, int(port)).start()
+        self.logger.info(f"Serving metrics on http://{host}:{port}{constants.METRICS_ENDPOINT}")  # fmt: skip
+
+    async def cog_unload(self) -> None:
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+    async def serve_metrics(self, request: web.Request) -> web.Response:
+        attendance_cog: Union[commands.GroupCog, None] = self.client.get_cog("attendance")  # fmt: skip
+        if attendance_cog is not None:
+            metrics.ACTIVE_SESSIONS.set(len(attendance_cog.running_sessions()))
+            metrics.MEMBERS_TRACKED.set(await attendance_cog.num_members_tracked())
+        metrics.DATABASE_BYTES.set(await shelve_utils.get_storage_size())
+
+        return web.Response(
+            text=metrics.render(), content_type="text/plain", charset="utf-8"
+        )
+
+    @commands.Cog.listener()
+    async def on_app_command_completion(
+        self,
+        interaction: discord.Interaction,
+        command: Union[app_commands.Command, app_commands.ContextMenu],
+    ) -> None:
+        observe_command(interaction, "ok")
+
+
+async def setup(client: commands.Bot) -> None:
+    cog: MetricsCog = MetricsCog(client)
+    await client.add_cog(cog, guilds=sharding.guild_objects())
+    cog.logger.info("Cog loaded")
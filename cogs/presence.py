@@ -1,12 +1,10 @@
 import logging
-import os
 
-import discord
 from discord import Activity, ActivityType, app_commands
 from discord.ext import commands, tasks
 
 import cogs.utils.constants as constants
-import cogs.utils.shelve_utils as shelve_utils
+import cogs.utils.sharding as sharding
 
 
 @app_commands.guild_only()
@@ -20,17 +18,8 @@ class PresenceCommandsCog(
 
     @tasks.loop(seconds=constants.PRESENCE_TASK_LOOP_SECONDS)
     async def presence_task(self) -> None:
-        snapshots: list[int] = shelve_utils.get_snapshots()
-
-        attendance_total: dict = {}
-        for snapshot in snapshots:
-            for member in snapshot:
-                if member in attendance_total:
-                    attendance_total[member] += 1
-                else:
-                    attendance_total[member] = 1
-
-        num_students: int = len(attendance_total.keys())
+        attendance_cog: commands.GroupCog = self.client.get_cog("attendance")
+        num_students: int = await attendance_cog.num_members_tracked()
         activity_name: str = f"{num_students} student{'s' if num_students != 1 else ''}"
         activity_game: Activity = Activity(
             name=activity_name, type=ActivityType.watching
@@ -48,5 +37,5 @@ class PresenceCommandsCog(
 
 async def setup(client: commands.Bot) -> None:
     cog: PresenceCommandsCog = PresenceCommandsCog(client)
-    await client.add_cog(cog, guild=discord.Object(int(os.getenv("GUILD_ID"))))
+    await client.add_cog(cog, guilds=sharding.guild_objects())
     cog.logger.info("Cog loaded")
@@ -1,16 +1,17 @@
 import logging
-import os
 import textwrap
 from typing import Literal
 
 import discord
 from discord import app_commands
-from discord.ext import commands, tasks
+from discord.ext import commands
 
 import cogs.utils.descriptions as descriptions
+import cogs.utils.sharding as sharding
 import cogs.utils.shelve_utils as shelve_utils
 from cogs.base.common import CommonBaseCog
 from cogs.enums.embed_type import EmbedType
+from cogs.enums.tracking_mode import TrackingMode
 from cogs.utils.macro import send_embed
 
 
@@ -29,7 +30,7 @@ class SettingCommandsCog(
 
     @get_group.command(name="attendance", description=descriptions.SETTINGS_GET_MINIMUM_ATTENDANCE)  # fmt: skip
     async def get_minium_attendance(self, interaction: discord.Interaction) -> None:
-        attendance_rate: float = shelve_utils.get_attendance_rate()
+        attendance_rate: float = shelve_utils.get_attendance_rate(interaction.guild_id)
 
         await send_embed(
             interaction,
@@ -38,7 +39,9 @@ class SettingCommandsCog(
 
     @get_group.command(name="interval", description=descriptions.SETTINGS_GET_INTERVAL)  # fmt: skip
     async def get_snapshot_interval(self, interaction: discord.Interaction) -> None:
-        snapshot_interval: int = shelve_utils.get_snapshot_interval()
+        snapshot_interval: int = shelve_utils.get_snapshot_interval(
+            interaction.guild_id
+        )
 
         await send_embed(
             interaction,
@@ -47,9 +50,11 @@ class SettingCommandsCog(
 
     @get_group.command(name="auto-clear", description=descriptions.SETTINGS_GET_AUTO_CLEAR)  # fmt: skip
     async def get_auto_clear(self, interaction: discord.Interaction) -> None:
-        should_clear_new_session: bool = shelve_utils.get_auto_clear_on_new_session()
+        should_clear_new_session: bool = shelve_utils.get_auto_clear_on_new_session(
+            interaction.guild_id
+        )
         should_clear_after_attendance: bool = (
-            shelve_utils.get_auto_clear_after_attendance_report()
+            shelve_utils.get_auto_clear_after_attendance_report(interaction.guild_id)
         )
 
         message = textwrap.dedent(
@@ -65,7 +70,9 @@ class SettingCommandsCog(
         self, interaction: discord.Interaction
     ) -> None:
         responses_are_ephemeral: bool = (
-            shelve_utils.get_important_attendance_responses_are_ephemeral()
+            shelve_utils.get_important_attendance_responses_are_ephemeral(
+                interaction.guild_id
+            )
         )
 
         await send_embed(
@@ -73,6 +80,17 @@ class SettingCommandsCog(
             message=f"Attendance command responses **{'are' if responses_are_ephemeral else 'are NOT'}** ephemeral",
         )
 
+    @get_group.command(name="tracking", description=descriptions.SETTINGS_GET_TRACKING_MODE)  # fmt: skip
+    async def get_tracking_mode(self, interaction: discord.Interaction) -> None:
+        tracking_mode: TrackingMode = shelve_utils.get_tracking_mode(
+            interaction.guild_id
+        )
+
+        await send_embed(
+            interaction,
+            message=f"Attendance is currently tracked with **{tracking_mode.value}**",
+        )
+
     set_group: app_commands.Group = app_commands.Group(
         name="set", description="Set new settings"
     )
@@ -84,7 +102,9 @@ class SettingCommandsCog(
         interaction: discord.Interaction,
         rate: app_commands.Range[float, 0.0, 1.0],
     ) -> None:
-        success: bool = shelve_utils.set_attendace_rate(rate)
+        success: bool = await shelve_utils.set_attendace_rate(
+            interaction.guild_id, rate
+        )
 
         if not success:
             await send_embed(
@@ -106,18 +126,9 @@ class SettingCommandsCog(
         interaction: discord.Interaction,
         interval: app_commands.Range[int, 3, 900],
     ) -> None:
-        attendance_cog: commands.GroupCog = self.client.get_cog("attendance")
-        snapshot_task: tasks.Loop = attendance_cog.snapshot_task
-
-        if snapshot_task.is_running():
-            await send_embed(
-                interaction,
-                embed_type=EmbedType.ERROR,
-                message="You can't set the snapshot interval while a session is running. Stop your current session to change the interval",
-            )
-            return
-
-        success: bool = shelve_utils.set_snapshot_interval(interval)
+        success: bool = await shelve_utils.set_snapshot_interval(
+            interaction.guild_id, interval
+        )
 
         if not success:
             await send_embed(
@@ -129,7 +140,7 @@ class SettingCommandsCog(
 
         await send_embed(
             interaction,
-            message=f"Successfully set the snapshot interval to **{interval} seconds**",
+            message=f"Successfully set the snapshot interval to **{interval} seconds**, sessions started from now on will use it",
         )
 
     @set_group.command(name="auto-clear", description=descriptions.SETTINGS_SET_AUTO_CLEAR)  # fmt: skip
@@ -143,10 +154,14 @@ class SettingCommandsCog(
     ) -> None:
         match on_event:
             case "on new session":
-                success: bool = shelve_utils.set_auto_clear_on_new_session(should_clear)
+                success: bool = await shelve_utils.set_auto_clear_on_new_session(
+                    interaction.guild_id, should_clear
+                )
             case "after report":
-                success: bool = shelve_utils.set_auto_clear_after_attendance_report(
-                    should_clear
+                success: bool = (
+                    await shelve_utils.set_auto_clear_after_attendance_report(
+                        interaction.guild_id, should_clear
+                    )
                 )
             case _:
                 success: bool = False
@@ -171,8 +186,10 @@ class SettingCommandsCog(
         interaction: discord.Interaction,
         are_ephemeral: bool,
     ) -> None:
-        success: bool = shelve_utils.set_important_attendance_responses_are_ephemeral(
-            are_ephemeral
+        success: bool = (
+            await shelve_utils.set_important_attendance_responses_are_ephemeral(
+                interaction.guild_id, are_ephemeral
+            )
         )
 
         if not success:
@@ -188,8 +205,32 @@ class SettingCommandsCog(
             message=f"Successfully set attendance commands to **{'ephemeral' if are_ephemeral else 'not ephemeral'}**",
         )
 
+    @set_group.command(name="tracking", description=descriptions.SETTINGS_SET_TRACKING_MODE)  # fmt: skip
+    @app_commands.describe(mode=descriptions.SETTINGS_SET_TRACKING_MODE_MODE)  # fmt: skip
+    async def set_tracking_mode(
+        self,
+        interaction: discord.Interaction,
+        mode: Literal["polling", "voice events"],
+    ) -> None:
+        success: bool = await shelve_utils.set_tracking_mode(
+            interaction.guild_id, TrackingMode(mode)
+        )
+
+        if not success:
+            await send_embed(
+                interaction,
+                embed_type=EmbedType.ERROR,
+                message=f"There seems to have been an issue setting the tracking mode to `{mode}`. Try again",
+            )
+            return
+
+        await send_embed(
+            interaction,
+            message=f"Successfully set the tracking mode to **{mode}**, sessions started from now on will use it",
+        )
+
 
 async def setup(client: commands.Bot) -> None:
     cog: SettingCommandsCog = SettingCommandsCog(client)
-    await client.add_cog(cog, guild=discord.Object(int(os.getenv("GUILD_ID"))))
+    await client.add_cog(cog, guilds=sharding.guild_objects())
     cog.logger.info("Cog loaded")
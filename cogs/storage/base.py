@@ -0,0 +1,158 @@
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, Union
+
+import cogs.utils.constants as constants
+from cogs.utils.attendance_matrix import Intervals
+from cogs.utils.session_archive import ArchiveResults, ArchiveRow
+
+# A snapshot's member ids and the `clock.now()` timestamp it was taken at
+TimedSnapshot = tuple[list[int], float]
+
+
+@dataclass
+class StorageStats:
+    """How much of the database file is live data, the rest is space left behind by rewrites and deletes"""
+
+    file_bytes: int
+    live_bytes: int
+    # Kept outside the database file, in the shelve backend's snapshot logs
+    snapshot_bytes: int = 0
+
+    @property
+    def fragmentation(self) -> float:
+        if self.file_bytes == 0:
+            return 0.0
+        return max(0.0, 1 - self.live_bytes / self.file_bytes)
+
+    @property
+    def needs_compaction(self) -> bool:
+        return (
+            self.file_bytes >= constants.STORAGE_COMPACTION_MIN_BYTES
+            and self.fragmentation >= constants.STORAGE_COMPACTION_MIN_FRAGMENTATION
+        )
+
+
+class StorageBackend(ABC):
+    """Persistence behind `shelve_utils`
+
+    `shelve_utils` keeps settings, instructors and attendance tallies cached in
+    memory and only calls into the backend to load them or write changes through.
+    Sessions are passed around as the plain dicts produced by
+    `AttendanceSession.to_dict`.
+
+    Settings and instructors are kept per guild. `guild_id=None` is the record
+    every guild shared before that, a guild without settings of its own starts
+    out as a copy of it.
+    """
+
+    @abstractmethod
+    def load_settings(
+        self, defaults: dict[str, Any], guild_id: Union[int, None] = None
+    ) -> dict[str, Any]:
+        """Return every setting (instructors as a list), persisting `defaults` for missing ones"""
+
+    @abstractmethod
+    def write_setting(
+        self, key: str, value: Any, guild_id: Union[int, None] = None
+    ) -> None:
+        pass
+
+    @abstractmethod
+    def add_instructor(self, user_id: int, guild_id: Union[int, None] = None) -> None:
+        pass
+
+    @abstractmethod
+    def remove_instructor(
+        self, user_id: int, guild_id: Union[int, None] = None
+    ) -> None:
+        pass
+
+    @abstractmethod
+    def append_snapshot(
+        self, session_id: int, member_ids: list[int], taken_at: float
+    ) -> None:
+        pass
+
+    @abstractmethod
+    def append_snapshots(self, session_id: int, snapshots: list[TimedSnapshot]) -> None:
+        """Append several snapshots in one write (or transaction)"""
+
+    @abstractmethod
+    def sync_snapshots(self, session_id: Union[int, None] = None) -> None:
+        """Force a session's written snapshots (every session's if None) to disk with fsync"""
+
+    @abstractmethod
+    def read_snapshots(self, session_id: int) -> list[list[int]]:
+        pass
+
+    @abstractmethod
+    def snapshot_times(self, session_id: int) -> list[float]:
+        """When each snapshot was taken, empty for snapshots stored before they were timed"""
+
+    @abstractmethod
+    def snapshot_range(
+        self, session_id: int, start: float, end: float
+    ) -> tuple[int, int]:
+        """[first, last + 1) indices of the snapshots taken between `start` and `end`, found by binary search"""
+
+    @abstractmethod
+    def member_counts(self, session_id: int) -> tuple[int, dict[int, int]]:
+        """Number of snapshots and per-member snapshot counts for a session"""
+
+    @abstractmethod
+    def member_intervals(self, session_id: int) -> tuple[int, Intervals]:
+        """Number of snapshots and the [joined, left) snapshot index ranges of each member"""
+
+    @abstractmethod
+    def clear_snapshots(self, session_id: int) -> bool:
+        pass
+
+    @abstractmethod
+    def clear_all_snapshots(self) -> None:
+        pass
+
+    @abstractmethod
+    def load_sessions(self) -> dict[int, dict[str, Any]]:
+        pass
+
+    @abstractmethod
+    def save_sessions(self, sessions: dict[int, dict[str, Any]]) -> None:
+        pass
+
+    @abstractmethod
+    def archive_session(self, session: dict[str, Any], results: ArchiveResults) -> None:
+        """Store a finished session's summary and per-member results, replacing any earlier copy with the same archive id"""
+
+    @abstractmethod
+    def member_history(
+        self, member_id: int, since: Union[float, None] = None
+    ) -> list[ArchiveRow]:
+        """One member's archived results (oldest first), read without touching anyone else's"""
+
+    @abstractmethod
+    def drop_archived_sessions(self, ended_before: float) -> int:
+        """Delete archived sessions (and every member's results in them) that ended before a timestamp, returning how many"""
+
+    @abstractmethod
+    def downsample_snapshots(self, session_id: int, factor: int) -> int:
+        """Keep every `factor`-th snapshot of a stopped session, returning how many are left
+
+        Sessions stored before snapshots were timed are left as they are. A crash
+        part way through keeps every snapshot.
+        """
+
+    @abstractmethod
+    def size(self) -> int:
+        """Bytes used on disk"""
+
+    @abstractmethod
+    def stats(self) -> StorageStats:
+        """The database file's size and how much of it is live data"""
+
+    @abstractmethod
+    def compact(self) -> None:
+        """Rewrite the live data into a fresh file and swap it in, without losing data if interrupted"""
+
+    def close(self) -> None:
+        pass
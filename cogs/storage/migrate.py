@@ -0,0 +1,100 @@
+"""Import an existing shelve database and its snapshot logs into SQLite
+
+Run once from the repo root (with the bot stopped) with `python3 -m cogs.storage.migrate`,
+then set `STORAGE_BACKEND=sqlite` in .env
+"""
+
+import argparse
+import os
+import time
+from dataclasses import asdict
+
+import cogs.utils.constants as constants
+from cogs.storage.shelve_backend import ShelveBackend
+from cogs.storage.sqlite_backend import SqliteBackend
+from cogs.utils.bot_settings import SETTING_KEYS, BotSettings
+
+
+def migrate(source: ShelveBackend, destination: SqliteBackend) -> dict[str, int]:
+    """Copy settings, instructors, sessions, snapshots and the session archive, returning how many of each were copied"""
+    defaults: dict = asdict(BotSettings()) | {"instructors": []}
+    defaults = {key: defaults[key] for key in SETTING_KEYS}
+    settings: dict = source.load_settings(defaults)
+
+    for key in SETTING_KEYS:
+        if key != "instructors":
+            destination.write_setting(key, settings[key])
+    for user_id in settings["instructors"]:
+        destination.add_instructor(user_id)
+
+    guild_ids: list[int] = source.settings_guild_ids()
+    for guild_id in guild_ids:
+        guild_settings: dict = source.load_settings(defaults, guild_id)
+        for key in SETTING_KEYS:
+            if key != "instructors":
+                destination.write_setting(key, guild_settings[key], guild_id)
+        # The guild starts out with the shared instructors, it may have removed some
+        for user_id in destination.load_settings(defaults, guild_id)["instructors"]:
+            if user_id not in guild_settings["instructors"]:
+                destination.remove_instructor(user_id, guild_id)
+        for user_id in guild_settings["instructors"]:
+            destination.add_instructor(user_id, guild_id)
+
+    sessions: dict = source.load_sessions()
+    destination.save_sessions(sessions)
+
+    num_snapshots: int = 0
+    if os.path.isdir(source.snapshot_directory):
+        for filename in os.listdir(source.snapshot_directory):
+            session_id, extension = os.path.splitext(filename)
+            if extension != ".log" or not session_id.isdigit():
+                continue
+
+            destination.clear_snapshots(int(session_id))
+            snapshot_times: list[float] = source.snapshot_times(int(session_id))
+            session: dict = sessions.get(int(session_id), {})
+            # Logs written before snapshots were timed get their schedule instead
+            started_at: float = session.get("started_at") or time.time()
+            snapshot_interval: int = session.get("snapshot_interval", constants.DEFAULT_SNAPSHOT_INTERVAL_SECONDS)  # fmt: skip
+            for index, snapshot in enumerate(source.read_snapshots(int(session_id))):
+                taken_at: float = snapshot_times[index] if index < len(snapshot_times) else started_at + index * snapshot_interval  # fmt: skip
+                destination.append_snapshot(int(session_id), snapshot, taken_at)
+                num_snapshots += 1
+
+    num_archived_sessions: int = 0
+    for archived_session, results in source.archived_sessions():
+        destination.archive_session(archived_session, results)
+        num_archived_sessions += 1
+
+    return {
+        "settings": len(SETTING_KEYS) - 1,
+        "instructors": len(settings["instructors"]),
+        "guild settings": len(guild_ids),
+        "sessions": len(sessions),
+        "snapshots": num_snapshots,
+        "archived sessions": num_archived_sessions,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--shelve", default=constants.SHELVE_DATABASE_NAME)
+    parser.add_argument("--snapshots", default=constants.SNAPSHOT_LOG_DIRECTORY)
+    parser.add_argument("--sqlite", default=constants.SQLITE_DATABASE_NAME)
+    args = parser.parse_args()
+
+    source: ShelveBackend = ShelveBackend(args.shelve, args.snapshots)
+    destination: SqliteBackend = SqliteBackend(args.sqlite)
+    try:
+        counts: dict[str, int] = migrate(source, destination)
+    finally:
+        destination.close()
+
+    print(
+        f"Migrated {args.shelve} into {args.sqlite}: "
+        + ", ".join(f"{count} {name}" for name, count in counts.items())
+    )
+
+
+if __name__ == "__main__":
+    main()
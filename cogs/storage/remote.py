@@ -0,0 +1,144 @@
+"""Shard processes' side of the storage service in `cogs.storage.service`
+
+`RemoteStorage` stands in for `StorageWorker`: every call is sent over the
+service's Unix socket as a frame, a 4 byte length then a pickled
+`(request_id, method, args)`, and answered with `(request_id, error, result)`.
+Calls are pipelined, any number can be waiting on the socket at once and each
+is matched to its answer by id. The service pushes `(None, event, payload)`
+frames of its own, `SETTINGS_CHANGED` (with the guild id) after another shard
+changed one of its guilds' settings.
+
+    storage: RemoteStorage = RemoteStorage("storage.sock", guild_ids=[...], on_event=...)
+    await storage.call("member_counts", session_id)
+"""
+
+import asyncio
+import logging
+import pickle
+import struct
+from itertools import count
+from typing import Any, Callable, Union
+
+FRAME_HEADER: struct.Struct = struct.Struct(">I")
+
+# The first call on a connection, telling the service which guilds the shard serves
+HELLO: str = "hello"
+SETTINGS_CHANGED: str = "settings_changed"
+
+logger: logging.Logger = logging.getLogger("cogs.storage")
+
+
+class StorageServiceError(Exception):
+    """The storage service couldn't be reached, or a call failed there"""
+
+
+def encode_frame(message: tuple) -> bytes:
+    payload: bytes = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+
+async def read_frame(reader: asyncio.StreamReader) -> tuple:
+    """The next frame's message, `asyncio.IncompleteReadError` once the other side has gone"""
+    (length,) = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+    return pickle.loads(await reader.readexactly(length))
+
+
+class RemoteStorage:
+    """A connection to the storage service with `StorageWorker`'s interface
+
+    Reconnects (and says hello again) on the next call if the service went away,
+    calls that were waiting when it did fail with `StorageServiceError`.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        guild_ids: list[int],
+        on_event: Union[Callable[[str, Any], None], None] = None,
+    ) -> None:
+        self.path = path
+        self.guild_ids = guild_ids
+        self.on_event = on_event
+        self.in_flight: int = 0
+        self._request_ids = count(1)
+        self._pending: dict[int, asyncio.Future] = {}
+        self._writer: Union[asyncio.StreamWriter, None] = None
+        self._reader_task: Union[asyncio.Task, None] = None
+        self._connecting: asyncio.Lock = asyncio.Lock()
+        self._closing: bool = False
+
+    async def _connect(self) -> None:
+        async with self._connecting:
+            if self._writer is not None and not self._writer.is_closing():
+                return
+
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path)
+            except OSError as error:
+                raise StorageServiceError(f"Couldn't reach the storage service at {self.path}, {error}") from error  # fmt: skip
+            # Answers still owed on an earlier connection fail with it, not with this one
+            self._writer = writer
+            self._pending = {}
+            self._reader_task = asyncio.create_task(self._read_responses(reader, writer, self._pending))  # fmt: skip
+            await self._send(HELLO, (self.guild_ids,))
+
+    async def _read_responses(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        pending: dict[int, asyncio.Future],
+    ) -> None:
+        try:
+            while True:
+                request_id, error, result = await read_frame(reader)
+                if request_id is None:
+                    if self.on_event is not None:
+                        self.on_event(error, result)
+                    continue
+
+                future: Union[asyncio.Future, None] = pending.pop(request_id, None)
+                if future is None or future.done():
+                    continue
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            if not self._closing:
+                logger.warning(f"Lost the connection to the storage service at {self.path}")  # fmt: skip
+        finally:
+            writer.close()
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(StorageServiceError("The storage service went away"))  # fmt: skip
+            pending.clear()
+
+    async def _send(self, method: str, args: tuple) -> Any:
+        request_id: int = next(self._request_ids)
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        self._writer.write(encode_frame((request_id, method, args)))
+        await self._writer.drain()
+        return await future
+
+    def submit(self, method: str, *args: Any) -> asyncio.Task:
+        return asyncio.ensure_future(self.call(method, *args))
+
+    async def call(self, method: str, *args: Any) -> Any:
+        self.in_flight += 1
+        try:
+            await self._connect()
+            return await self._send(method, args)
+        except ConnectionError as error:
+            raise StorageServiceError(f"Lost the connection to the storage service at {self.path}, {error}") from error  # fmt: skip
+        finally:
+            self.in_flight -= 1
+
+    async def close(self) -> None:
+        # The service owns the backend, only this connection is closed
+        self._closing = True
+        if self._writer is not None:
+            self._writer.close()
+            await self._writer.wait_closed()
+        if self._reader_task is not None:
+            await self._reader_task
@@ -0,0 +1,358 @@
+"""Single-writer storage service for a bot split across shard processes
+
+A shelve can't be shared between processes, so one process owns the backend
+(through a `StorageWorker`) and every shard process reaches it over a Unix
+socket with `cogs.storage.remote.RemoteStorage`. Requests from every shard are
+queued in the order they arrive; each batch of waiting requests is queued on
+the worker at once and answered as it completes, with runs of
+`append_snapshots` merged into one call per session.
+
+Each shard says which guilds it serves when it connects. Sessions are stored
+in one table, so the service gives a shard only its own guilds' sessions and
+`save_sessions`/`clear_all_snapshots` from a shard only replace or clear those.
+Every other call a shard makes for a session, an archived session or a guild
+is checked against its guilds, and calls outside `SESSION_CALLS`,
+`GUILD_CALLS` and the few handled in `dispatch` are rejected. Settings and
+instructors are per guild, a shard can only read and change its own guilds'
+and a change makes the service tell the other connections serving that guild
+to reload them.
+
+Archive retention (`ARCHIVE_RETENTION_DAYS`) and compaction touch every
+guild's data, so the service runs them itself on the maintenance cog's
+schedule and shards can't.
+
+Run from the repo root, before the shard processes, with
+`python3 -m cogs.storage.service` (`STORAGE_BACKEND` and `STORAGE_SOCKET` are
+read from .env). Shards connect when `STORAGE_SOCKET` is set for them too.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import socket
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Union
+
+import discord
+from dotenv import load_dotenv
+
+import cogs.utils.clock as clock
+import cogs.utils.constants as constants
+import cogs.utils.sharding as sharding
+from cogs.enums.storage_backend import StorageBackendType
+from cogs.storage.base import StorageStats, TimedSnapshot
+from cogs.storage.remote import (
+    SETTINGS_CHANGED,
+    StorageServiceError,
+    encode_frame,
+    read_frame,
+)
+from cogs.storage.worker import StorageWorker
+from cogs.utils.shelve_utils import create_backend
+
+SETTING_WRITES: frozenset[str] = frozenset({"write_setting", "add_instructor", "remove_instructor"})  # fmt: skip
+# Calls whose last argument is the guild they're for
+GUILD_CALLS: frozenset[str] = SETTING_WRITES | {"load_settings"}
+# Calls whose first argument is the session they're for
+SESSION_CALLS: frozenset[str] = frozenset(
+    {
+        "append_snapshot",
+        "append_snapshots",
+        "sync_snapshots",
+        "read_snapshots",
+        "snapshot_times",
+        "snapshot_range",
+        "member_counts",
+        "member_intervals",
+        "clear_snapshots",
+        "downsample_snapshots",
+    }
+)
+# Calls about the database file as a whole, they don't read any guild's data
+DATABASE_READS: frozenset[str] = frozenset({"size", "stats"})
+
+SECONDS_PER_DAY: int = 24 * 60 * 60
+
+logger: logging.Logger = logging.getLogger("cogs.storage")
+
+
+@dataclass(eq=False)
+class _Connection:
+    writer: asyncio.StreamWriter
+    guild_ids: set[int] = field(default_factory=set)
+
+    def send(self, message: tuple) -> None:
+        if not self.writer.is_closing():
+            self.writer.write(encode_frame(message))
+
+
+@dataclass
+class _Request:
+    connection: _Connection
+    request_id: int
+    method: str
+    args: tuple
+
+
+@dataclass
+class _Answer:
+    """Worker calls a request waits on, and how their results become its answer"""
+
+    request: _Request
+    calls: list[Future] = field(default_factory=list)
+    result: Callable[[list[Any]], Any] = lambda results: results[-1] if results else None  # fmt: skip
+    error: Union[Exception, None] = None
+
+
+class StorageService:
+    def __init__(
+        self,
+        worker: StorageWorker,
+        default_guild_id: Union[int, None] = None,
+        archive_retention_days: float = constants.DEFAULT_ARCHIVE_RETENTION_DAYS,
+    ) -> None:
+        self.worker = worker
+        # Sessions stored before sessions recorded their guild belong to this one
+        self.default_guild_id = default_guild_id
+        self.archive_retention_days = archive_retention_days
+        self.connections: list[_Connection] = []
+        self.requests: asyncio.Queue[_Request] = asyncio.Queue()
+        # Every shard's sessions, `save_sessions` writes them all at once
+        self.sessions: dict[int, dict[str, Any]] = {}
+        self.num_requests: int = 0
+        self.num_calls: int = 0
+        self._processor: Union[asyncio.Task, None] = None
+        self._maintenance: Union[asyncio.Task, None] = None
+
+    async def start(self, path: str) -> asyncio.AbstractServer:
+        self.sessions = await self.worker.call("load_sessions")
+        if os.path.exists(path):
+            os.remove(path)  # Left behind by a service that didn't shut down
+        listener: socket.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # Frames are unpickled, so only this user may ever connect. bind creates the
+        # socket file with the umask's permissions, so it's never open to others
+        umask: int = os.umask(0o177)
+        try:
+            listener.bind(path)
+        finally:
+            os.umask(umask)
+        server: asyncio.AbstractServer = await asyncio.start_unix_server(self.serve_connection, sock=listener)  # fmt: skip
+        self._processor = asyncio.create_task(self.process_requests())
+        self._maintenance = asyncio.create_task(self.maintain())
+        return server
+
+    async def close(self) -> None:
+        """Answer every request already received, then close the backend"""
+        for connection in self.connections:
+            connection.writer.close()
+        await self.requests.join()
+        for task in (self._processor, self._maintenance):
+            if task is not None:
+                task.cancel()
+        await self.worker.close()
+
+    async def maintain(self) -> None:
+        """Drop expired archived sessions and compact the database when it needs it, like the maintenance cog would"""
+        while True:
+            try:
+                if self.archive_retention_days > 0:
+                    ended_before: float = clock.now() - self.archive_retention_days * SECONDS_PER_DAY  # fmt: skip
+                    dropped: int = await self.worker.call("drop_archived_sessions", ended_before)  # fmt: skip
+                    if dropped:
+                        logger.info(f"Dropped {dropped} archived sessions")
+
+                stats: StorageStats = await self.worker.call("stats")
+                if stats.needs_compaction:
+                    await self.worker.call("compact")
+                    logger.info("Compacted the database")
+            except Exception:
+                logger.exception("Storage maintenance failed")
+            await asyncio.sleep(constants.STORAGE_MAINTENANCE_TASK_LOOP_HOURS * 60 * 60)
+
+    async def serve_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        connection: _Connection = _Connection(writer)
+        self.connections.append(connection)
+        try:
+            while True:
+                request_id, method, args = await read_frame(reader)
+                self.requests.put_nowait(_Request(connection, request_id, method, args))  # fmt: skip
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.connections.remove(connection)
+            writer.close()
+
+    async def process_requests(self) -> None:
+        while True:
+            batch: list[_Request] = [await self.requests.get()]
+            while not self.requests.empty():
+                batch.append(self.requests.get_nowait())
+            try:
+                await self.process_batch(batch)
+            finally:
+                for _ in batch:
+                    self.requests.task_done()
+
+    async def process_batch(self, batch: list[_Request]) -> None:
+        """Queue every request of the batch on the worker in order, then answer each as its calls complete"""
+        answers: list[_Answer] = []
+        appends: dict[int, list[TimedSnapshot]] = {}
+        appended: list[_Answer] = []
+        for request in batch:
+            self.num_requests += 1
+            if request.method == "append_snapshots":
+                # Snapshots of different sessions don't depend on each other, only on their own order
+                session_id, snapshots = request.args
+                if not self.owns_session(request.connection, session_id):
+                    answers.append(_Answer(request, error=self.foreign_session(session_id)))  # fmt: skip
+                    continue
+                appends.setdefault(session_id, []).extend(snapshots)
+                appended.append(_Answer(request))
+                answers.append(appended[-1])
+                continue
+
+            self.flush_appends(appends, appended)
+            answers.append(self.dispatch(request))
+        self.flush_appends(appends, appended)
+
+        for answer in answers:
+            try:
+                results: list[Any] = [await asyncio.wrap_future(call) for call in answer.calls]  # fmt: skip
+                if answer.error is not None:
+                    raise answer.error
+                answer.request.connection.send((answer.request.request_id, None, answer.result(results)))  # fmt: skip
+            except Exception as error:
+                answer.request.connection.send((answer.request.request_id, error, None))  # fmt: skip
+                continue
+
+            if answer.request.method in SETTING_WRITES:
+                guild_id: int = answer.request.args[-1]
+                for connection in self.connections:
+                    if connection is not answer.request.connection and guild_id in connection.guild_ids:  # fmt: skip
+                        connection.send((None, SETTINGS_CHANGED, guild_id))
+
+    def flush_appends(
+        self, appends: dict[int, list[TimedSnapshot]], appended: list[_Answer]
+    ) -> None:
+        calls: list[Future] = [self.submit("append_snapshots", session_id, snapshots) for session_id, snapshots in appends.items()]  # fmt: skip
+        for answer in appended:
+            answer.calls = calls
+        appends.clear()
+        appended.clear()
+
+    def submit(self, method: str, *args: Any) -> Future:
+        self.num_calls += 1
+        return self.worker.submit(method, *args)
+
+    def owner(self, session: dict[str, Any]) -> Union[int, None]:
+        return session.get("guild_id") or self.default_guild_id
+
+    def owns_session(self, connection: _Connection, session_id: int) -> bool:
+        session: Union[dict[str, Any], None] = self.sessions.get(session_id)
+        return session is not None and self.owner(session) in connection.guild_ids
+
+    def foreign_session(self, session_id: int) -> StorageServiceError:
+        return StorageServiceError(f"This shard doesn't serve session {session_id}")
+
+    def owned_sessions(self, connection: _Connection) -> dict[int, dict[str, Any]]:
+        return {
+            session_id: session
+            for session_id, session in self.sessions.items()
+            if self.owner(session) in connection.guild_ids
+        }
+
+    def dispatch(self, request: _Request) -> _Answer:
+        """Queue one request's calls on the worker, scoped to the shard's guilds where it matters"""
+        answer: _Answer = _Answer(request)
+        connection: _Connection = request.connection
+        match request.method:
+            case "hello":
+                (guild_ids,) = request.args
+                connection.guild_ids = set(guild_ids)
+                logger.info(f"A shard connected for guilds {sorted(guild_ids)}")
+            case "close":
+                pass  # The service owns the backend, shards only close their connection
+            case "load_sessions":
+                answer.result = lambda _: self.owned_sessions(connection)
+            case "save_sessions":
+                (sessions,) = request.args
+                foreign: list[int] = [
+                    session_id
+                    for session_id, session in sessions.items()
+                    if self.owner(session) not in connection.guild_ids
+                    or (session_id in self.sessions and not self.owns_session(connection, session_id))  # fmt: skip
+                ]
+                if foreign:
+                    answer.error = self.foreign_session(foreign[0])
+                else:
+                    for session_id in self.owned_sessions(connection):
+                        del self.sessions[session_id]
+                    self.sessions.update(sessions)
+                    answer.calls.append(self.submit("save_sessions", dict(self.sessions)))  # fmt: skip
+            case "clear_all_snapshots":
+                answer.calls = [self.submit("clear_snapshots", session_id) for session_id in self.owned_sessions(connection)]  # fmt: skip
+                answer.result = lambda _: None
+            case "sync_snapshots" if not request.args or request.args[0] is None:
+                answer.calls = [self.submit("sync_snapshots", session_id) for session_id in self.owned_sessions(connection)]  # fmt: skip
+                answer.result = lambda _: None
+            case method if method in SESSION_CALLS and not self.owns_session(connection, request.args[0]):  # fmt: skip
+                answer.error = self.foreign_session(request.args[0])
+            case method if method in GUILD_CALLS and request.args[-1] not in connection.guild_ids:  # fmt: skip
+                answer.error = StorageServiceError(f"This shard doesn't serve guild {request.args[-1]}")  # fmt: skip
+            case method if method in SESSION_CALLS | GUILD_CALLS | DATABASE_READS:
+                answer.calls.append(self.submit(method, *request.args))
+            case "archive_session" if self.owner(request.args[0]) not in connection.guild_ids:  # fmt: skip
+                answer.error = StorageServiceError(f"This shard doesn't serve guild {self.owner(request.args[0])}")  # fmt: skip
+            case "archive_session":
+                answer.calls.append(self.submit("archive_session", *request.args))
+            case "member_history":
+                # A member's history spans every guild they were archived in, only these guilds' are the shard's
+                answer.calls.append(self.submit("member_history", *request.args))
+                answer.result = lambda results: [row for row in results[-1] if self.owner(row[0]) in connection.guild_ids]  # fmt: skip
+            case method:
+                answer.error = StorageServiceError(f"Shards can't make the storage call {method}")  # fmt: skip
+
+        return answer
+
+
+async def serve(path: str, backend_type: StorageBackendType) -> None:
+    guild_ids: list[int] = sharding.configured_guild_ids()
+    worker: StorageWorker = StorageWorker(lambda: create_backend(backend_type))
+    service: StorageService = StorageService(
+        worker,
+        guild_ids[0] if guild_ids else None,
+        float(os.getenv("ARCHIVE_RETENTION_DAYS") or constants.DEFAULT_ARCHIVE_RETENTION_DAYS),  # fmt: skip
+    )
+    server: asyncio.AbstractServer = await service.start(path)
+    logger.info(f"Serving {backend_type.value} storage on {path}")
+
+    stopped: asyncio.Event = asyncio.Event()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        asyncio.get_running_loop().add_signal_handler(signal_number, stopped.set)
+    await stopped.wait()
+
+    logger.info("Shutting down")
+    server.close()
+    await service.close()
+    os.remove(path)
+    logger.info(f"Answered {service.num_requests} requests with {service.num_calls} backend calls")  # fmt: skip
+
+
+def main() -> None:
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--socket", default=os.getenv("STORAGE_SOCKET") or constants.STORAGE_SERVICE_SOCKET)  # fmt: skip
+    parser.add_argument("--backend", choices=[backend.value for backend in StorageBackendType], default=os.getenv("STORAGE_BACKEND") or constants.DEFAULT_STORAGE_BACKEND)  # fmt: skip
+    args = parser.parse_args()
+
+    discord.utils.setup_logging()
+    asyncio.run(serve(args.socket, StorageBackendType(args.backend)))
+
+
+if __name__ == "__main__":
+    main()
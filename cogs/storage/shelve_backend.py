@@ -0,0 +1,420 @@
+import dbm
+import importlib
+import json
+import logging
+import os
+import shelve
+from typing import Any, Callable, Iterator, Union
+
+from cogs.storage.base import StorageBackend, StorageStats, TimedSnapshot
+from cogs.utils.attendance_matrix import Intervals
+from cogs.utils.bot_settings import SETTING_KEYS
+from cogs.utils.session_archive import ArchiveResults, ArchiveRow
+from cogs.utils.snapshot_log import SnapshotLog
+from cogs.utils.snapshot_times import SnapshotTimes
+
+logger: logging.Logger = logging.getLogger("cogs.storage")
+
+# Snapshots and their tally used to be pickled into the shelve, they now live in
+# per-session logs (see `SNAPSHOT_LOG_DIRECTORY`)
+LEGACY_KEYS: tuple[str, ...] = ("snapshots", "attendance_tally", "voice_intervals")
+
+# Files the various dbm implementations may create for one database
+DBM_SUFFIXES: tuple[str, ...] = ("", ".db", ".dat", ".dir", ".bak", ".pag")
+
+# Each guild's settings, instructors included, under one key. The settings every
+# guild shared before they were per guild keep their own keys
+GUILD_SETTINGS_KEY: str = "guild_settings:{}"
+
+# Archived sessions live under their own keys, and each member's results under
+# another, so a member's history never unpickles the rest of the archive
+ARCHIVED_SESSION_KEY: str = "archive:{}"
+ARCHIVED_MEMBER_KEY: str = "archive_member:{}"
+
+# `compact` copies the database to these files, then lists the ones it wrote in
+# the commit file before moving them over the originals. A commit file found on
+# startup finishes the swap, compacted files without one are discarded
+COMPACTED_SUFFIX: str = ".compacted"
+COMMIT_SUFFIX: str = ".commit"
+
+# A downsampled snapshot log (and its times) is written next to the original, then moved over it
+DOWNSAMPLED_SUFFIX: str = ".downsampled"
+
+
+def _fsync(path: str) -> None:
+    descriptor: int = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    except OSError:
+        pass  # Directories can't be synced on every platform
+    finally:
+        os.close(descriptor)
+
+
+def _remove(path: str) -> None:
+    if os.path.exists(path):
+        os.remove(path)
+
+
+class ShelveBackend(StorageBackend):
+    """Settings and sessions pickled into a shelve, snapshots in one `SnapshotLog` (and `SnapshotTimes`) per session"""
+
+    def __init__(self, database_name: str, snapshot_directory: str) -> None:
+        self.database_name = database_name
+        self.snapshot_directory = snapshot_directory
+        # One snapshot log per session, opened on first use
+        self._snapshot_logs: dict[int, SnapshotLog] = {}
+        # None for sessions whose log was written before snapshots were timed
+        self._snapshot_times: dict[int, Union[SnapshotTimes, None]] = {}
+        self._recover_compaction()
+
+    def _write_key(self, key: str, value: Any) -> None:
+        with shelve.open(self.database_name) as handle:
+            handle[key] = value
+
+    def load_settings(
+        self, defaults: dict[str, Any], guild_id: Union[int, None] = None
+    ) -> dict[str, Any]:
+        loaded: dict[str, Any] = {}
+        with shelve.open(self.database_name) as handle:
+            for legacy_key in LEGACY_KEYS:
+                if legacy_key in handle:
+                    del handle[legacy_key]
+
+            for key, default in defaults.items():
+                if key not in handle:
+                    handle[key] = default
+                loaded[key] = handle[key]
+
+            if guild_id is not None:
+                loaded = self._guild_settings(handle, guild_id)
+                handle[GUILD_SETTINGS_KEY.format(guild_id)] = loaded
+
+        return loaded
+
+    def _guild_settings(self, handle: shelve.Shelf, guild_id: int) -> dict[str, Any]:
+        """A guild's settings, any it has never stored taken from the shared record"""
+        shared: dict[str, Any] = {key: handle[key] for key in SETTING_KEYS if key in handle}  # fmt: skip
+        return shared | handle.get(GUILD_SETTINGS_KEY.format(guild_id), {})
+
+    def _update_settings(
+        self, guild_id: Union[int, None], key: str, update: Callable[[Any], Any]
+    ) -> None:
+        with shelve.open(self.database_name) as handle:
+            if guild_id is None:
+                handle[key] = update(handle.get(key))
+                return
+
+            settings: dict[str, Any] = self._guild_settings(handle, guild_id)
+            settings[key] = update(settings.get(key))
+            handle[GUILD_SETTINGS_KEY.format(guild_id)] = settings
+
+    def write_setting(
+        self, key: str, value: Any, guild_id: Union[int, None] = None
+    ) -> None:
+        self._update_settings(guild_id, key, lambda _: value)
+
+    def add_instructor(self, user_id: int, guild_id: Union[int, None] = None) -> None:
+        def add(instructors: Union[list[int], None]) -> list[int]:
+            instructors = instructors or []
+            return instructors if user_id in instructors else [*instructors, user_id]
+
+        self._update_settings(guild_id, "instructors", add)
+
+    def remove_instructor(
+        self, user_id: int, guild_id: Union[int, None] = None
+    ) -> None:
+        def remove(instructors: Union[list[int], None]) -> list[int]:
+            return [instructor for instructor in instructors or [] if instructor != user_id]  # fmt: skip
+
+        self._update_settings(guild_id, "instructors", remove)
+
+    def settings_guild_ids(self) -> list[int]:
+        """Guilds with settings of their own"""
+        prefix: str = GUILD_SETTINGS_KEY.format("")
+        with shelve.open(self.database_name) as handle:
+            return [int(key.removeprefix(prefix)) for key in handle if key.startswith(prefix)]  # fmt: skip
+
+    def _snapshot_log(self, session_id: int) -> SnapshotLog:
+        if session_id not in self._snapshot_logs:
+            os.makedirs(self.snapshot_directory, exist_ok=True)
+            path: str = os.path.join(self.snapshot_directory, f"{session_id}.log")
+            self._snapshot_logs[session_id] = SnapshotLog(path)
+
+        return self._snapshot_logs[session_id]
+
+    def _times(self, session_id: int) -> Union[SnapshotTimes, None]:
+        if session_id not in self._snapshot_times:
+            num_snapshots: int = self._snapshot_log(session_id).num_snapshots
+            path: str = os.path.join(self.snapshot_directory, f"{session_id}.times")
+            snapshot_times: Union[SnapshotTimes, None] = SnapshotTimes(path)
+            if len(snapshot_times) == 0 and num_snapshots > 0:
+                snapshot_times = None
+            else:
+                snapshot_times.resize(num_snapshots)
+            self._snapshot_times[session_id] = snapshot_times
+
+        return self._snapshot_times[session_id]
+
+    def append_snapshot(
+        self, session_id: int, member_ids: list[int], taken_at: float
+    ) -> None:
+        snapshot_times: Union[SnapshotTimes, None] = self._times(session_id)
+        self._snapshot_log(session_id).append(member_ids)
+        if snapshot_times is not None:
+            snapshot_times.append(taken_at)
+
+    def append_snapshots(self, session_id: int, snapshots: list[TimedSnapshot]) -> None:
+        snapshot_times: Union[SnapshotTimes, None] = self._times(session_id)
+        self._snapshot_log(session_id).extend(member_ids for member_ids, _ in snapshots)
+        if snapshot_times is not None:
+            snapshot_times.extend(taken_at for _, taken_at in snapshots)
+
+    def downsample_snapshots(self, session_id: int, factor: int) -> int:
+        snapshot_log: SnapshotLog = self._snapshot_log(session_id)
+        snapshot_times: Union[SnapshotTimes, None] = self._times(session_id)
+        if snapshot_times is None:
+            return snapshot_log.num_snapshots
+
+        snapshots: list[list[int]] = snapshot_log.read()
+        taken_ats: list[float] = snapshot_times.read()
+        kept: range = range(0, len(snapshots), factor)
+        downsampled_log: SnapshotLog = SnapshotLog(snapshot_log.path + DOWNSAMPLED_SUFFIX)  # fmt: skip
+        downsampled_times: SnapshotTimes = SnapshotTimes(snapshot_times.path + DOWNSAMPLED_SUFFIX)  # fmt: skip
+        downsampled_log.truncate()
+        downsampled_times.clear()
+        downsampled_log.extend(snapshots[index] for index in kept)
+        downsampled_times.extend(taken_ats[index] for index in kept)
+        _remove(downsampled_log.checkpoint_path)
+
+        # The old checkpoint could match the shorter log, it's rebuilt on the next open
+        _remove(snapshot_log.checkpoint_path)
+        os.replace(downsampled_times.path, snapshot_times.path)
+        os.replace(downsampled_log.path, snapshot_log.path)
+        del self._snapshot_logs[session_id]
+        del self._snapshot_times[session_id]
+        return len(kept)
+
+    def sync_snapshots(self, session_id: Union[int, None] = None) -> None:
+        session_ids: list[int] = list(self._snapshot_logs) if session_id is None else [session_id]  # fmt: skip
+        for synced_id in session_ids:
+            self._snapshot_log(synced_id).sync()
+            snapshot_times: Union[SnapshotTimes, None] = self._times(synced_id)
+            if snapshot_times is not None:
+                snapshot_times.sync()
+
+    def snapshot_times(self, session_id: int) -> list[float]:
+        snapshot_times: Union[SnapshotTimes, None] = self._times(session_id)
+        return snapshot_times.read() if snapshot_times is not None else []
+
+    def snapshot_range(
+        self, session_id: int, start: float, end: float
+    ) -> tuple[int, int]:
+        snapshot_times: Union[SnapshotTimes, None] = self._times(session_id)
+        if snapshot_times is None:
+            return 0, self._snapshot_log(session_id).num_snapshots
+        return snapshot_times.index_range(start, end)
+
+    def read_snapshots(self, session_id: int) -> list[list[int]]:
+        return self._snapshot_log(session_id).read()
+
+    def member_counts(self, session_id: int) -> tuple[int, dict[int, int]]:
+        return self._snapshot_log(session_id).member_counts()
+
+    def member_intervals(self, session_id: int) -> tuple[int, Intervals]:
+        return self._snapshot_log(session_id).member_intervals()
+
+    def clear_snapshots(self, session_id: int) -> bool:
+        snapshot_log: SnapshotLog = self._snapshot_log(session_id)
+        snapshot_log.truncate()
+        os.remove(snapshot_log.path)
+        del self._snapshot_logs[session_id]
+        SnapshotTimes(os.path.join(self.snapshot_directory, f"{session_id}.times")).clear()  # fmt: skip
+        self._snapshot_times.pop(session_id, None)
+
+        return not os.path.exists(snapshot_log.path)
+
+    def clear_all_snapshots(self) -> None:
+        if os.path.isdir(self.snapshot_directory):
+            for filename in os.listdir(self.snapshot_directory):
+                os.remove(os.path.join(self.snapshot_directory, filename))
+        self._snapshot_logs.clear()
+        self._snapshot_times.clear()
+
+    def load_sessions(self) -> dict[int, dict[str, Any]]:
+        with shelve.open(self.database_name) as handle:
+            return handle.get("sessions", {})
+
+    def save_sessions(self, sessions: dict[int, dict[str, Any]]) -> None:
+        self._write_key("sessions", sessions)
+
+    def archive_session(self, session: dict[str, Any], results: ArchiveResults) -> None:
+        archive_id: int = session["archive_id"]
+        with shelve.open(self.database_name) as handle:
+            if ARCHIVED_SESSION_KEY.format(archive_id) in handle:
+                # Archived again after being resumed, members missing from the new results must lose the old ones
+                self._drop_member_results(handle, {archive_id})
+            handle[ARCHIVED_SESSION_KEY.format(archive_id)] = session
+            for member_id, result in results.items():
+                key: str = ARCHIVED_MEMBER_KEY.format(member_id)
+                member_results: dict[int, tuple[float, bool]] = handle.get(key, {})
+                member_results[archive_id] = result
+                handle[key] = member_results
+
+    def member_history(
+        self, member_id: int, since: Union[float, None] = None
+    ) -> list[ArchiveRow]:
+        rows: list[ArchiveRow] = []
+        with shelve.open(self.database_name) as handle:
+            member_results: dict[int, tuple[float, bool]] = handle.get(
+                ARCHIVED_MEMBER_KEY.format(member_id), {}
+            )
+            for archive_id, (ratio, attended) in member_results.items():
+                session: dict[str, Any] = handle[ARCHIVED_SESSION_KEY.format(archive_id)]  # fmt: skip
+                if since is None or session["ended_at"] >= since:
+                    rows.append((session, ratio, attended))
+
+        return sorted(rows, key=lambda row: row[0]["ended_at"])
+
+    def drop_archived_sessions(self, ended_before: float) -> int:
+        with shelve.open(self.database_name) as handle:
+            session_prefix: str = ARCHIVED_SESSION_KEY.format("")
+            dropped: set[int] = {
+                int(key.removeprefix(session_prefix))
+                for key in handle.keys()
+                if key.startswith(session_prefix)
+                and handle[key]["ended_at"] < ended_before
+            }
+            if not dropped:
+                return 0
+
+            self._drop_member_results(handle, dropped)
+            for archive_id in dropped:
+                del handle[ARCHIVED_SESSION_KEY.format(archive_id)]
+
+        return len(dropped)
+
+    def _drop_member_results(self, handle: shelve.Shelf, archive_ids: set[int]) -> None:
+        """Remove every member's results in the given archived sessions"""
+        member_prefix: str = ARCHIVED_MEMBER_KEY.format("")
+        for key in [key for key in handle.keys() if key.startswith(member_prefix)]:
+            member_results: dict[int, tuple[float, bool]] = handle[key]
+            if archive_ids.isdisjoint(member_results):
+                continue
+            kept: dict[int, tuple[float, bool]] = {
+                archive_id: result
+                for archive_id, result in member_results.items()
+                if archive_id not in archive_ids
+            }
+            if kept:
+                handle[key] = kept
+            else:
+                del handle[key]
+
+    def archived_sessions(self) -> Iterator[tuple[dict[str, Any], ArchiveResults]]:
+        """Every archived session with its results, only meant for migrations"""
+        with shelve.open(self.database_name) as handle:
+            member_prefix: str = ARCHIVED_MEMBER_KEY.format("")
+            results: dict[int, ArchiveResults] = {}
+            for key in handle.keys():
+                if not key.startswith(member_prefix):
+                    continue
+                member_id: int = int(key.removeprefix(member_prefix))
+                for archive_id, result in handle[key].items():
+                    results.setdefault(archive_id, {})[member_id] = result
+
+            for archive_id, session_results in results.items():
+                yield handle[ARCHIVED_SESSION_KEY.format(archive_id)], session_results
+
+    def close(self) -> None:
+        # Lets the next start reopen each log from its checkpoint instead of replaying it
+        for snapshot_log in self._snapshot_logs.values():
+            snapshot_log.checkpoint()
+
+    def _database_files(self, database_name: str) -> list[str]:
+        return [
+            f"{database_name}{suffix}"
+            for suffix in DBM_SUFFIXES
+            if os.path.isfile(f"{database_name}{suffix}")
+        ]
+
+    def _snapshot_bytes(self) -> int:
+        if not os.path.isdir(self.snapshot_directory):
+            return 0
+        return sum(
+            os.path.getsize(os.path.join(self.snapshot_directory, filename))
+            for filename in os.listdir(self.snapshot_directory)
+        )
+
+    def size(self) -> int:
+        database_bytes: int = sum(map(os.path.getsize, self._database_files(self.database_name)))  # fmt: skip
+        return database_bytes + self._snapshot_bytes()
+
+    def stats(self) -> StorageStats:
+        live_bytes: int = 0
+        if self._database_files(self.database_name):
+            with dbm.open(self.database_name, "r") as handle:
+                for key in handle.keys():
+                    live_bytes += len(key) + len(handle[key])
+        return StorageStats(
+            file_bytes=sum(
+                map(os.path.getsize, self._database_files(self.database_name))
+            ),  # fmt: skip
+            live_bytes=live_bytes,
+            snapshot_bytes=self._snapshot_bytes(),
+        )
+
+    def compact(self) -> None:
+        """Copy every key, still pickled, into a fresh database of the same dbm flavour and swap it in
+
+        Every call runs on the storage worker's thread and opens the shelve for
+        itself, so nothing else has the database open while it's swapped.
+        """
+        if not self._database_files(self.database_name):
+            return
+
+        # None if the database can't be read, "" if no dbm module recognises it
+        flavour_name: Union[str, None] = dbm.whichdb(self.database_name)
+        if not flavour_name:
+            logger.warning(f"Skipping compaction, {self.database_name} isn't a database this Python can open")  # fmt: skip
+            return
+
+        compacted: str = f"{self.database_name}{COMPACTED_SUFFIX}"
+        for path in self._database_files(compacted):
+            os.remove(path)
+        flavour = importlib.import_module(flavour_name)
+        with dbm.open(self.database_name, "r") as source, flavour.open(compacted, "n") as target:  # fmt: skip
+            for key in source.keys():
+                target[key] = source[key]
+
+        suffixes: list[str] = [path.removeprefix(compacted) for path in self._database_files(compacted)]  # fmt: skip
+        for path in self._database_files(compacted):
+            _fsync(path)
+        commit_path: str = f"{self.database_name}{COMMIT_SUFFIX}"
+        with open(commit_path, "w") as handle:
+            json.dump(suffixes, handle)
+            handle.flush()
+            os.fsync(handle.fileno())
+        self._finish_compaction()
+
+    def _finish_compaction(self) -> None:
+        """Move the compacted files over the originals, safe to repeat after a crash part way"""
+        commit_path: str = f"{self.database_name}{COMMIT_SUFFIX}"
+        with open(commit_path) as handle:
+            suffixes: list[str] = json.load(handle)
+
+        compacted: str = f"{self.database_name}{COMPACTED_SUFFIX}"
+        for suffix in DBM_SUFFIXES:
+            if suffix in suffixes:
+                if os.path.exists(f"{compacted}{suffix}"):
+                    os.replace(f"{compacted}{suffix}", f"{self.database_name}{suffix}")
+            else:
+                _remove(f"{self.database_name}{suffix}")
+        _fsync(os.path.dirname(os.path.abspath(self.database_name)))
+        os.remove(commit_path)
+
+    def _recover_compaction(self) -> None:
+        if os.path.exists(f"{self.database_name}{COMMIT_SUFFIX}"):
+            self._finish_compaction()
+        for path in self._database_files(f"{self.database_name}{COMPACTED_SUFFIX}"):
+            os.remove(path)
@@ -0,0 +1,491 @@
+import os
+import pickle
+import sqlite3
+from dataclasses import dataclass, field
+from typing import Any, Final, Union
+
+from cogs.storage.base import StorageBackend, StorageStats, TimedSnapshot
+from cogs.utils.attendance_matrix import Intervals
+from cogs.utils.session_archive import ArchiveResults, ArchiveRow
+
+# A member's presence is one row per stretch of consecutive snapshots they were in,
+# `left_index` is the first snapshot they were missing from (NULL while still present).
+# An unchanged snapshot is therefore a single `snapshots` row. `presence_totals`
+# accumulates each member's closed stretches, so per-member counts (and resuming a
+# session after a restart) cost one row per member however long the session is.
+SCHEMA: Final[
+    str
+] = """
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS instructors (
+    user_id INTEGER PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS guild_settings (
+    guild_id INTEGER NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    PRIMARY KEY (guild_id, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS guild_instructors (
+    guild_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, user_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id INTEGER PRIMARY KEY,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS snapshots (
+    session_id INTEGER NOT NULL,
+    snapshot_index INTEGER NOT NULL,
+    taken_at REAL NOT NULL,
+    PRIMARY KEY (session_id, snapshot_index)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS snapshots_session_time
+    ON snapshots (session_id, taken_at);
+CREATE TABLE IF NOT EXISTS presence (
+    session_id INTEGER NOT NULL,
+    member_id INTEGER NOT NULL,
+    joined_index INTEGER NOT NULL,
+    left_index INTEGER
+);
+CREATE INDEX IF NOT EXISTS presence_session_member
+    ON presence (session_id, member_id);
+CREATE INDEX IF NOT EXISTS presence_session_open
+    ON presence (session_id) WHERE left_index IS NULL;
+CREATE TABLE IF NOT EXISTS presence_totals (
+    session_id INTEGER NOT NULL,
+    member_id INTEGER NOT NULL,
+    closed_snapshots INTEGER NOT NULL,
+    PRIMARY KEY (session_id, member_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS archived_sessions (
+    archive_id INTEGER PRIMARY KEY,
+    ended_at REAL NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS archived_attendance (
+    member_id INTEGER NOT NULL,
+    archive_id INTEGER NOT NULL,
+    attendance_ratio REAL NOT NULL,
+    in_attendance INTEGER NOT NULL,
+    PRIMARY KEY (member_id, archive_id)
+) WITHOUT ROWID;
+"""
+
+
+@dataclass
+class _SessionState:
+    num_snapshots: int = 0
+    last_taken_at: float = 0.0
+    # Members in the latest snapshot, and the snapshot their current stretch started at
+    present: dict[int, int] = field(default_factory=dict)
+
+
+class SqliteBackend(StorageBackend):
+    """Everything in one SQLite database in WAL mode
+
+    WAL lets reports read while a snapshot is being written, and with
+    `synchronous=NORMAL` a commit only appends to the WAL file instead of
+    syncing the whole database.
+    """
+
+    def __init__(self, database_name: str) -> None:
+        self.database_name = database_name
+        self.connection: sqlite3.Connection = sqlite3.connect(
+            database_name, check_same_thread=False
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        has_presence_totals: bool = (
+            self.connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'presence_totals'"
+            ).fetchone()
+            is not None
+        )
+        self.connection.executescript(SCHEMA)
+        if not has_presence_totals:
+            # Databases from before `presence_totals` existed
+            with self.connection:
+                self.connection.execute(
+                    "INSERT INTO presence_totals (session_id, member_id, closed_snapshots) SELECT session_id, member_id, SUM(left_index - joined_index) FROM presence WHERE left_index IS NOT NULL GROUP BY session_id, member_id"
+                )
+        # Snapshot count and current members per session, loaded on first use
+        self._sessions: dict[int, _SessionState] = {}
+
+    def load_settings(
+        self, defaults: dict[str, Any], guild_id: Union[int, None] = None
+    ) -> dict[str, Any]:
+        loaded: dict[str, Any] = {
+            key: pickle.loads(value)
+            for key, value in self.connection.execute("SELECT key, value FROM settings")
+        }
+        with self.connection:
+            for key, default in defaults.items():
+                if key == "instructors" or key in loaded:
+                    continue
+                self.connection.execute(
+                    "INSERT INTO settings (key, value) VALUES (?, ?)",
+                    (key, pickle.dumps(default)),
+                )
+                loaded[key] = default
+            if guild_id is not None:
+                self._copy_shared_settings(guild_id)
+
+        if guild_id is not None:
+            loaded = {
+                key: pickle.loads(value)
+                for key, value in self.connection.execute(
+                    "SELECT key, value FROM guild_settings WHERE guild_id = ?",
+                    (guild_id,),
+                )
+            }
+        loaded["instructors"] = [user_id for (user_id,) in self._select_instructors(guild_id)]  # fmt: skip
+        return loaded
+
+    def _select_instructors(self, guild_id: Union[int, None]) -> sqlite3.Cursor:
+        if guild_id is None:
+            return self.connection.execute("SELECT user_id FROM instructors")
+        return self.connection.execute(
+            "SELECT user_id FROM guild_instructors WHERE guild_id = ?", (guild_id,)
+        )
+
+    def _copy_shared_settings(self, guild_id: int) -> None:
+        """Give a guild the shared settings (and instructors) it has no copy of, inside the caller's transaction"""
+        has_settings: bool = (
+            self.connection.execute(
+                "SELECT 1 FROM guild_settings WHERE guild_id = ? LIMIT 1", (guild_id,)
+            ).fetchone()
+            is not None
+        )
+        self.connection.execute(
+            "INSERT OR IGNORE INTO guild_settings (guild_id, key, value) SELECT ?, key, value FROM settings",
+            (guild_id,),
+        )
+        if not has_settings:
+            self.connection.execute(
+                "INSERT OR IGNORE INTO guild_instructors (guild_id, user_id) SELECT ?, user_id FROM instructors",
+                (guild_id,),
+            )
+
+    def write_setting(
+        self, key: str, value: Any, guild_id: Union[int, None] = None
+    ) -> None:
+        with self.connection:
+            if guild_id is None:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+                    (key, pickle.dumps(value)),
+                )
+                return
+
+            self._copy_shared_settings(guild_id)
+            self.connection.execute(
+                "INSERT OR REPLACE INTO guild_settings (guild_id, key, value) VALUES (?, ?, ?)",
+                (guild_id, key, pickle.dumps(value)),
+            )
+
+    def add_instructor(self, user_id: int, guild_id: Union[int, None] = None) -> None:
+        with self.connection:
+            if guild_id is None:
+                self.connection.execute(
+                    "INSERT OR IGNORE INTO instructors (user_id) VALUES (?)", (user_id,)
+                )
+                return
+
+            self._copy_shared_settings(guild_id)
+            self.connection.execute(
+                "INSERT OR IGNORE INTO guild_instructors (guild_id, user_id) VALUES (?, ?)",
+                (guild_id, user_id),
+            )
+
+    def remove_instructor(
+        self, user_id: int, guild_id: Union[int, None] = None
+    ) -> None:
+        with self.connection:
+            if guild_id is None:
+                self.connection.execute(
+                    "DELETE FROM instructors WHERE user_id = ?", (user_id,)
+                )
+                return
+
+            self._copy_shared_settings(guild_id)
+            self.connection.execute(
+                "DELETE FROM guild_instructors WHERE guild_id = ? AND user_id = ?",
+                (guild_id, user_id),
+            )
+
+    def _session_state(self, session_id: int) -> _SessionState:
+        if session_id not in self._sessions:
+            # Both are index lookups, so reopening a long session costs the same as a short one
+            latest: Union[tuple[int, float], None] = self.connection.execute(
+                "SELECT snapshot_index, taken_at FROM snapshots WHERE session_id = ? ORDER BY snapshot_index DESC LIMIT 1",
+                (session_id,),
+            ).fetchone()
+            num_snapshots: int = latest[0] + 1 if latest is not None else 0
+            last_taken_at: float = latest[1] if latest is not None else 0.0
+            present: dict[int, int] = dict(
+                self.connection.execute(
+                    "SELECT member_id, joined_index FROM presence WHERE session_id = ? AND left_index IS NULL",
+                    (session_id,),
+                )
+            )
+            self._sessions[session_id] = _SessionState(num_snapshots, last_taken_at, present)  # fmt: skip
+
+        return self._sessions[session_id]
+
+    def append_snapshot(
+        self, session_id: int, member_ids: list[int], taken_at: float
+    ) -> None:
+        self.append_snapshots(session_id, [(member_ids, taken_at)])
+
+    def append_snapshots(self, session_id: int, snapshots: list[TimedSnapshot]) -> None:
+        try:
+            with self.connection:
+                for member_ids, taken_at in snapshots:
+                    self._insert_snapshot(session_id, member_ids, taken_at)
+        except sqlite3.Error:
+            # The cached state already has the rolled back snapshots, reload it
+            self._sessions.pop(session_id, None)
+            raise
+
+    def sync_snapshots(self, session_id: Union[int, None] = None) -> None:
+        # Commits only reach the WAL with `synchronous=NORMAL`, a full checkpoint
+        # syncs the WAL and the database file (for every session at once)
+        self.connection.execute("PRAGMA wal_checkpoint(FULL)")
+
+    def _insert_snapshot(
+        self, session_id: int, member_ids: list[int], taken_at: float
+    ) -> None:
+        """Insert one snapshot, inside the caller's transaction"""
+        state: _SessionState = self._session_state(session_id)
+        members: set[int] = set(member_ids)
+        index: int = state.num_snapshots
+        # Times never decrease, so `snapshot_range` can search them
+        taken_at = max(taken_at, state.last_taken_at)
+
+        self.connection.execute(
+            "INSERT INTO snapshots (session_id, snapshot_index, taken_at) VALUES (?, ?, ?)",
+            (session_id, index, taken_at),
+        )
+        if members != state.present.keys():
+            joined: set[int] = members.difference(state.present)
+            left: set[int] = set(state.present).difference(members)
+            self.connection.executemany(
+                "INSERT INTO presence (session_id, member_id, joined_index) VALUES (?, ?, ?)",
+                [(session_id, member, index) for member in joined],
+            )
+            self.connection.executemany(
+                "UPDATE presence SET left_index = ? WHERE session_id = ? AND member_id = ? AND left_index IS NULL",
+                [(index, session_id, member) for member in left],
+            )
+            self.connection.executemany(
+                "INSERT INTO presence_totals (session_id, member_id, closed_snapshots) VALUES (?, ?, ?) ON CONFLICT DO UPDATE SET closed_snapshots = closed_snapshots + excluded.closed_snapshots",
+                [
+                    (session_id, member, index - state.present[member])
+                    for member in left
+                ],
+            )
+            for member in left:
+                del state.present[member]
+            for member in joined:
+                state.present[member] = index
+
+        state.num_snapshots += 1
+        state.last_taken_at = taken_at
+
+    def downsample_snapshots(self, session_id: int, factor: int) -> int:
+        snapshots: list[list[int]] = self.read_snapshots(session_id)
+        taken_ats: list[float] = self.snapshot_times(session_id)
+        kept: range = range(0, len(snapshots), factor)
+        try:
+            with self.connection:
+                for table in ("snapshots", "presence", "presence_totals"):
+                    self.connection.execute(
+                        f"DELETE FROM {table} WHERE session_id = ?", (session_id,)
+                    )
+                self._sessions[session_id] = _SessionState()
+                for index in kept:
+                    self._insert_snapshot(session_id, snapshots[index], taken_ats[index])  # fmt: skip
+        finally:
+            # Reloaded from whichever state the transaction left behind
+            self._sessions.pop(session_id, None)
+
+        return len(kept)
+
+    def read_snapshots(self, session_id: int) -> list[list[int]]:
+        num_snapshots: int = self._session_state(session_id).num_snapshots
+        snapshots: list[list[int]] = [[] for _ in range(num_snapshots)]
+        for member_id, joined_index, left_index in self.connection.execute(
+            "SELECT member_id, joined_index, COALESCE(left_index, ?) FROM presence WHERE session_id = ?",
+            (num_snapshots, session_id),
+        ):
+            for index in range(joined_index, left_index):
+                snapshots[index].append(member_id)
+
+        return snapshots
+
+    def snapshot_times(self, session_id: int) -> list[float]:
+        return [
+            taken_at
+            for (taken_at,) in self.connection.execute(
+                "SELECT taken_at FROM snapshots WHERE session_id = ? ORDER BY snapshot_index",
+                (session_id,),
+            )
+        ]
+
+    def _first_snapshot_after(
+        self, session_id: int, taken_at: float, inclusive: bool
+    ) -> int:
+        comparison: str = ">=" if inclusive else ">"
+        # `snapshots_session_time` makes this a binary search
+        row: Union[tuple[int], None] = self.connection.execute(
+            f"SELECT snapshot_index FROM snapshots WHERE session_id = ? AND taken_at {comparison} ? ORDER BY taken_at, snapshot_index LIMIT 1",
+            (session_id, taken_at),
+        ).fetchone()
+        return (
+            row[0] if row is not None else self._session_state(session_id).num_snapshots
+        )
+
+    def snapshot_range(
+        self, session_id: int, start: float, end: float
+    ) -> tuple[int, int]:
+        return (
+            self._first_snapshot_after(session_id, start, inclusive=True),
+            self._first_snapshot_after(session_id, end, inclusive=False),
+        )
+
+    def member_counts(self, session_id: int) -> tuple[int, dict[int, int]]:
+        state: _SessionState = self._session_state(session_id)
+        counts: dict[int, int] = dict(
+            self.connection.execute(
+                "SELECT member_id, closed_snapshots FROM presence_totals WHERE session_id = ?",
+                (session_id,),
+            )
+        )
+        for member, joined_index in state.present.items():
+            counts[member] = counts.get(member, 0) + state.num_snapshots - joined_index
+        return state.num_snapshots, counts
+
+    def member_intervals(self, session_id: int) -> tuple[int, Intervals]:
+        num_snapshots: int = self._session_state(session_id).num_snapshots
+        intervals: Intervals = {}
+        for member_id, joined_index, left_index in self.connection.execute(
+            "SELECT member_id, joined_index, COALESCE(left_index, ?) FROM presence WHERE session_id = ? ORDER BY member_id, joined_index",
+            (num_snapshots, session_id),
+        ):
+            intervals.setdefault(member_id, []).append((joined_index, left_index))
+        return num_snapshots, intervals
+
+    def clear_snapshots(self, session_id: int) -> bool:
+        with self.connection:
+            self.connection.execute(
+                "DELETE FROM snapshots WHERE session_id = ?", (session_id,)
+            )
+            self.connection.execute(
+                "DELETE FROM presence WHERE session_id = ?", (session_id,)
+            )
+            self.connection.execute(
+                "DELETE FROM presence_totals WHERE session_id = ?", (session_id,)
+            )
+        self._sessions.pop(session_id, None)
+
+        return True
+
+    def clear_all_snapshots(self) -> None:
+        with self.connection:
+            self.connection.execute("DELETE FROM snapshots")
+            self.connection.execute("DELETE FROM presence")
+            self.connection.execute("DELETE FROM presence_totals")
+        self._sessions.clear()
+
+    def load_sessions(self) -> dict[int, dict[str, Any]]:
+        return {
+            session_id: pickle.loads(data)
+            for session_id, data in self.connection.execute(
+                "SELECT session_id, data FROM sessions"
+            )
+        }
+
+    def save_sessions(self, sessions: dict[int, dict[str, Any]]) -> None:
+        with self.connection:
+            self.connection.execute("DELETE FROM sessions")
+            self.connection.executemany(
+                "INSERT INTO sessions (session_id, data) VALUES (?, ?)",
+                [
+                    (session_id, pickle.dumps(session))
+                    for session_id, session in sessions.items()
+                ],
+            )
+
+    def archive_session(self, session: dict[str, Any], results: ArchiveResults) -> None:
+        with self.connection:
+            if self.connection.execute(
+                "SELECT 1 FROM archived_sessions WHERE archive_id = ?",
+                (session["archive_id"],),
+            ).fetchone():
+                # Archived again after being resumed, members missing from the new results must lose the old ones
+                self.connection.execute(
+                    "DELETE FROM archived_attendance WHERE archive_id = ?",
+                    (session["archive_id"],),
+                )
+            self.connection.execute(
+                "INSERT OR REPLACE INTO archived_sessions (archive_id, ended_at, data) VALUES (?, ?, ?)",
+                (session["archive_id"], session["ended_at"], pickle.dumps(session)),
+            )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO archived_attendance (member_id, archive_id, attendance_ratio, in_attendance) VALUES (?, ?, ?, ?)",
+                [
+                    (member_id, session["archive_id"], ratio, attended)
+                    for member_id, (ratio, attended) in results.items()
+                ],
+            )
+
+    def member_history(
+        self, member_id: int, since: Union[float, None] = None
+    ) -> list[ArchiveRow]:
+        # The (member_id, archive_id) primary key makes this a range scan over one member
+        return [
+            (pickle.loads(data), ratio, bool(attended))
+            for data, ratio, attended in self.connection.execute(
+                "SELECT s.data, a.attendance_ratio, a.in_attendance FROM archived_attendance a JOIN archived_sessions s USING (archive_id) WHERE a.member_id = ? AND s.ended_at >= ? ORDER BY s.ended_at",
+                (member_id, since or 0.0),
+            )
+        ]
+
+    def drop_archived_sessions(self, ended_before: float) -> int:
+        with self.connection:
+            self.connection.execute(
+                "DELETE FROM archived_attendance WHERE archive_id IN (SELECT archive_id FROM archived_sessions WHERE ended_at < ?)",
+                (ended_before,),
+            )
+            return self.connection.execute(
+                "DELETE FROM archived_sessions WHERE ended_at < ?", (ended_before,)
+            ).rowcount
+
+    def size(self) -> int:
+        return sum(
+            os.path.getsize(path)
+            for path in (self.database_name, f"{self.database_name}-wal")
+            if os.path.exists(path)
+        )
+
+    def stats(self) -> StorageStats:
+        page_size: int = self.connection.execute("PRAGMA page_size").fetchone()[0]
+        page_count: int = self.connection.execute("PRAGMA page_count").fetchone()[0]
+        free_pages: int = self.connection.execute("PRAGMA freelist_count").fetchone()[0]
+        # The WAL is never live data, a checkpoint moves it into the database
+        return StorageStats(
+            file_bytes=self.size(), live_bytes=(page_count - free_pages) * page_size
+        )
+
+    def compact(self) -> None:
+        # VACUUM rebuilds the database through the WAL, SQLite swaps it in atomically
+        self.connection.execute("VACUUM")
+        self.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self) -> None:
+        self.connection.close()
@@ -0,0 +1,44 @@
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable
+
+from cogs.storage.base import StorageBackend
+
+
+class StorageWorker:
+    """Runs every backend call on one dedicated thread that owns the backend
+
+    The backend is created on that thread and never touched from anywhere else,
+    so the event loop never blocks on disk. Calls are queued in submission order,
+    which keeps writes serialised and reads consistent with every earlier write.
+    `in_flight` counts the calls still being awaited on the event loop.
+    """
+
+    def __init__(self, factory: Callable[[], StorageBackend]) -> None:
+        self._executor: ThreadPoolExecutor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="storage"
+        )
+        self._backend: StorageBackend
+        self.in_flight: int = 0
+        self._opened: Future = self._executor.submit(self._open, factory)
+
+    def _open(self, factory: Callable[[], StorageBackend]) -> None:
+        self._backend = factory()
+
+    def _call(self, method: str, args: tuple) -> Any:
+        self._opened.result()  # Re-raise if the backend failed to open
+        return getattr(self._backend, method)(*args)
+
+    def submit(self, method: str, *args: Any) -> Future:
+        return self._executor.submit(self._call, method, args)
+
+    async def call(self, method: str, *args: Any) -> Any:
+        self.in_flight += 1
+        try:
+            return await asyncio.wrap_future(self.submit(method, *args))
+        finally:
+            self.in_flight -= 1
+
+    async def close(self) -> None:
+        await self.call("close")
+        self._executor.shutdown()
@@ -0,0 +1,107 @@
+import logging
+import os
+from typing import Union
+
+import discord
+from discord import app_commands
+from discord.ext import commands
+
+import cogs.utils.sharding as sharding
+import cogs.utils.shelve_utils as shelve_utils
+from cogs.utils.voice_trace import TraceRecorder, command_options
+
+
+class TraceCog(
+    commands.Cog,
+    name="trace",
+):
+    """Records voice channel membership changes and commands to `TRACE_FILE` when it's set
+
+    The trace can be replayed offline against the attendance cog with
+    `python3 -m tools.replay_trace`, see `cogs.utils.voice_trace` for its format.
+    Each guild's settings are recorded on load, and the guild's after every
+    command outside `/attendance`, so the replay runs with the settings that
+    were in effect.
+    """
+
+    def __init__(self, client: commands.Bot) -> None:
+        self.client = client
+        self.logger = logging.getLogger(f"cogs.{self.__cog_name__}")
+        self.recorder: Union[TraceRecorder, None] = None
+
+    async def cog_load(self) -> None:
+        path: Union[str, None] = os.getenv("TRACE_FILE")
+        if not path:
+            return
+
+        self.recorder = TraceRecorder(path)
+        for guild_id in sharding.served_guild_ids():
+            self.recorder.settings(guild_id, shelve_utils.get_settings(guild_id))
+        if self.client.is_ready():
+            self.record_channels()  # Reloaded while connected
+        self.logger.info(f"Recording a voice trace to {path}")
+
+    async def cog_unload(self) -> None:
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+
+    def record_channels(self) -> None:
+        channels: dict[int, tuple[str, list[int]]] = {}
+        for guild_id in sharding.served_guild_ids():
+            guild: Union[discord.Guild, None] = self.client.get_guild(guild_id)
+            if guild is None:
+                continue
+
+            for channel in [*guild.voice_channels, *guild.stage_channels]:
+                channels[channel.id] = (channel.name, [member.id for member in channel.members])  # fmt: skip
+        if channels:
+            self.recorder.channels(channels)
+
+    @commands.Cog.listener()
+    async def on_ready(self) -> None:
+        if self.recorder is not None:
+            self.record_channels()
+
+    @commands.Cog.listener()
+    async def on_voice_state_update(
+        self,
+        member: discord.Member,
+        before: discord.VoiceState,
+        after: discord.VoiceState,
+    ) -> None:
+        if self.recorder is None:
+            return
+
+        before_channel: Union[int, None] = before.channel.id if before.channel else None
+        after_channel: Union[int, None] = after.channel.id if after.channel else None
+        if before_channel != after_channel:
+            self.recorder.voice(member.id, before_channel, after_channel)
+
+    @commands.Cog.listener()
+    async def on_interaction(self, interaction: discord.Interaction) -> None:
+        if self.recorder is None or interaction.type is not discord.InteractionType.application_command:  # fmt: skip
+            return
+
+        command, options = command_options(interaction.data)
+        self.recorder.command(command, interaction.user.id, options)
+
+    @commands.Cog.listener()
+    async def on_app_command_completion(
+        self,
+        interaction: discord.Interaction,
+        command: Union[app_commands.Command, app_commands.ContextMenu],
+    ) -> None:
+        if self.recorder is None:
+            return
+
+        if command.qualified_name.split()[0] != "attendance":
+            self.recorder.settings(
+                interaction.guild_id, shelve_utils.get_settings(interaction.guild_id)
+            )
+
+
+async def setup(client: commands.Bot) -> None:
+    cog: TraceCog = TraceCog(client)
+    await client.add_cog(cog, guilds=sharding.guild_objects())
+    cog.logger.info("Cog loaded")
@@ -0,0 +1,286 @@
+"""Member x snapshot presence matrix for one polling session, and the analytics built on it
+
+Rows are members and columns are snapshots. With NumPy installed the matrix is
+a 2D boolean array and each statistic is computed for every member at once.
+Without it, each row is a Python int used as a bitset (bit `i` set if the member
+was in snapshot `i`), which gives the same results from a handful of big-int
+operations per row.
+
+    num_snapshots, intervals = await storage.call("member_intervals", session_id)
+    matrix = AttendanceMatrix.from_intervals(num_snapshots, intervals)
+    matrix.ratios(), matrix.longest_presence(), matrix.late_joins(grace=100)
+"""
+
+from bisect import bisect_left
+from dataclasses import dataclass
+from itertools import accumulate
+from typing import Any, Final, Iterable, Iterator, Sequence, Union
+
+try:
+    import numpy
+except ImportError:  # Optional, rows fall back to int bitsets
+    numpy = None
+
+NUMPY_AVAILABLE: Final[bool] = numpy is not None
+
+# Each member's [joined, left) snapshot index ranges, oldest first
+Intervals = dict[int, list[tuple[int, int]]]
+
+
+def passing_members(
+    ratios: dict[int, float], thresholds: Iterable[float]
+) -> dict[float, list[int]]:
+    """Members whose ratio meets each threshold, from one sort instead of a scan per threshold"""
+    ranked: list[int] = sorted(ratios, key=ratios.__getitem__)
+    ranked_ratios: list[float] = [ratios[member] for member in ranked]
+
+    passing: dict[float, list[int]] = {}
+    for threshold in thresholds:
+        start: int = bisect_left(ranked_ratios, threshold)
+        passing[threshold] = ranked[start:]
+    return passing
+
+
+def clip_intervals(intervals: Intervals, start: int, end: int) -> Intervals:
+    """Intervals restricted to snapshots [start, end) and re-indexed from `start`"""
+    clipped: Intervals = {}
+    for member, member_ranges in intervals.items():
+        overlapping: list[tuple[int, int]] = [
+            (max(joined, start) - start, min(left, end) - start)
+            for joined, left in member_ranges
+            if joined < end and left > start
+        ]
+        if overlapping:
+            clipped[member] = overlapping
+    return clipped
+
+
+def sample_weights(
+    snapshot_times: Sequence[float], interval: float, max_intervals: int
+) -> list[float]:
+    """Seconds each snapshot stands for, from when it was taken until the next one
+
+    The last snapshot stands for one interval. Spacing of more than `max_intervals`
+    intervals is a gap (a restart, or a stopped session) rather than missed ticks,
+    so the snapshot before it also only stands for one interval.
+    """
+    longest: float = interval * max_intervals
+    weights: list[float] = []
+    for taken_at, next_taken_at in zip(snapshot_times, snapshot_times[1:]):
+        spacing: float = next_taken_at - taken_at
+        weights.append(spacing if spacing <= longest else interval)
+    if snapshot_times:
+        weights.append(interval)
+    return weights
+
+
+@dataclass
+class MatrixReport:
+    """Every per-member statistic a report shows, see `AttendanceMatrix.report`"""
+
+    attendance_ratios: dict[int, float]
+    snapshot_counts: dict[int, int]
+    longest_presence: dict[int, int]
+    # When each member was first and last seen
+    seen_between: dict[int, tuple[float, float]]
+    late_joins: set[int]
+    early_leaves: set[int]
+
+
+def _runs(row: int) -> Iterator[tuple[int, int]]:
+    """Index of the first and last snapshot of every run of set bits in a bitset row"""
+    # The lowest bit of every run, and the highest bit of every run
+    starts: int = row & ~(row << 1)
+    ends: int = row & ~(row >> 1)
+    while starts:
+        start_bit: int = starts & -starts
+        end_bit: int = ends & -ends
+        yield start_bit.bit_length() - 1, end_bit.bit_length() - 1
+        starts ^= start_bit
+        ends ^= end_bit
+
+
+class AttendanceMatrix:
+    def __init__(
+        self,
+        members: list[int],
+        num_snapshots: int,
+        rows: Any,
+        first_snapshot: int = 0,
+    ) -> None:
+        self.members = members
+        self.num_snapshots = num_snapshots
+        self.rows = rows
+        # Index of the session snapshot in column 0, for a matrix over part of a session
+        self.first_snapshot = first_snapshot
+        self._spans: Union[dict[int, tuple[int, int]], None] = None
+
+    @property
+    def uses_numpy(self) -> bool:
+        return NUMPY_AVAILABLE and isinstance(self.rows, numpy.ndarray)
+
+    @classmethod
+    def from_intervals(
+        cls,
+        num_snapshots: int,
+        intervals: Intervals,
+        use_numpy: bool = NUMPY_AVAILABLE,
+        first_snapshot: int = 0,
+    ) -> "AttendanceMatrix":
+        """Build from storage's `member_intervals`, `use_numpy=False` forces the bitset rows"""
+        members: list[int] = list(intervals)
+        if use_numpy:
+            rows = numpy.zeros((len(members), num_snapshots), dtype=bool)
+            for row, member in enumerate(members):
+                for joined, left in intervals[member]:
+                    rows[row, joined:left] = True
+        else:
+            rows = [
+                sum(
+                    ((1 << (left - joined)) - 1) << joined
+                    for joined, left in intervals[member]
+                )
+                for member in members
+            ]
+        return cls(members, num_snapshots, rows, first_snapshot)
+
+    @classmethod
+    def from_snapshots(
+        cls, snapshots: Iterable[Iterable[int]], use_numpy: bool = NUMPY_AVAILABLE
+    ) -> "AttendanceMatrix":
+        """Build from materialised snapshots, prefer `from_intervals` where storage can provide them"""
+        intervals: Intervals = {}
+        present_since: dict[int, int] = {}
+        num_snapshots: int = 0
+        for snapshot in snapshots:
+            present: set[int] = set(snapshot)
+            for member in set(present_since).difference(present):
+                intervals[member].append((present_since.pop(member), num_snapshots))
+            for member in present.difference(present_since):
+                intervals.setdefault(member, [])
+                present_since[member] = num_snapshots
+            num_snapshots += 1
+
+        for member, since in present_since.items():
+            intervals[member].append((since, num_snapshots))
+
+        return cls.from_intervals(num_snapshots, intervals, use_numpy)
+
+    def counts(self) -> dict[int, int]:
+        """Snapshots each member was in"""
+        if self.uses_numpy:
+            return dict(zip(self.members, self.rows.sum(axis=1).tolist()))
+        return {member: row.bit_count() for member, row in zip(self.members, self.rows)}
+
+    def ratios(self) -> dict[int, float]:
+        if self.num_snapshots == 0:
+            return {member: 0.0 for member in self.members}
+        return {
+            member: count / self.num_snapshots
+            for member, count in self.counts().items()
+        }
+
+    def spans(self) -> dict[int, tuple[int, int]]:
+        """Index of the first and last snapshot each member was in"""
+        if self._spans is None:
+            self._spans = self._compute_spans()
+        return self._spans
+
+    def _compute_spans(self) -> dict[int, tuple[int, int]]:
+        if self.uses_numpy:
+            if self.num_snapshots == 0:
+                return {}
+            present = self.rows.any(axis=1)
+            first = self.rows.argmax(axis=1)
+            last = self.num_snapshots - 1 - self.rows[:, ::-1].argmax(axis=1)
+            return {
+                member: (first_index, last_index)
+                for member, is_present, first_index, last_index in zip(
+                    self.members, present.tolist(), first.tolist(), last.tolist()
+                )
+                if is_present
+            }
+
+        return {
+            member: ((row & -row).bit_length() - 1, row.bit_length() - 1)
+            for member, row in zip(self.members, self.rows)
+            if row
+        }
+
+    def longest_presence(self) -> dict[int, int]:
+        """Longest run of consecutive snapshots each member was in"""
+        if self.uses_numpy:
+            # With an absent column after every row, the flattened matrix only changes
+            # value where a run starts or just after it ends, so changes pair up
+            row_length: int = self.num_snapshots + 1
+            padded = numpy.zeros((len(self.members), row_length), dtype=bool)
+            padded[:, :-1] = self.rows
+            flat = padded.ravel()
+            changes = numpy.flatnonzero(flat[1:] != flat[:-1]) + 1
+            if flat.size and flat[0]:
+                changes = numpy.concatenate(([0], changes))
+            run_starts, run_ends = changes[0::2], changes[1::2]
+            longest = numpy.zeros(len(self.members), dtype=numpy.int64)
+            numpy.maximum.at(longest, run_starts // row_length, run_ends - run_starts)
+            return dict(zip(self.members, longest.tolist()))
+
+        return {
+            member: max((last - first + 1 for first, last in _runs(row)), default=0)
+            for member, row in zip(self.members, self.rows)
+        }
+
+    def weighted_ratios(self, weights: Sequence[float]) -> dict[int, float]:
+        """Share of the session's time each member was present for
+
+        `weights` has the seconds each snapshot stands for (see `sample_weights`),
+        so a snapshot taken after missed ticks counts for the time it covered.
+        """
+        total: float = sum(weights)
+        if not total:
+            return self.ratios()
+        if self.uses_numpy:
+            present = self.rows @ numpy.asarray(weights, dtype=float)
+            return dict(zip(self.members, (present / total).tolist()))
+
+        elapsed: list[float] = list(accumulate(weights, initial=0.0))
+        return {
+            member: sum(
+                elapsed[last + 1] - elapsed[first] for first, last in _runs(row)
+            )
+            / total  # fmt: skip
+            for member, row in zip(self.members, self.rows)
+        }
+
+    def late_joins(self, grace: int) -> set[int]:
+        """Members first seen more than `grace` snapshots after the session started"""
+        return {member for member, (first, _) in self.spans().items() if first > grace}
+
+    def early_leaves(self, grace: int) -> set[int]:
+        """Members last seen more than `grace` snapshots before the session ended"""
+        cutoff: int = self.num_snapshots - 1 - grace
+        return {member for member, (_, last) in self.spans().items() if last < cutoff}
+
+    def report(
+        self,
+        snapshot_times: Sequence[float],
+        interval: float,
+        max_intervals: int,
+        grace: int,
+    ) -> MatrixReport:
+        """All of a report's statistics in one call, for reports to run off the event loop"""
+        return MatrixReport(
+            attendance_ratios=self.weighted_ratios(
+                sample_weights(snapshot_times, interval, max_intervals)
+            ),
+            snapshot_counts=self.counts(),
+            longest_presence=self.longest_presence(),
+            seen_between={
+                member: (snapshot_times[first], snapshot_times[last])
+                for member, (first, last) in self.spans().items()
+            },
+            late_joins=self.late_joins(grace),
+            early_leaves=self.early_leaves(grace),
+        )
+
+    def passing(self, thresholds: Iterable[float]) -> dict[float, list[int]]:
+        return passing_members(self.ratios(), thresholds)
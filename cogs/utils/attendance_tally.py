@@ -0,0 +1,15 @@
+from dataclasses import dataclass, field
+from typing import Iterable
+
+
+@dataclass
+class AttendanceTally:
+    """Running per-member snapshot counts for the current snapshot log"""
+
+    num_snapshots: int = 0
+    totals: dict[int, int] = field(default_factory=dict)
+
+    def add_snapshot(self, member_ids: Iterable[int]) -> None:
+        self.num_snapshots += 1
+        for member in member_ids:
+            self.totals[member] = self.totals.get(member, 0) + 1
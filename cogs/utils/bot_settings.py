@@ -0,0 +1,22 @@
+from dataclasses import dataclass, field, fields
+
+import cogs.utils.constants as constants
+
+
+@dataclass
+class BotSettings:
+    """In-memory copy of every persisted setting
+
+    Field names double as the shelve keys they are persisted under.
+    """
+
+    instructors: set[int] = field(default_factory=set)
+    minimum_attendance_rate: float = constants.DEFAULT_MINIMUM_ATTENDANCE_RATE_PERCENTAGE  # fmt: skip
+    snapshot_interval: int = constants.DEFAULT_SNAPSHOT_INTERVAL_SECONDS
+    auto_clear_snapshots_on_new_session: bool = constants.DEFAULT_AUTO_CLEAR_SNAPSHOTS_ON_NEW_SESSION  # fmt: skip
+    auto_clear_snapshots_after_attendance_report: bool = constants.DEFAULT_AUTO_CLEAR_SNAPSHOTS_AFTER_ATTENDANCE_REPORT  # fmt: skip
+    important_attendance_responses_are_ephemeral: bool = constants.DEFAULT_IMPORTANT_ATTENDANCE_RESPONSES_ARE_EPHEMERAL  # fmt: skip
+    tracking_mode: str = constants.DEFAULT_TRACKING_MODE
+
+
+SETTING_KEYS: tuple[str, ...] = tuple(setting.name for setting in fields(BotSettings))
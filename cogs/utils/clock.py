@@ -0,0 +1,37 @@
+"""Unix timestamps that advance with the monotonic clock
+
+`time.time()` jumps when the system clock is adjusted (e.g. by NTP) and could
+make a session's snapshot times go backwards or skip mid-session. The wall clock
+is read once, when this module is imported, and every timestamp after that adds
+the monotonic time elapsed since, so durations within a process are exact while
+timestamps stay comparable across restarts and can be shown in Discord.
+
+    started_at: float = clock.now()
+
+`set_source` swaps in another clock, such as the simulated one `tools.replay_trace`
+runs a recorded class on.
+"""
+
+import time
+from typing import Callable, Final, Union
+
+_WALL_ANCHOR: Final[float] = time.time()
+_MONOTONIC_ANCHOR: Final[float] = time.monotonic()
+
+
+def _monotonic_wall_time() -> float:
+    return _WALL_ANCHOR + (time.monotonic() - _MONOTONIC_ANCHOR)
+
+
+_source: Callable[[], float] = _monotonic_wall_time
+
+
+def now() -> float:
+    return _source()
+
+
+def set_source(source: Union[Callable[[], float], None]) -> None:
+    """Read timestamps from `source` from now on, or from the monotonic wall clock again if None"""
+    global _source
+
+    _source = source or _monotonic_wall_time
@@ -0,0 +1,41 @@
+import time
+from typing import Final, Union
+
+import discord
+from discord import app_commands
+
+import cogs.utils.metrics as metrics
+
+# `Interaction.extras` key for when the tree accepted the interaction
+STARTED_AT_KEY: Final[str] = "command_started_at"
+
+
+class TimedCommandTree(app_commands.CommandTree):
+    """Times every app command's handler for `metrics.COMMAND_SECONDS`
+
+    The clock starts when the tree accepts an interaction, before the command's
+    checks run. Failed commands are observed here, the metrics cog observes the
+    ones that complete.
+    """
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        interaction.extras[STARTED_AT_KEY] = time.perf_counter()
+        return True
+
+    async def on_error(
+        self, interaction: discord.Interaction, error: app_commands.AppCommandError
+    ) -> None:
+        status: str = "check_failed" if isinstance(error, app_commands.CheckFailure) else "error"  # fmt: skip
+        observe_command(interaction, status)
+        await super().on_error(interaction, error)
+
+
+def observe_command(interaction: discord.Interaction, status: str) -> None:
+    """Record how long the interaction's command took, ending now"""
+    started_at: Union[float, None] = interaction.extras.get(STARTED_AT_KEY)
+    if started_at is None or interaction.command is None:
+        return
+
+    metrics.COMMAND_SECONDS.observe(
+        time.perf_counter() - started_at, interaction.command.qualified_name, status
+    )
@@ -1,21 +1,72 @@
 from typing import Final
 
 SHELVE_DATABASE_NAME: Final[str] = "database"
+SNAPSHOT_LOG_DIRECTORY: Final[str] = "snapshots"
+SQLITE_DATABASE_NAME: Final[str] = "database.sqlite3"
+DEFAULT_STORAGE_BACKEND: Final[str] = "shelve"
+STORAGE_SERVICE_SOCKET: Final[str] = "storage.sock"
+DEFAULT_GATEWAY_PROFILE: Final[str] = "lean"
+DEFAULT_SNAPSHOT_DURABILITY: Final[str] = "batched"
+# A batched session's buffered snapshots are written once there are this many, or they are this old
+SNAPSHOT_FLUSH_EVERY_SNAPSHOTS: Final[int] = 10
+SNAPSHOT_FLUSH_EVERY_SECONDS: Final[int] = 30
+# Retention is off unless set in days, stopped sessions' snapshots are kept forever by default
+DEFAULT_SESSION_RETENTION_DAYS: Final[float] = 0
+DEFAULT_SNAPSHOT_DOWNSAMPLE_AFTER_DAYS: Final[float] = 0
+DEFAULT_ARCHIVE_RETENTION_DAYS: Final[float] = 0
+# Below `SNAPSHOT_MAX_WEIGHT_INTERVALS`, so a downsampled session resumed at its old interval still credits every snapshot
+SNAPSHOT_DOWNSAMPLE_FACTOR: Final[int] = 4
+# The maintenance job only compacts a database at least this big, with at least this much of it dead space
+STORAGE_COMPACTION_MIN_BYTES: Final[int] = 1024 * 1024
+STORAGE_COMPACTION_MIN_FRAGMENTATION: Final[float] = 0.5
 
 DEFAULT_MINIMUM_ATTENDANCE_RATE_PERCENTAGE: Final[float] = 0.5
 DEFAULT_SNAPSHOT_INTERVAL_SECONDS: Final[int] = 3
 DEFAULT_AUTO_CLEAR_SNAPSHOTS_ON_NEW_SESSION: Final[bool] = False
 DEFAULT_AUTO_CLEAR_SNAPSHOTS_AFTER_ATTENDANCE_REPORT: Final[bool] = False
 DEFAULT_IMPORTANT_ATTENDANCE_RESPONSES_ARE_EPHEMERAL: Final[bool] = True
+DEFAULT_TRACKING_MODE: Final[str] = "polling"
+
+ATTENDANCE_GRACE_SECONDS: Final[int] = 300
+REPORT_PASSING_THRESHOLDS: Final[tuple[float, ...]] = (0.5, 0.6, 0.75)
 
 MAXMIMUM_EMBEDS_PER_MESSAGE: Final[int] = 10
 MAXMIMUM_EMBED_DESCRIPTION_LENGTH: Final[int] = 3_000
+MAXIMUM_MESSAGE_EMBED_CHARACTERS: Final[int] = 6_000
+REPORT_PAGE_FOOTER_RESERVE: Final[int] = 100
 
-CSV_HEADERS: Final[str] = "user_id,in_attendance"
+CSV_HEADERS: Final[tuple[str, ...]] = (
+    "user_id",
+    "in_attendance",
+    "snapshots",
+    "attendance_ratio",
+    "first_seen",
+    "last_seen",
+    "longest_presence",
+)
+CSV_EXPORT_CHUNK_ROWS: Final[int] = 1_000
+CSV_EXPORT_SPOOL_BYTES: Final[int] = 8 * 1024 * 1024
+DEFAULT_ATTACHMENT_SIZE_LIMIT_BYTES: Final[int] = 25 * 1024 * 1024
 
 MYSTBIN_BASE_API: Final[str] = "https://api.mystb.in"
-MYSTBIN_PASTE_API: Final[str] = f"{MYSTBIN_BASE_API}/paste"
+MYSTBIN_BASE_URL: Final[str] = "https://mystb.in"
+MYSTBIN_PASTE_ENDPOINT: Final[str] = "/paste"
+MYSTBIN_REQUEST_TIMEOUT_SECONDS: Final[float] = 10.0
+MYSTBIN_MAX_RETRIES: Final[int] = 3
+MYSTBIN_RETRY_BACKOFF_SECONDS: Final[float] = 0.5
+MYSTBIN_MAX_RETRY_AFTER_SECONDS: Final[float] = 30.0
+MYSTBIN_MAX_CONCURRENT_UPLOADS: Final[int] = 4
 
 BUTTON_VIEW_TIMEOUT: Final[int] = 300
 
 PRESENCE_TASK_LOOP_SECONDS: Final[int] = 30
+VOICE_RECONCILE_TASK_LOOP_SECONDS: Final[int] = 60
+SESSION_CHECKPOINT_SECONDS: Final[int] = 60
+STORAGE_MAINTENANCE_TASK_LOOP_HOURS: Final[float] = 6
+# A snapshot this late counts as late in the scheduler's stats
+SNAPSHOT_LATE_TICK_SECONDS: Final[float] = 0.5
+# Time between two snapshots beyond this many intervals is a gap, nobody is credited for it
+SNAPSHOT_MAX_WEIGHT_INTERVALS: Final[int] = 5
+
+DEFAULT_METRICS_HOST: Final[str] = "127.0.0.1"
+METRICS_ENDPOINT: Final[str] = "/metrics"
@@ -0,0 +1,88 @@
+import csv
+import gzip
+import io
+import os
+import tempfile
+from datetime import datetime, timezone
+from functools import lru_cache
+from itertools import islice
+from typing import IO, Iterable, Iterator, Union
+
+import cogs.utils.constants as constants
+from cogs.utils.member_attendance import MemberAttendance
+
+
+@lru_cache(maxsize=4096)
+def _format_seconds(seconds: int) -> str:
+    return datetime.fromtimestamp(seconds, timezone.utc).isoformat()
+
+
+def _format_timestamp(timestamp: Union[float, None]) -> str:
+    # Polling seen times fall on snapshot ticks, so most members share a handful of values
+    return "" if timestamp is None else _format_seconds(int(timestamp))
+
+
+def _row(record: MemberAttendance) -> tuple:
+    return (
+        record.member_id,
+        record.in_attendance,
+        "" if record.snapshots is None else record.snapshots,
+        f"{record.attendance_ratio:.4f}",
+        _format_timestamp(record.first_seen),
+        _format_timestamp(record.last_seen),
+        "" if record.longest_presence is None else record.longest_presence,
+    )
+
+
+def iter_attendance_csv(records: Iterable[MemberAttendance]) -> Iterator[str]:
+    """The CSV in chunks of `CSV_EXPORT_CHUNK_ROWS` rows, never holding the whole file as one string"""
+    chunk: io.StringIO = io.StringIO()
+    writer = csv.writer(chunk, lineterminator="\n")
+    writer.writerow(constants.CSV_HEADERS)
+
+    records = iter(records)
+    while True:
+        writer.writerows(map(_row, islice(records, constants.CSV_EXPORT_CHUNK_ROWS)))
+        if chunk.tell() == 0:
+            return
+        yield chunk.getvalue()
+        chunk.seek(0)
+        chunk.truncate()
+
+
+def attendance_csv_text(records: Iterable[MemberAttendance]) -> str:
+    return "".join(iter_attendance_csv(records))
+
+
+def _write_file(
+    records: Iterable[MemberAttendance], compress: bool
+) -> tempfile.SpooledTemporaryFile:
+    output: tempfile.SpooledTemporaryFile = tempfile.SpooledTemporaryFile(
+        max_size=constants.CSV_EXPORT_SPOOL_BYTES
+    )
+    binary: IO[bytes] = gzip.GzipFile(fileobj=output, mode="wb", compresslevel=6) if compress else output  # fmt: skip
+    for chunk in iter_attendance_csv(records):
+        binary.write(chunk.encode())
+    if compress:
+        binary.close()  # Writes the gzip trailer, leaves `output` open
+
+    output.seek(0)
+    return output
+
+
+def export_attendance_csv(
+    records: list[MemberAttendance], size_limit: int
+) -> tuple[tempfile.SpooledTemporaryFile, bool]:
+    """Build the export as a file, gzipped if the plain CSV would be over `size_limit` bytes
+
+    The file is written in chunks and only kept in memory up to
+    `CSV_EXPORT_SPOOL_BYTES`, past that it spills to a temporary file on disk.
+    Returns the file (rewound) and whether it was compressed.
+    """
+    output: tempfile.SpooledTemporaryFile = _write_file(records, compress=False)
+    if output.seek(0, os.SEEK_END) <= size_limit:
+        output.seek(0)
+        return output, False
+
+    output.close()
+    return _write_file(records, compress=True), True
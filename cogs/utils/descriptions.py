@@ -5,9 +5,16 @@ ATTENDANCE_START_SESSION: Final[str] = "Start an attendance session, an instruct
 ATTENDANCE_STOP_SESSION: Final[str] = "Stop the active attendance session"
 ATTENDANCE_STATS_SESSION: Final[str] = "Get stats for the active attendance session"
 ATTENDANCE_GET_ATTENDANCE: Final[str] = "Get an attendance report for your last active attendance session"
+ATTENDANCE_GET_FROM_MINUTE: Final[str] = "Only report snapshots taken this many minutes or more into the session (polling sessions only)"
+ATTENDANCE_GET_TO_MINUTE: Final[str] = "Only report snapshots taken up to this many minutes into the session (polling sessions only)"
 ATTENDANCE_CLEAR_ATTENDANCE: Final[str] = "Permanently delete all snapshots from the last active attendance session"
 
 ATTENDANCE_START_SESSION_CHANNEL: Final[str] = "The VC to start taking attendance in"
+ATTENDANCE_START_SESSION_INTERVAL: Final[str] = "Snapshot interval, in seconds, for this session only (defaults to the snapshot interval setting)"
+ATTENDANCE_SESSION_CHANNEL: Final[str] = "The VC of the session, only needed when more than one session could match"
+ATTENDANCE_HISTORY: Final[str] = "Get a member's attendance across archived sessions"
+ATTENDANCE_HISTORY_MEMBER: Final[str] = "The member to get attendance history for"
+ATTENDANCE_HISTORY_DAYS: Final[str] = "Only include sessions that ended in this many days (defaults to every archived session)"
 
 INSTRUCTOR_ADD: Final[str] = "Add a user to the instructor whitelist"
 INSTRUCTOR_REMOVE: Final[str] = "Remove an existing instructor from the instructor whitelist"
@@ -16,6 +23,9 @@ INSTRUCTOR_SHOW: Final[str] = "Show the current list of users on the instructor
 INSTRUCTOR_ADD_MEMBER: Final[str] = "Non-instructor user to add to the instructor whitelist"
 INSTRUCTOR_REMOVE_MEMBER: Final[str] = "Existing instructor user to remove from the instructor whitelist"
 
+STORAGE_STATS: Final[str] = "Get the database's size on disk, how much of it is live data, and the retention settings"
+STORAGE_COMPACT: Final[str] = "Rewrite the database without the space left behind by deleted and rewritten data"
+
 SETTINGS_GET_MINIMUM_ATTENDANCE: Final[str] = "Get the current minimum attendance rate"
 SETTINGS_SET_MINIMUM_ATTENDANCE: Final[str] = "Set the minimum attendance rate"
 SETTINGS_GET_INTERVAL: Final[str] = "Get the current snapshot interval"
@@ -24,9 +34,12 @@ SETTINGS_GET_AUTO_CLEAR: Final[str] = "Get the current auto clear settings"
 SETTINGS_SET_AUTO_CLEAR: Final[str] = "Enable or disable snapshot auto clear for a specific event"
 SETTINGS_GET_EPHEMERAL: Final[str] = "Get whether or not important attendance commands are ephemeral or not"
 SETTINGS_SET_EPHEMERAL: Final[str] = "Set whether or not important attendnace commanda are ephemeral or not"
+SETTINGS_GET_TRACKING_MODE: Final[str] = "Get whether attendance is tracked by polling snapshots or by voice join/leave events"
+SETTINGS_SET_TRACKING_MODE: Final[str] = "Set whether attendance is tracked by polling snapshots or by voice join/leave events"
 
 SETTINGS_SET_MINIMUM_ATTENDANCE_RATE: Final[str] = "The minimum number, in percentage (0.1 = 10%), of snapshots a user needs to be present in to be counted as in attendance"
 SETTINGS_SET_INTERVAL_INTERVAL: Final[str] = "The time interval, in seconds, a snapshot should be taken of the members lists in the session VC"
 SETTINGS_SET_AUTO_CLEAR_ON_EVENT: Final[str] = "The event to enable or disable auto clear for"
 SETTINGS_SET_AUTO_CLEAR_SHOULD_CLEAR: Final[str] = "Whether or not snapshot data should be auto cleared on this event"
 SETTINGS_SET_EPHEMERAL_ARE_EPHEMERAL: Final[str] = "Whether or not important attendance commands should be ephemeral (hidden) or not (public)"
+SETTINGS_SET_TRACKING_MODE_MODE: Final[str] = "Polling takes a snapshot every interval, voice events record exact join/leave times"
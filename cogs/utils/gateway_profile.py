@@ -0,0 +1,38 @@
+"""Intents and cache options passed to the bot's `commands.Bot` for each `GatewayProfile`
+
+The lean profile keeps the events and caches the bot reads: guilds and their
+channels, voice states (which is what `channel.members` is built from, with a
+member cached for as long as they're in a voice channel) and guild messages, for
+the owner's `@bot sync`/`@bot reload` commands. Messages aren't cached, members
+outside voice channels never are and guilds aren't chunked on startup.
+
+    client = commands.Bot(command_prefix=..., **client_options(GatewayProfile.LEAN))
+"""
+
+from typing import Any
+
+import discord
+
+from cogs.enums.gateway_profile import GatewayProfile
+
+
+def lean_intents() -> discord.Intents:
+    intents: discord.Intents = discord.Intents.none()
+    intents.guilds = True
+    intents.voice_states = True
+    intents.guild_messages = True
+    return intents
+
+
+def client_options(profile: GatewayProfile) -> dict[str, Any]:
+    if profile is GatewayProfile.DEFAULT:
+        return {"intents": discord.Intents.default()}
+
+    member_cache_flags: discord.MemberCacheFlags = discord.MemberCacheFlags.none()
+    member_cache_flags.voice = True
+    return {
+        "intents": lean_intents(),
+        "member_cache_flags": member_cache_flags,
+        "max_messages": None,
+        "chunk_guilds_at_startup": False,
+    }
@@ -5,9 +5,7 @@ import cogs.utils.shelve_utils as shelve_utils
 
 
 async def user_is_instructor(interaction: Interaction) -> bool:
-    if interaction.user.id in shelve_utils.get_instructors():
-        return True
-    return False
+    return shelve_utils.is_instructor(interaction.guild_id, interaction.user.id)
 
 
 async def user_is_owner(client: commands.Bot, interaction: Interaction) -> bool:
@@ -13,7 +13,7 @@ async def send_embed(
     is_ephemeral: bool = True,
     **embed_kwargs,
 ) -> None:
-    """Macro to send an interaction response with an embed"""
+    """Macro to send an interaction response with an embed, as a followup if the interaction was deferred"""
     match embed_type:
         case EmbedType.NORMAL:
             embed: Embed = await create_embed(**embed_kwargs)
@@ -22,4 +22,7 @@ async def send_embed(
         case _:
             embed: Embed = Embed()
 
-    await interaction.response.send_message(embed=embed, ephemeral=is_ephemeral)
+    if interaction.response.is_done():
+        await interaction.followup.send(embed=embed, ephemeral=is_ephemeral)
+    else:
+        await interaction.response.send_message(embed=embed, ephemeral=is_ephemeral)
@@ -0,0 +1,20 @@
+from dataclasses import dataclass
+from typing import Union
+
+
+@dataclass
+class MemberAttendance:
+    """One student's computed result in an attendance report
+
+    `snapshots` and `longest_presence` (the longest run of consecutive
+    snapshots the member was in) are only set for polling sessions. Seen times are unix timestamps,
+    from when the snapshots were taken for polling sessions.
+    """
+
+    member_id: int
+    in_attendance: bool
+    attendance_ratio: float
+    snapshots: Union[int, None] = None
+    first_seen: Union[float, None] = None
+    last_seen: Union[float, None] = None
+    longest_presence: Union[int, None] = None
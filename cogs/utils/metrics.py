@@ -0,0 +1,164 @@
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from typing import Awaitable, Callable, Final, Iterator, TypeVar, Union
+
+LabelValues = tuple[str, ...]
+T = TypeVar("T")
+
+# Prometheus' default buckets, and a finer set for calls that are normally sub-millisecond
+DEFAULT_BUCKETS: Final[tuple[float, ...]] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # fmt: skip
+FAST_BUCKETS: Final[tuple[float, ...]] = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0)  # fmt: skip
+
+
+def _format_labels(names: tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    pairs: list[str] = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric(ABC):
+    metric_type: str = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()) -> None:  # fmt: skip
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        REGISTRY.append(self)
+
+    @abstractmethod
+    def samples(self) -> Iterator[str]:
+        """The metric's lines in the text format, without its HELP and TYPE"""
+
+    def render(self) -> str:
+        header: str = f"# HELP {self.name} {self.documentation}\n# TYPE {self.name} {self.metric_type}\n"  # fmt: skip
+        return header + "".join(f"{sample}\n" for sample in self.samples())
+
+
+class Gauge(Metric):
+    metric_type: str = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()) -> None:  # fmt: skip
+        super().__init__(name, documentation, labels)
+        self._values: dict[LabelValues, float] = {}
+
+    def set(self, value: float, *label_values: str) -> None:
+        self._values[label_values] = value
+
+    def samples(self) -> Iterator[str]:
+        for label_values, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.labels, label_values)} {value}"
+
+
+class Counter(Gauge):
+    metric_type: str = "counter"
+
+    def inc(self, amount: float = 1.0, *label_values: str) -> None:
+        self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+
+class Histogram(Metric):
+    """Cumulative-bucket histogram, observing is a bisect and a few additions"""
+
+    metric_type: str = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labels)
+        self.buckets = buckets
+        # Per label set: a count per bucket (plus +Inf), then the sum of observations
+        self._values: dict[LabelValues, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        series: Union[tuple[list[int], list[float]], None] = self._values.get(label_values)  # fmt: skip
+        if series is None:
+            series = self._values[label_values] = ([0] * (len(self.buckets) + 1), [0.0])
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1][0] += value
+
+    @contextmanager
+    def time(self, *label_values: str) -> Iterator[None]:
+        start: float = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *label_values)
+
+    def samples(self) -> Iterator[str]:
+        for label_values, (counts, total) in self._values.items():
+            cumulative: int = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                bucket_label: str = f'le="{bound}"'
+                yield f"{self.name}_bucket{_format_labels(self.labels, label_values, bucket_label)} {cumulative}"  # fmt: skip
+            yield f"{self.name}_sum{_format_labels(self.labels, label_values)} {total[0]}"
+            yield f"{self.name}_count{_format_labels(self.labels, label_values)} {cumulative}"
+
+
+def timed(
+    histogram: Histogram,
+) -> Callable[[Callable[..., Awaitable[T]]], Callable[..., Awaitable[T]]]:
+    """Observe every call of a coroutine function, labelled with its name"""
+
+    def decorator(function: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        @wraps(function)
+        async def wrapper(*args, **kwargs) -> T:
+            with histogram.time(function.__name__):
+                return await function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def render() -> str:
+    return "".join(metric.render() for metric in REGISTRY)
+
+
+REGISTRY: list[Metric] = []
+
+SNAPSHOT_TICK_SECONDS: Final[Histogram] = Histogram(
+    "attendance_snapshot_tick_seconds",
+    "Time taken by one scheduled snapshot",
+)
+SNAPSHOT_DRIFT_SECONDS: Final[Histogram] = Histogram(
+    "attendance_snapshot_drift_seconds",
+    "How late a scheduled snapshot started compared to its deadline",
+    buckets=FAST_BUCKETS,
+)
+SNAPSHOT_MISSED_TICKS: Final[Counter] = Counter(
+    "attendance_snapshot_missed_ticks_total",
+    "Scheduled snapshots skipped because the previous one ran a whole interval late",
+)
+STORAGE_CALL_SECONDS: Final[Histogram] = Histogram(
+    "attendance_storage_call_seconds",
+    "Time taken by storage calls, by shelve_utils function",
+    labels=("function",),
+    buckets=FAST_BUCKETS,
+)
+REPORT_SECONDS: Final[Histogram] = Histogram(
+    "attendance_report_seconds",
+    "Time taken to compute and render an attendance report",
+)
+COMMAND_SECONDS: Final[Histogram] = Histogram(
+    "attendance_command_seconds",
+    "Time taken by an app command, by command and whether it completed",
+    labels=("command", "status"),
+)
+ACTIVE_SESSIONS: Final[Gauge] = Gauge(
+    "attendance_active_sessions", "Sessions currently running"
+)
+MEMBERS_TRACKED: Final[Gauge] = Gauge(
+    "attendance_members_tracked", "Members seen by every running session"
+)
+DATABASE_BYTES: Final[Gauge] = Gauge(
+    "attendance_database_bytes", "Size of the storage backend's files on disk"
+)
@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import math
+import os
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Final, Union
+
+import aiohttp
+
+import cogs.utils.constants as constants
+
+# Worth another attempt, anything else (e.g. a 400 for a bad payload) won't get better
+RETRYABLE_STATUSES: Final[frozenset[int]] = frozenset({429, 500, 502, 503, 504})
+
+logger: logging.Logger = logging.getLogger("cogs.utils.mystbin")
+
+
+class MystbinError(Exception):
+    """A paste couldn't be created, even after retrying"""
+
+
+def retry_after_seconds(value: Union[str, None]) -> float:
+    """Seconds a `Retry-After` header (delay seconds or an HTTP date) asks to wait, 0 if it can't be parsed"""
+    if not value:
+        return 0.0
+    try:
+        seconds: float = float(value)
+    except ValueError:
+        try:
+            retry_at: datetime = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return 0.0
+        if retry_at.tzinfo is None:  # HTTP dates are always in GMT
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        # Compared against the wall clock, the server's date isn't on `clock`'s
+        seconds = retry_at.timestamp() - time.time()
+    return seconds if math.isfinite(seconds) and seconds > 0 else 0.0
+
+
+class MystbinUploader:
+    """Creates Mystbin pastes without blocking the event loop
+
+    Every upload shares one aiohttp session, so connections (and their TLS
+    handshakes) are reused across exports. At most `max_concurrent_uploads` run at
+    once, each attempt is bounded by `timeout`, and attempts that couldn't connect
+    or got a 429/5xx are retried with exponential backoff. Other failures aren't,
+    since the paste may already have been created. An upload waiting to retry doesn't count towards
+    the limit, and one Mystbin asks to wait more than `max_retry_after` for
+    gives up instead.
+    """
+
+    def __init__(
+        self,
+        base_api: str,
+        base_url: str,
+        timeout: float = constants.MYSTBIN_REQUEST_TIMEOUT_SECONDS,
+        max_retries: int = constants.MYSTBIN_MAX_RETRIES,
+        retry_backoff: float = constants.MYSTBIN_RETRY_BACKOFF_SECONDS,
+        max_concurrent_uploads: int = constants.MYSTBIN_MAX_CONCURRENT_UPLOADS,
+        max_retry_after: float = constants.MYSTBIN_MAX_RETRY_AFTER_SECONDS,
+    ) -> None:
+        self.paste_api: str = f"{base_api.rstrip('/')}{constants.MYSTBIN_PASTE_ENDPOINT}"  # fmt: skip
+        self.base_url: str = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.max_concurrent_uploads = max_concurrent_uploads
+        self.max_retry_after = max_retry_after
+        self._semaphore: asyncio.Semaphore = asyncio.Semaphore(max_concurrent_uploads)
+        self._session: Union[aiohttp.ClientSession, None] = None
+
+    def _client_session(self) -> aiohttp.ClientSession:
+        # Created lazily since a session has to be made inside the running event loop
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_concurrent_uploads),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._session
+
+    @staticmethod
+    async def _paste_id(response: aiohttp.ClientResponse) -> str:
+        try:
+            data: Any = await response.json()
+            paste_id: Any = data["id"]
+        except (aiohttp.ContentTypeError, ValueError, KeyError, TypeError) as exception:
+            raise MystbinError(f"Mystbin responded with {response.status} but no paste id ({type(exception).__name__})") from exception  # fmt: skip
+        if not isinstance(paste_id, str):
+            raise MystbinError(f"Mystbin responded with {response.status} but no paste id ({paste_id!r})")  # fmt: skip
+        return paste_id
+
+    def paste_url(self, paste_id: str) -> str:
+        return f"{self.base_url}/{paste_id}"
+
+    async def create_paste(
+        self, files: list[dict[str, str]], password: Union[str, None] = None
+    ) -> str:
+        """Upload `files` (each a `content` and `filename`) as one paste, returning its id"""
+        payload: dict[str, Any] = {"files": files}
+        if password is not None:
+            payload["password"] = password
+
+        for attempt in range(self.max_retries + 1):
+            retry_after: float = 0.0
+            try:
+                async with self._semaphore, self._client_session().put(
+                    self.paste_api, json=payload
+                ) as response:
+                    if 200 <= response.status < 300:
+                        return await self._paste_id(response)
+                    if response.status not in RETRYABLE_STATUSES:
+                        raise MystbinError(f"Mystbin responded with {response.status}")  # fmt: skip
+
+                    failure: str = f"status {response.status}"
+                    retry_after = retry_after_seconds(response.headers.get("Retry-After"))  # fmt: skip
+            except aiohttp.ClientConnectorError as exception:
+                # Raised before the request was sent, so there's no paste to duplicate
+                failure: str = repr(exception)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as exception:
+                # The paste may have been created, retrying could make a second one
+                raise MystbinError(f"Mystbin upload failed ({exception!r})") from exception  # fmt: skip
+
+            if attempt == self.max_retries:
+                raise MystbinError(f"Mystbin upload failed after {attempt + 1} attempts ({failure})")  # fmt: skip
+            if retry_after > self.max_retry_after:
+                raise MystbinError(f"Mystbin asked to wait {retry_after:.0f}s before retrying ({failure})")  # fmt: skip
+
+            # Outside the semaphore, so other uploads go ahead while this one waits
+            delay: float = max(retry_after, self.retry_backoff * 2**attempt)
+            logger.info(f"Mystbin upload attempt {attempt + 1} failed ({failure}), retrying in {delay:.1f}s")  # fmt: skip
+            await asyncio.sleep(delay)
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+        self._session = None
+
+
+# Shared by every export view, created on first use
+_uploader: Union[MystbinUploader, None] = None
+
+
+def get_uploader() -> MystbinUploader:
+    """The bot-wide uploader, pointed at `MYSTBIN_BASE_API`/`MYSTBIN_BASE_URL` if set (e.g. a local fake paste server)"""
+    global _uploader
+
+    if _uploader is None:
+        _uploader = MystbinUploader(
+            os.getenv("MYSTBIN_BASE_API") or constants.MYSTBIN_BASE_API,
+            os.getenv("MYSTBIN_BASE_URL") or constants.MYSTBIN_BASE_URL,
+        )
+    return _uploader
+
+
+async def close_uploader() -> None:
+    global _uploader
+
+    if _uploader is not None:
+        await _uploader.close()
+    _uploader = None
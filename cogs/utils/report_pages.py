@@ -0,0 +1,66 @@
+from math import ceil
+from typing import Final
+
+import cogs.utils.constants as constants
+from cogs.enums.report_filter import ReportFilter
+from cogs.utils.member_attendance import MemberAttendance
+
+ATTENDED_SUFFIX: Final[str] = "✅ **ATTENDED**"
+ABSENT_SUFFIX: Final[str] = "❌ **ABSENT**"
+
+# Snowflakes are at most 20 digits, so no member line is ever longer than this
+MAXIMUM_LINE_LENGTH: Final[int] = len(f"- <@{'9' * 20}> {ATTENDED_SUFFIX}\n")
+
+
+def member_line(record: MemberAttendance) -> str:
+    suffix: str = ATTENDED_SUFFIX if record.in_attendance else ABSENT_SUFFIX
+    return f"- <@{record.member_id}> {suffix}\n"
+
+
+class ReportPages:
+    """Fixed-size pages over an attendance result, rendered one page at a time
+
+    Every line fits in `MAXIMUM_LINE_LENGTH`, so a page holds a fixed number of
+    members and rendering one never looks at any member outside it. Filtered
+    results are built from the same records on first use, then reused.
+    """
+
+    def __init__(self, records: list[MemberAttendance], character_budget: int) -> None:
+        """`character_budget` is how many characters of member lines fit in one message"""
+        self.rows_per_embed: int = max(1, constants.MAXMIMUM_EMBED_DESCRIPTION_LENGTH // MAXIMUM_LINE_LENGTH)  # fmt: skip
+        # One embed per message is left for the report header
+        self.rows_per_page: int = max(
+            1,
+            min(
+                character_budget // MAXIMUM_LINE_LENGTH,
+                (constants.MAXMIMUM_EMBEDS_PER_MESSAGE - 1) * self.rows_per_embed,
+            ),
+        )
+        self._filtered: dict[ReportFilter, list[MemberAttendance]] = {
+            ReportFilter.ALL: records
+        }
+
+    def rows(self, report_filter: ReportFilter) -> list[MemberAttendance]:
+        if report_filter not in self._filtered:
+            attended: bool = report_filter is ReportFilter.ATTENDED
+            self._filtered[report_filter] = [
+                record
+                for record in self._filtered[ReportFilter.ALL]
+                if record.in_attendance == attended
+            ]
+        return self._filtered[report_filter]
+
+    def num_pages(self, report_filter: ReportFilter) -> int:
+        return max(1, ceil(len(self.rows(report_filter)) / self.rows_per_page))
+
+    def render(self, report_filter: ReportFilter, page: int) -> list[str]:
+        """Embed descriptions for one page, empty if there's nobody to show"""
+        start: int = page * self.rows_per_page
+        end: int = start + self.rows_per_page
+        rows: list[MemberAttendance] = self.rows(report_filter)[start:end]
+
+        descriptions: list[str] = []
+        for offset in range(0, len(rows), self.rows_per_embed):
+            embed_end: int = offset + self.rows_per_embed
+            descriptions.append("".join(map(member_line, rows[offset:embed_end])))
+        return descriptions
@@ -0,0 +1,165 @@
+import asyncio
+import heapq
+import logging
+import math
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Union
+
+import cogs.utils.clock as clock
+import cogs.utils.constants as constants
+import cogs.utils.metrics as metrics
+
+
+@dataclass
+class TickStats:
+    """How punctual one session's snapshots have been, lateness is in seconds"""
+
+    ticks: int = 0
+    late: int = 0
+    missed: int = 0
+    total_lateness: float = 0.0
+    total_squared_lateness: float = 0.0
+    max_lateness: float = 0.0
+
+    def record(self, lateness: float, missed: int) -> None:
+        self.ticks += 1
+        self.missed += missed
+        if lateness > constants.SNAPSHOT_LATE_TICK_SECONDS:
+            self.late += 1
+        self.total_lateness += lateness
+        self.total_squared_lateness += lateness * lateness
+        self.max_lateness = max(self.max_lateness, lateness)
+
+    @property
+    def mean_lateness(self) -> float:
+        return self.total_lateness / self.ticks if self.ticks else 0.0
+
+    @property
+    def jitter(self) -> float:
+        """Standard deviation of the lateness"""
+        if not self.ticks:
+            return 0.0
+        variance: float = (
+            self.total_squared_lateness / self.ticks - self.mean_lateness**2
+        )
+        return math.sqrt(max(variance, 0.0))
+
+
+class SnapshotScheduler:
+    """Drives the snapshots of every running session from a single task
+
+    Sessions are kept in a heap ordered by their next deadline, so the task only
+    wakes when some session is actually due. Fifty sessions on the same interval
+    cost about the same number of wakeups as one.
+
+    Deadlines are `origin + tick * interval` on the event loop's monotonic clock,
+    with the origin at the session's start, so a late tick doesn't push the ones
+    after it back. A tick that falls a whole interval or more behind skips the
+    deadlines it missed instead of firing a burst to catch up, and counts them in
+    the session's `TickStats`.
+    """
+
+    def __init__(self, callback: Callable[[int], Awaitable[None]]) -> None:
+        self.callback = callback
+        self.logger = logging.getLogger("cogs.utils.scheduler")
+        self._intervals: dict[int, float] = {}
+        self._origins: dict[int, float] = {}
+        self._generations: dict[int, int] = {}
+        self._stats: dict[int, TickStats] = {}
+        # (deadline, session id, generation, tick number)
+        self._deadlines: list[tuple[float, int, int, int]] = []
+        self._wakeup: asyncio.Event = asyncio.Event()
+        self._task: Union[asyncio.Task, None] = None
+
+    def __contains__(self, session_id: int) -> bool:
+        return session_id in self._intervals
+
+    def __len__(self) -> int:
+        return len(self._intervals)
+
+    def add(
+        self, session_id: int, interval: float, started_at: Union[float, None] = None
+    ) -> None:
+        """Schedule a session on a grid from `started_at` (a `clock.now()` timestamp)
+
+        A new session's first snapshot is taken immediately, a resumed one picks up
+        at its next deadline.
+        """
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        now: float = loop.time()
+        origin: float = now if started_at is None else now - max(clock.now() - started_at, 0.0)  # fmt: skip
+        tick: int = math.ceil((now - origin) / interval)
+
+        generation: int = self._generations.get(session_id, 0) + 1
+        self._generations[session_id] = generation
+        self._intervals[session_id] = interval
+        self._origins[session_id] = origin
+        self._stats.setdefault(session_id, TickStats())
+        heapq.heappush(self._deadlines, (origin + tick * interval, session_id, generation, tick))  # fmt: skip
+
+        self._wakeup.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def remove(self, session_id: int) -> None:
+        """Stop scheduling a session, its `TickStats` are kept until `forget`"""
+        # The heap entry is left behind and skipped once its generation is stale
+        self._intervals.pop(session_id, None)
+        self._origins.pop(session_id, None)
+        self._generations[session_id] = self._generations.get(session_id, 0) + 1
+
+    def forget(self, session_id: int) -> None:
+        self.remove(session_id)
+        self._stats.pop(session_id, None)
+
+    def stats(self, session_id: int) -> TickStats:
+        return self._stats.get(session_id) or TickStats()
+
+    def stop(self) -> None:
+        self._intervals.clear()
+        self._origins.clear()
+        self._deadlines.clear()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _is_stale(self, session_id: int, generation: int) -> bool:
+        return session_id not in self._intervals or self._generations[session_id] != generation  # fmt: skip
+
+    async def _run(self) -> None:
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        while self._intervals:
+            deadline, session_id, generation, tick = self._deadlines[0]
+            if self._is_stale(session_id, generation):
+                heapq.heappop(self._deadlines)
+                continue
+
+            delay: float = deadline - loop.time()
+            if delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._deadlines)
+            now: float = loop.time()
+            interval: float = self._intervals[session_id]
+            # Fell a whole interval or more behind, skip to the next deadline on the grid
+            next_tick: int = max(tick + 1, math.floor((now - self._origins[session_id]) / interval) + 1)  # fmt: skip
+            missed: int = next_tick - tick - 1
+            next_deadline: float = self._origins[session_id] + next_tick * interval
+            heapq.heappush(self._deadlines, (next_deadline, session_id, generation, next_tick))  # fmt: skip
+
+            lateness: float = now - deadline
+            self._stats[session_id].record(lateness, missed)
+            metrics.SNAPSHOT_DRIFT_SECONDS.observe(lateness)
+            if missed:
+                metrics.SNAPSHOT_MISSED_TICKS.inc(missed)
+                self.logger.warning(f"Session {session_id} missed {missed} snapshot(s), {lateness:.2f} seconds late")  # fmt: skip
+            try:
+                with metrics.SNAPSHOT_TICK_SECONDS.time():
+                    await self.callback(session_id)
+            except Exception:
+                self.logger.exception(f"Snapshot for session {session_id} failed")
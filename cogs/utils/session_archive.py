@@ -0,0 +1,63 @@
+from dataclasses import asdict, dataclass
+from typing import Any, Union
+
+
+@dataclass
+class ArchivedSession:
+    """A finished session's metadata, kept after its snapshots are cleared"""
+
+    archive_id: int
+    channel_id: int
+    started_at: float
+    ended_at: float
+    tracking_mode: str
+    snapshot_interval: int
+    minimum_attendance_rate: float
+    class_size: int
+    # None for sessions archived before the bot served more than one guild
+    guild_id: Union[int, None] = None
+
+    def to_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "ArchivedSession":
+        return cls(**data)
+
+
+@dataclass
+class MemberHistoryEntry:
+    """One member's result in one archived session"""
+
+    session: ArchivedSession
+    attendance_ratio: float
+    in_attendance: bool
+
+
+@dataclass
+class MemberRollup:
+    sessions: int
+    attended: int
+    average_ratio: float
+
+    @classmethod
+    def from_history(cls, history: list[MemberHistoryEntry]) -> "MemberRollup":
+        if not history:
+            return cls(sessions=0, attended=0, average_ratio=0.0)
+        return cls(
+            sessions=len(history),
+            attended=sum(entry.in_attendance for entry in history),
+            average_ratio=sum(entry.attendance_ratio for entry in history) / len(history),  # fmt: skip
+        )
+
+
+# Archived per-member results: attendance ratio and whether the rate was met
+ArchiveResults = dict[int, tuple[float, bool]]
+ArchiveRow = tuple[dict[str, Any], float, bool]
+
+
+def history_from_rows(rows: list[ArchiveRow]) -> list[MemberHistoryEntry]:
+    return [
+        MemberHistoryEntry(ArchivedSession.from_dict(session), ratio, attended)
+        for session, ratio, attended in rows
+    ]
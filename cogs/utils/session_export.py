@@ -0,0 +1,170 @@
+"""Compact, self-describing binary export of one polling session's raw attendance
+
+Only needs the standard library (and NumPy for `SessionExport.to_numpy`), so
+analysts can copy this file next to their notebooks. The layout, little-endian:
+
+    magic `ATMX`, u16 version, u16 reserved, u32 metadata length
+    metadata: UTF-8 JSON, padded to 8 bytes
+    members:  u64 member id per row, in row order
+    times:    u64 milliseconds since `metadata["epoch"]` per snapshot (u32 in
+              version 1 exports, which overflowed after 49.7 days)
+    presence: one row of `metadata["row_bytes"]` bytes per member, bit `i` (LSB
+              first, `numpy.unpackbits(..., bitorder="little")`) set if the
+              member was in snapshot `i`
+
+Every section starts on an 8-byte boundary at the offset given in the metadata,
+so the reader only slices and casts the buffer instead of copying it.
+
+    export: bytes = write_session_export(matrix, snapshot_times, {"channel_id": ...})
+    loaded = SessionExport(export)
+    loaded.members[0], loaded.times()[0], loaded.is_present(0, 0)
+    member_ids, times, presence = loaded.to_numpy()
+"""
+
+import json
+import struct
+import sys
+from array import array
+from typing import Any, Final, Sequence, Union
+
+try:
+    import numpy
+except ImportError:  # Optional, only `to_numpy` needs it
+    numpy = None
+
+MAGIC: Final[bytes] = b"ATMX"
+VERSION: Final[int] = 2
+HEADER: Final[struct.Struct] = struct.Struct("<4sHHI")
+# The typecode of the times section, by export version
+OFFSET_TYPECODES: Final[dict[int, str]] = {1: "I", 2: "Q"}
+ALIGNMENT: Final[int] = 8
+
+
+def _padding(length: int) -> bytes:
+    return bytes(-length % ALIGNMENT)
+
+
+def _little_endian(values: array) -> bytes:
+    if sys.byteorder != "little":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _cast(view: memoryview, typecode: str) -> Union[memoryview, array]:
+    """A zero-copy view of little-endian integers, or a swapped copy on big-endian machines"""
+    if sys.byteorder == "little":
+        return view.cast(typecode)
+    values: array = array(typecode, view.tobytes())
+    values.byteswap()
+    return values
+
+
+def write_session_export(
+    matrix: Any, snapshot_times: Sequence[float], metadata: dict[str, Any]
+) -> bytes:
+    """Serialise an `AttendanceMatrix` and the time each of its snapshots was taken
+
+    `metadata` is stored as given (it must be JSON serialisable), alongside the
+    counts and section offsets the reader needs.
+    """
+    num_members: int = len(matrix.members)
+    num_snapshots: int = matrix.num_snapshots
+    row_bytes: int = (num_snapshots + 7) // 8
+    epoch: float = snapshot_times[0] if snapshot_times else 0.0
+
+    members: bytes = _little_endian(array("Q", matrix.members))
+    times: bytes = _little_endian(
+        array(OFFSET_TYPECODES[VERSION], (round((taken_at - epoch) * 1_000) for taken_at in snapshot_times))  # fmt: skip
+    )
+    if matrix.uses_numpy:
+        presence: bytes = numpy.packbits(matrix.rows, axis=1, bitorder="little").tobytes()  # fmt: skip
+    else:
+        presence: bytes = b"".join(row.to_bytes(row_bytes, "little") for row in matrix.rows)  # fmt: skip
+
+    sections: dict[str, bytes] = {"members": members, "times": times, "presence": presence}  # fmt: skip
+    described: dict[str, Any] = {
+        **metadata,
+        "num_members": num_members,
+        "num_snapshots": num_snapshots,
+        "first_snapshot": matrix.first_snapshot,
+        "epoch": epoch,
+        "row_bytes": row_bytes,
+        "sections": dict.fromkeys(sections, 0),
+    }
+    # Offsets depend on the metadata's own length, re-encode until they're stable
+    while True:
+        encoded: bytes = json.dumps(described, separators=(",", ":")).encode()
+        offset: int = HEADER.size + len(encoded) + len(_padding(HEADER.size + len(encoded)))  # fmt: skip
+        offsets: dict[str, int] = {}
+        for name, section in sections.items():
+            offsets[name] = offset
+            offset += len(section) + len(_padding(len(section)))
+        if offsets == described["sections"]:
+            break
+        described["sections"] = offsets
+
+    output: bytearray = bytearray(HEADER.pack(MAGIC, VERSION, 0, len(encoded)))
+    output += encoded
+    output += _padding(len(output))
+    for section in sections.values():
+        output += section
+        output += _padding(len(section))
+    return bytes(output)
+
+
+class SessionExport:
+    """Reads an export in place, every section is a view into the given buffer"""
+
+    def __init__(self, buffer: Union[bytes, bytearray, memoryview]) -> None:
+        self.buffer: memoryview = memoryview(buffer)
+        magic, version, _, metadata_length = HEADER.unpack_from(self.buffer)
+        if magic != MAGIC:
+            raise ValueError("Not an attendance session export")
+        if version not in OFFSET_TYPECODES:
+            raise ValueError(f"Unsupported session export version {version}")
+
+        metadata_start: int = HEADER.size
+        metadata_end: int = metadata_start + metadata_length
+        self.metadata: dict[str, Any] = json.loads(bytes(self.buffer[metadata_start:metadata_end]))  # fmt: skip
+        self.num_members: int = self.metadata["num_members"]
+        self.num_snapshots: int = self.metadata["num_snapshots"]
+        self.row_bytes: int = self.metadata["row_bytes"]
+
+        self.members = _cast(self._section("members", self.num_members * 8), "Q")
+        offset_typecode: str = OFFSET_TYPECODES[version]
+        offset_size: int = array(offset_typecode).itemsize
+        self.offsets = _cast(self._section("times", self.num_snapshots * offset_size), offset_typecode)  # fmt: skip
+        self.presence: memoryview = self._section("presence", self.num_members * self.row_bytes)  # fmt: skip
+
+    def _section(self, name: str, length: int) -> memoryview:
+        start: int = self.metadata["sections"][name]
+        end: int = start + length
+        return self.buffer[start:end]
+
+    def times(self) -> list[float]:
+        epoch: float = self.metadata["epoch"]
+        return [epoch + offset / 1_000 for offset in self.offsets]
+
+    def row(self, member_index: int) -> memoryview:
+        start: int = member_index * self.row_bytes
+        end: int = start + self.row_bytes
+        return self.presence[start:end]
+
+    def is_present(self, member_index: int, snapshot: int) -> bool:
+        return bool(self.presence[member_index * self.row_bytes + snapshot // 8] >> (snapshot % 8) & 1)  # fmt: skip
+
+    def to_numpy(self) -> tuple[Any, Any, Any]:
+        """Member ids, unix timestamps and the member x snapshot boolean matrix, as NumPy arrays"""
+        if numpy is None:
+            raise RuntimeError("NumPy is required for `to_numpy`")
+        member_ids = numpy.frombuffer(self.buffer, dtype="<u8", count=self.num_members, offset=self.metadata["sections"]["members"])  # fmt: skip
+        offsets = numpy.frombuffer(self.buffer, dtype=f"<u{self.offsets.itemsize}", count=self.num_snapshots, offset=self.metadata["sections"]["times"])  # fmt: skip
+        packed = numpy.frombuffer(self.buffer, dtype=numpy.uint8, count=self.num_members * self.row_bytes, offset=self.metadata["sections"]["presence"])  # fmt: skip
+        presence = numpy.unpackbits(
+            packed.reshape(self.num_members, self.row_bytes),
+            axis=1,
+            count=self.num_snapshots,
+            bitorder="little",
+        ).astype(bool)
+        return member_ids, self.metadata["epoch"] + offsets / 1_000, presence
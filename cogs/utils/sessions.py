@@ -0,0 +1,93 @@
+from dataclasses import dataclass, field
+from typing import Any, Union
+
+from cogs.enums.tracking_mode import TrackingMode
+from cogs.utils.voice_intervals import VoiceIntervalTracker
+
+
+@dataclass
+class AttendanceSession:
+    """One class's attendance session, keyed by the voice channel it tracks
+
+    Only one session can exist per channel; starting a session in a channel that
+    already has (stopped) session data resumes it, unless auto clear is on.
+    A session still running when the bot went down is resumed on the next start,
+    from its last checkpoint, and the time it wasn't tracked is kept in `gaps`.
+    """
+
+    channel_id: int
+    snapshot_interval: int
+    tracking_mode: TrackingMode
+    # None for sessions started before the bot served more than one guild
+    guild_id: Union[int, None] = None
+    is_running: bool = False
+    voice_tracker: Union[VoiceIntervalTracker, None] = None
+    # Set when the session is first started, resuming it keeps both
+    started_at: Union[float, None] = None
+    archive_id: Union[int, None] = None
+    # Set while the session is stopped
+    stopped_at: Union[float, None] = None
+    # When the session was last checkpointed, and how many snapshots it had then
+    checkpointed_at: Union[float, None] = None
+    checkpoint_snapshots: int = 0
+    # (interrupted, resumed) timestamps of every restart or stop the session ran through
+    gaps: list[tuple[float, float]] = field(default_factory=list)
+    # Set once retention has thinned out the stopped session's snapshots, `snapshot_interval` is scaled to match
+    downsampled: bool = False
+
+    @property
+    def session_id(self) -> int:
+        return self.channel_id
+
+    def in_guild(self, guild_id: Union[int, None]) -> bool:
+        return self.guild_id is None or self.guild_id == guild_id
+
+    def untracked_seconds(self) -> float:
+        return sum(
+            resumed_at - interrupted_at for interrupted_at, resumed_at in self.gaps
+        )
+
+    def tracked_seconds(self, now: float) -> float:
+        """How long the session has been running for, excluding every gap"""
+        if self.started_at is None:
+            return 0.0
+        ended_at: float = self.stopped_at if self.stopped_at is not None else now
+        return max(0.0, ended_at - self.started_at - self.untracked_seconds())
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "channel_id": self.channel_id,
+            "snapshot_interval": self.snapshot_interval,
+            "tracking_mode": self.tracking_mode.value,
+            "guild_id": self.guild_id,
+            "is_running": self.is_running,
+            "voice_tracker": self.voice_tracker.to_dict() if self.voice_tracker else None,  # fmt: skip
+            "started_at": self.started_at,
+            "archive_id": self.archive_id,
+            "stopped_at": self.stopped_at,
+            "checkpointed_at": self.checkpointed_at,
+            "checkpoint_snapshots": self.checkpoint_snapshots,
+            "gaps": self.gaps,
+            "downsampled": self.downsampled,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "AttendanceSession":
+        voice_tracker: Union[dict, None] = data["voice_tracker"]
+        return cls(
+            channel_id=data["channel_id"],
+            snapshot_interval=data["snapshot_interval"],
+            tracking_mode=TrackingMode(data["tracking_mode"]),
+            guild_id=data.get("guild_id"),
+            is_running=data["is_running"],
+            voice_tracker=(
+                VoiceIntervalTracker.from_dict(voice_tracker) if voice_tracker else None
+            ),  # fmt: skip
+            started_at=data.get("started_at"),
+            archive_id=data.get("archive_id"),
+            stopped_at=data.get("stopped_at"),
+            checkpointed_at=data.get("checkpointed_at"),
+            checkpoint_snapshots=data.get("checkpoint_snapshots", 0),
+            gaps=list(data.get("gaps", [])),
+            downsampled=data.get("downsampled", False),
+        )
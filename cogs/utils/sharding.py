@@ -0,0 +1,72 @@
+"""Which guilds this process serves, when the bot is split across shard processes
+
+`GUILD_IDS` (comma separated) lists every guild the bot serves, `GUILD_ID` is
+still read for a single guild. `SHARD_COUNT` and `SHARD_IDS` (comma separated)
+pick the gateway shards this process connects, it then serves the configured
+guilds Discord routes to those shards. Without them, one process serves them all.
+`SHARD_IDS` needs `SHARD_COUNT`, and every id must be below it.
+
+    await client.add_cog(cog, guilds=sharding.guild_objects())
+"""
+
+import os
+from typing import Union
+
+import discord
+
+
+def _int_list(value: Union[str, None]) -> list[int]:
+    return [int(item) for item in (value or "").split(",") if item.strip()]
+
+
+def configured_guild_ids() -> list[int]:
+    return _int_list(os.getenv("GUILD_IDS") or os.getenv("GUILD_ID"))
+
+
+def shard_count() -> Union[int, None]:
+    value: Union[str, None] = os.getenv("SHARD_COUNT")
+    if not value:
+        return None
+
+    count: int = int(value)
+    if count < 1:
+        raise RuntimeError(f"SHARD_COUNT must be at least 1, not {count}")
+    return count
+
+
+def shard_ids() -> Union[list[int], None]:
+    """This process's shards, None for every shard"""
+    ids: list[int] = _int_list(os.getenv("SHARD_IDS"))
+    if not ids:
+        return None
+
+    count: Union[int, None] = shard_count()
+    if count is None:
+        raise RuntimeError("SHARD_IDS is set without SHARD_COUNT, set SHARD_COUNT to the total number of shards across every process")  # fmt: skip
+    invalid: list[int] = [shard_id for shard_id in ids if not 0 <= shard_id < count]
+    if invalid:
+        raise RuntimeError(f"SHARD_IDS {invalid} aren't shards of SHARD_COUNT={count}, ids go from 0 to {count - 1}")  # fmt: skip
+    return ids
+
+
+def shard_for_guild(guild_id: int, num_shards: int) -> int:
+    """The shard Discord sends a guild's events to"""
+    return (guild_id >> 22) % num_shards
+
+
+def served_guild_ids() -> list[int]:
+    num_shards: Union[int, None] = shard_count()
+    shards: Union[list[int], None] = shard_ids()
+    if num_shards is None or shards is None:
+        return configured_guild_ids()
+
+    return [
+        guild_id
+        for guild_id in configured_guild_ids()
+        if shard_for_guild(guild_id, num_shards) in shards
+    ]
+
+
+def guild_objects() -> list[discord.Object]:
+    """The guilds this process registers its application commands in"""
+    return [discord.Object(guild_id) for guild_id in served_guild_ids()]
@@ -1,128 +1,451 @@
-import shelve
+import asyncio
+from dataclasses import asdict
+from typing import Any, Union
 
 from discord import Member
 
+import cogs.utils.clock as clock
 import cogs.utils.constants as constants
+import cogs.utils.metrics as metrics
+from cogs.enums.snapshot_durability import SnapshotDurability
+from cogs.enums.storage_backend import StorageBackendType
+from cogs.enums.tracking_mode import TrackingMode
+from cogs.storage.base import StorageBackend, StorageStats, TimedSnapshot
+from cogs.storage.remote import SETTINGS_CHANGED, RemoteStorage
+from cogs.storage.shelve_backend import ShelveBackend
+from cogs.storage.sqlite_backend import SqliteBackend
+from cogs.storage.worker import StorageWorker
+from cogs.utils.attendance_matrix import AttendanceMatrix, Intervals, clip_intervals
+from cogs.utils.attendance_tally import AttendanceTally
+from cogs.utils.bot_settings import SETTING_KEYS, BotSettings
+from cogs.utils.session_archive import (
+    ArchivedSession,
+    ArchiveResults,
+    MemberHistoryEntry,
+    history_from_rows,
+)
+from cogs.utils.sessions import AttendanceSession
+
+# Opened by `open_storage`, or with the default backend on first use. Every disk
+# access goes through this worker's thread, none of it happens on the event loop.
+# Shard processes `connect_storage` to the storage service instead
+_worker: Union[StorageWorker, RemoteStorage, None] = None
+
+# Each guild's settings, loaded by `load_settings` then kept in sync by the
+# write-through setters (and reloaded when another shard process changes one)
+_settings: dict[Union[int, None], BotSettings] = {}
+_settings_reloads: dict[int, asyncio.Future] = {}
+
+# Lazily rebuilt per session by `get_attendance_tally`, then updated on every snapshot
+_tallies: dict[int, AttendanceTally] = {}
+
+# Set by `open_storage`. Unless it's `EVERY_TICK`, snapshots are buffered here until
+# `flush_snapshots` writes them, and every read of a session's snapshots flushes first
+_durability: SnapshotDurability = SnapshotDurability(constants.DEFAULT_SNAPSHOT_DURABILITY)  # fmt: skip
+_pending_snapshots: dict[int, list[TimedSnapshot]] = {}
+_pending_since: dict[int, float] = {}
 
 
-def get_instructors() -> list[int]:
-    with shelve.open(constants.SHELVE_DATABASE_NAME) as handle:
-        return handle["instructors"] if "instructors" in handle else []
+def create_backend(backend_type: StorageBackendType) -> StorageBackend:
+    if backend_type == StorageBackendType.SQLITE:
+        return SqliteBackend(constants.SQLITE_DATABASE_NAME)
+
+    return ShelveBackend(constants.SHELVE_DATABASE_NAME, constants.SNAPSHOT_LOG_DIRECTORY)  # fmt: skip
 
 
-def add_instructor(user_id: Member.id) -> bool:
-    if user_id in get_instructors():
+def open_storage(
+    backend_type: StorageBackendType,
+    durability: SnapshotDurability = SnapshotDurability(
+        constants.DEFAULT_SNAPSHOT_DURABILITY
+    ),
+) -> StorageWorker:
+    global _worker, _durability
+
+    if _worker is not None:
+        for session_id, snapshots in _take_pending().items():
+            _worker.submit("append_snapshots", session_id, snapshots)
+        _worker.submit("close")
+    _worker = StorageWorker(lambda: create_backend(backend_type))
+    _durability = durability
+    _tallies.clear()
+
+    return _worker
+
+
+def connect_storage(
+    path: str,
+    guild_ids: list[int],
+    durability: SnapshotDurability = SnapshotDurability(
+        constants.DEFAULT_SNAPSHOT_DURABILITY
+    ),
+) -> RemoteStorage:
+    """Use the storage service listening on `path`, for the sessions of `guild_ids`
+
+    Snapshots are still buffered here per `durability`, the service batches
+    them further. A guild's settings are reloaded whenever the service says
+    another shard serving it changed one.
+    """
+    global _worker, _durability
+
+    if _worker is not None:
+        for session_id, snapshots in _take_pending().items():
+            _worker.submit("append_snapshots", session_id, snapshots)
+        _worker.submit("close")
+    _worker = RemoteStorage(path, guild_ids, on_event=_on_storage_event)
+    _durability = durability
+    _tallies.clear()
+
+    return _worker
+
+
+def _on_storage_event(event: str, payload: Any) -> None:
+    if event == SETTINGS_CHANGED:
+        _settings_reloads[payload] = asyncio.ensure_future(load_settings(payload))
+
+
+async def close_storage() -> None:
+    global _worker
+
+    if _worker is not None:
+        await persist_snapshots()
+        await _worker.close()
+    _worker = None
+
+
+def storage_is_shared() -> bool:
+    """Whether storage is the service every shard process shares, which maintains the database itself"""
+    return isinstance(_worker, RemoteStorage)
+
+
+def storage_is_busy() -> bool:
+    """Whether a storage call is still waiting on the worker thread"""
+    return _worker is not None and _worker.in_flight > 0
+
+
+def _storage() -> StorageWorker:
+    if _worker is None:
+        return open_storage(StorageBackendType(constants.DEFAULT_STORAGE_BACKEND))
+
+    return _worker
+
+
+@metrics.timed(metrics.STORAGE_CALL_SECONDS)
+async def load_settings(guild_id: Union[int, None] = None) -> BotSettings:
+    """Load a guild's settings into memory, persisting defaults for any missing keys"""
+    defaults: dict[str, Any] = asdict(BotSettings())
+    # Instructors are persisted as a list for compatibility with older databases
+    defaults["instructors"] = []
+
+    loaded: dict[str, Any] = await _storage().call(
+        "load_settings", {key: defaults[key] for key in SETTING_KEYS}, guild_id
+    )
+
+    loaded["instructors"] = set(loaded["instructors"])
+    _settings[guild_id] = BotSettings(**loaded)
+    return _settings[guild_id]
+
+
+def get_settings(guild_id: Union[int, None]) -> BotSettings:
+    """A guild's settings, the defaults for a guild they weren't loaded for"""
+    return _settings.get(guild_id) or BotSettings()
+
+
+async def _loaded_settings(guild_id: Union[int, None]) -> BotSettings:
+    if guild_id not in _settings:
+        await load_settings(guild_id)
+
+    return _settings[guild_id]
+
+
+@metrics.timed(metrics.STORAGE_CALL_SECONDS)
+async def _write_key(guild_id: Union[int, None], key: str, value: Any) -> BotSettings:
+    """Write a guild's setting through, returning its settings to update in memory"""
+    settings: BotSettings = await _loaded_settings(guild_id)
+    await _storage().call("write_setting", key, value, guild_id)
+
+    return settings
+
+
+def get_instructors(guild_id: Union[int, None]) -> set[int]:
+    return get_settings(guild_id).instructors
+
+
+def is_instructor(guild_id: Union[int, None], user_id: Member.id) -> bool:
+    return user_id in get_settings(guild_id).instructors
+
+
+@metrics.timed(metrics.STORAGE_CALL_SECONDS)
+async def add_instructor(guild_id: Union[int, None], user_id: Member.id) -> bool:
+    settings: BotSettings = await _loaded_settings(guild_id)
+    if user_id in settings.instructors:
         return False
 
-    with shelve.open(constants.SHELVE_DATABASE_NAME) as handle:
-        temp_instructors: list[int] = handle["instructors"]
-        temp_instructors.append(user_id)
-        handle["instructors"] = temp_instructors
+    await _storage().call("add_instructor", user_id, guild_id)
+    settings.instructors.add(user_id)
 
-    return user_id in get_instructors()
+    return True
 
 
-def remove_instructor(user_id: Member.id) -> bool:
-    if user_id not in get_instructors():
+@metrics.timed(metrics.STORAGE_CALL_SECONDS)
+async def remove_instructor(guild_id: Union[int, None], user_id: Member.id) -> bool:
+    settings: BotSettings = await _loaded_settings(guild_id)
+    if user_id not in settings.instructors:
         return False
 
-    with shelve.open(constants.SHELVE_DATABASE_NAME) as handle:
-        temp_instructors: list[int] = handle["instructors"]
-        temp_instructors.remove(user_id)
-        handle["instructors"] = temp_instructors
+    await _storage().call("remove_instructor", user_id, guild_id)
+    settings.instructors.discard(user_id)
+
+    return True
+
+
+@metrics.timed(metrics.STORAGE_CALL_SECONDS)
+async def take_member_snapshot(
+    session_id: int, member_ids: list[int], taken_at: Union[float, None] = None
+) -> None:
+    tally: AttendanceTally = await get_attendance_tally(session_id)
+    taken_at = clock.now() if taken_at is None else taken_at
+    if _durability is SnapshotDurability.EVERY_TICK:
+        await _storage().call("append_snapshot", session_id, member_ids, taken_at)
+    else:
+        pending: list[TimedSnapshot] = _pending_snapshots.setdefault(session_id, [])
+        pending.append((member_ids, taken_at))
+        pending_since: float = _pending_since.setdefault(session_id, clock.now())
+        if (
+            len(pending) >= constants.SNAPSHOT_FLUSH_EVERY_SNAPSHOTS
+            or clock.now() - pending_since >= constants.SNAPSHOT_FLUSH_EVERY_SECONDS
+        ):
+            await flush_snapshots(session_id)
+    tally.add_snapshot(member_ids)
+
+
+def _take_pending(
+    session_id: Union[int, None] = None
+) -> dict[int, list[TimedSnapshot]]:
+    """Remove and return the buffered snapshots of a session, or of every session if None"""
+    session_ids: list[int] = list(_pending_snapshots) if session_id is None else [session_id]  # fmt: skip
+    taken: dict[int, list[TimedSnapshot]] = {}
+    for taken_id in session_ids:
+        _pending_since.pop(taken_id, None)
+        snapshots: list[TimedSnapshot] = _pending_snapshots.pop(taken_id, [])
+        if snapshots:
+            taken[taken_id] = snapshots
+    return taken
+
+
+@metrics.timed(metrics.STORAGE_CALL_SECONDS)
+async def flush_snapshots(session_id: Union[int, None] = None) -> None:
+    """Write a session's buffered snapshots (every session's if None) in one call per session"""
+    for flushed_id, snapshots in _take_pending(session_id).items():
+        await _storage().call("append_snapshots", flushed_id, snapshots)
+
+
+@metrics.timed(metrics.STORAGE_CALL_SECONDS)
+async def persist_snapshots(session_id: Union[int, None] = None) -> None:
+    """Flush a session's snapshots (every session's if None), and fsync them with `FSYNC_ON_STOP`"""
+    await flush_snapshots(session_id)
+    if _durability is SnapshotDurability.FSYNC_ON_STOP:
+        await _storage().call("sync_snapshots", session_id)
+
+
+@metrics.timed(metrics.STORAGE_CALL_SECONDS)
+async def get_snapshots(session_id: int) -> list[list[int]]:
+    await flush_snapshots(session_id)
+    return await _storage().call("read_snapshots", session_id)
+
+
+@metrics.timed(metrics.STORAGE_CALL_SECONDS)
+async def clear_snapshots(session_id: int) -> bool:
+    _take_pending(session_id)
+    _tallies.pop(session_id, None)
+
+    return await _storage().call("clear_snapshots", session_id)
+
+
+@metrics.timed(metrics.STORAGE_CALL_SECONDS)
+async def downsample_snapshots(session_id: int, factor: int) -> int:
+    """Keep every `factor`-th snapshot of a stopped session, returning how many are left"""
+    await flush_snapshots(session_id)
+    _tallies.pop(session_id, None)
+
+    return await _storage().call("downsample_snapshots", session_id, factor)
+
+
+@metrics.timed(metrics.STORAGE_CALL_SECONDS)
+async def get_attendance_tally(session_id: int) -> AttendanceTally:
+    """Per-member snapshot counts, rebuilt from the session's stored snapshots on first use"""
+    if session_id not in _tallies:
+        await flush_snapshots(session_id)
+        num_snapshots, totals = await _storage().call("member_counts", session_id)
+        # Another caller may have rebuilt it while this one was waiting on the worker
+        _tallies.setdefault(session_id, AttendanceTally(num_snapshots=num_snapshots, totals=totals))  # fmt: skip
+
+    return _tallies[session_id]
+
+
+@metrics.timed(metrics.STORAGE_CALL_SECONDS)
+async def get_snapshot_times(session_id: int) -> list[float]:
+    await flush_snapshots(session_id)
+    return await _storage().call("snapshot_times", session_id)
+
+
+@metrics.timed(metrics.STORAGE_CALL_SECONDS)
+async def get_attendance_matrix(
+    session_id: int, start: Union[float, None] = None, end: Union[float, None] = None
+) -> AttendanceMatrix:
+    """The session's attendance matrix, only over snapshots taken between `start` and `end` if either is given"""
+    await flush_snapshots(session_id)
+    num_snapshots, intervals = await _storage().call("member_intervals", session_id)
+    if start is None and end is None:
+        # Building the rows is linear in members and snapshots, keep it off the event loop
+        return await asyncio.to_thread(
+            AttendanceMatrix.from_intervals, num_snapshots, intervals
+        )
+
+    first, stop = await _storage().call(
+        "snapshot_range",
+        session_id,
+        float("-inf") if start is None else start,
+        float("inf") if end is None else end,
+    )
+    stop = max(stop, first)
+    return await asyncio.to_thread(_window_matrix, intervals, first, stop)
+
+
+def _window_matrix(intervals: Intervals, first: int, stop: int) -> AttendanceMatrix:
+    return AttendanceMatrix.from_intervals(
+        stop - first,
+        clip_intervals(intervals, first, stop),
+        first_snapshot=first,
+    )
+
+
+@metrics.timed(metrics.STORAGE_CALL_SECONDS)
+async def get_sessions() -> dict[int, AttendanceSession]:
+    return {
+        session_id: AttendanceSession.from_dict(session)
+        for session_id, session in (await _storage().call("load_sessions")).items()
+    }
+
+
+@metrics.timed(metrics.STORAGE_CALL_SECONDS)
+async def save_sessions(sessions: dict[int, AttendanceSession]) -> None:
+    await _storage().call(
+        "save_sessions",
+        {session_id: session.to_dict() for session_id, session in sessions.items()},
+    )
+
+
+@metrics.timed(metrics.STORAGE_CALL_SECONDS)
+async def clear_all_sessions() -> bool:
+    _take_pending()
+    await _storage().call("clear_all_snapshots")
+    _tallies.clear()
+    await save_sessions({})
+
+    return await get_sessions() == {}
+
+
+@metrics.timed(metrics.STORAGE_CALL_SECONDS)
+async def archive_session(session: ArchivedSession, results: ArchiveResults) -> None:
+    await _storage().call("archive_session", session.to_dict(), results)
+
 
-    return user_id not in get_instructors()
+@metrics.timed(metrics.STORAGE_CALL_SECONDS)
+async def get_member_history(
+    member_id: Member.id, since: Union[float, None] = None
+) -> list[MemberHistoryEntry]:
+    return history_from_rows(await _storage().call("member_history", member_id, since))
 
 
-def take_member_snapshot(member_ids: list[int]) -> None:
-    with shelve.open(constants.SHELVE_DATABASE_NAME) as handle:
-        temp_snapshots: list[dict] = handle["snapshots"]
-        snapshot: list[int] = member_ids
-        temp_snapshots.append(snapshot)
-        handle["snapshots"] = temp_snapshots
+@metrics.timed(metrics.STORAGE_CALL_SECONDS)
+async def drop_archived_sessions(ended_before: float) -> int:
+    return await _storage().call("drop_archived_sessions", ended_before)
 
 
-def get_snapshots() -> list[int]:
-    with shelve.open(constants.SHELVE_DATABASE_NAME) as handle:
-        snapshots: list[int] = handle["snapshots"]
+@metrics.timed(metrics.STORAGE_CALL_SECONDS)
+async def get_storage_size() -> int:
+    return await _storage().call("size")
 
-    return snapshots or []
 
+@metrics.timed(metrics.STORAGE_CALL_SECONDS)
+async def get_storage_stats() -> StorageStats:
+    return await _storage().call("stats")
 
-def clear_snapshots() -> bool:
-    with shelve.open(constants.SHELVE_DATABASE_NAME) as handle:
-        handle["snapshots"] = []
 
-    return get_snapshots() == []
+@metrics.timed(metrics.STORAGE_CALL_SECONDS)
+async def compact_storage() -> None:
+    await _storage().call("compact")
 
 
-def get_attendance_rate() -> float:
-    with shelve.open(constants.SHELVE_DATABASE_NAME) as handle:
-        attendance_rate: float = handle["minimum_attendance_rate"]
+def get_attendance_rate(guild_id: Union[int, None]) -> float:
+    return get_settings(guild_id).minimum_attendance_rate
 
-    return attendance_rate
 
+async def set_attendace_rate(guild_id: Union[int, None], rate: float) -> bool:
+    settings: BotSettings = await _write_key(guild_id, "minimum_attendance_rate", rate)
+    settings.minimum_attendance_rate = rate
 
-def set_attendace_rate(rate: float) -> bool:
-    with shelve.open(constants.SHELVE_DATABASE_NAME) as handle:
-        handle["minimum_attendance_rate"] = rate
+    return True
 
-    return rate == get_attendance_rate()
 
+def get_snapshot_interval(guild_id: Union[int, None]) -> int:
+    return get_settings(guild_id).snapshot_interval
 
-def get_snapshot_interval() -> int:
-    with shelve.open(constants.SHELVE_DATABASE_NAME) as handle:
-        snapshot_interval: int = handle["snapshot_interval"]
 
-    return snapshot_interval
+async def set_snapshot_interval(guild_id: Union[int, None], interval: int) -> bool:
+    settings: BotSettings = await _write_key(guild_id, "snapshot_interval", interval)
+    settings.snapshot_interval = interval
 
+    return True
 
-def set_snapshot_interval(interval: int) -> bool:
-    with shelve.open(constants.SHELVE_DATABASE_NAME) as handle:
-        handle["snapshot_interval"] = interval
 
-    return interval == get_snapshot_interval()
+def get_auto_clear_on_new_session(guild_id: Union[int, None]) -> bool:
+    return get_settings(guild_id).auto_clear_snapshots_on_new_session
 
 
-def get_auto_clear_on_new_session() -> bool:
-    with shelve.open(constants.SHELVE_DATABASE_NAME) as handle:
-        auto_clear: bool = handle["auto_clear_snapshots_on_new_session"]
+async def set_auto_clear_on_new_session(
+    guild_id: Union[int, None], should_clear: bool
+) -> bool:
+    settings: BotSettings = await _write_key(guild_id, "auto_clear_snapshots_on_new_session", should_clear)  # fmt: skip
+    settings.auto_clear_snapshots_on_new_session = should_clear
 
-    return auto_clear
+    return True
 
 
-def set_auto_clear_on_new_session(should_clear: bool) -> bool:
-    with shelve.open(constants.SHELVE_DATABASE_NAME) as handle:
-        handle["auto_clear_snapshots_on_new_session"] = should_clear
+def get_auto_clear_after_attendance_report(guild_id: Union[int, None]) -> bool:
+    return get_settings(guild_id).auto_clear_snapshots_after_attendance_report
 
-    return should_clear == get_auto_clear_on_new_session()
 
+async def set_auto_clear_after_attendance_report(
+    guild_id: Union[int, None], should_clear: bool
+) -> bool:
+    settings: BotSettings = await _write_key(guild_id, "auto_clear_snapshots_after_attendance_report", should_clear)  # fmt: skip
+    settings.auto_clear_snapshots_after_attendance_report = should_clear
 
-def get_auto_clear_after_attendance_report() -> bool:
-    with shelve.open(constants.SHELVE_DATABASE_NAME) as handle:
-        auto_clear: bool = handle["auto_clear_snapshots_after_attendance_report"]
+    return True
 
-    return auto_clear
 
+def get_important_attendance_responses_are_ephemeral(
+    guild_id: Union[int, None]
+) -> bool:
+    return get_settings(guild_id).important_attendance_responses_are_ephemeral
 
-def set_auto_clear_after_attendance_report(should_clear: bool) -> bool:
-    with shelve.open(constants.SHELVE_DATABASE_NAME) as handle:
-        handle["auto_clear_snapshots_after_attendance_report"] = should_clear
 
-    return should_clear == get_auto_clear_after_attendance_report()
+async def set_important_attendance_responses_are_ephemeral(
+    guild_id: Union[int, None], are_ephemeral: bool
+) -> bool:
+    settings: BotSettings = await _write_key(guild_id, "important_attendance_responses_are_ephemeral", are_ephemeral)  # fmt: skip
+    settings.important_attendance_responses_are_ephemeral = are_ephemeral
 
+    return True
 
-def get_important_attendance_responses_are_ephemeral() -> bool:
-    with shelve.open(constants.SHELVE_DATABASE_NAME) as handle:
-        responses_are_ephemeral: bool = handle[
-            "important_attendance_responses_are_ephemeral"
-        ]
 
-    return responses_are_ephemeral
+def get_tracking_mode(guild_id: Union[int, None]) -> TrackingMode:
+    return TrackingMode(get_settings(guild_id).tracking_mode)
 
 
-def set_important_attendance_responses_are_ephemeral(are_ephemeral: bool) -> bool:
-    with shelve.open(constants.SHELVE_DATABASE_NAME) as handle:
-        handle["important_attendance_responses_are_ephemeral"] = are_ephemeral
+async def set_tracking_mode(guild_id: Union[int, None], mode: TrackingMode) -> bool:
+    settings: BotSettings = await _write_key(guild_id, "tracking_mode", mode.value)
+    settings.tracking_mode = mode.value
 
-    return are_ephemeral == get_important_attendance_responses_are_ephemeral()
+    return True
@@ -0,0 +1,349 @@
+import os
+import pickle
+import struct
+import sys
+from array import array
+from dataclasses import asdict, dataclass, field
+from typing import Final, Iterable, Iterator, Union
+
+# Records are framed by a one byte type:
+# - INTERN: a uint64 user id, assigned the next index in the per-session member table
+# - DELTA: uint32 join and leave counts followed by that many uint32 member indices,
+#   one snapshot whose membership is the previous snapshot's plus/minus the deltas
+# - RUN: uint32 count of further snapshots identical to the previous one, extended
+#   in place while membership stays unchanged
+INTERN: Final[bytes] = b"I"
+DELTA: Final[bytes] = b"D"
+RUN: Final[bytes] = b"R"
+
+RECORD_TYPE: Final[struct.Struct] = struct.Struct("<c")
+INTERN_RECORD: Final[struct.Struct] = struct.Struct("<cQ")
+DELTA_HEADER: Final[struct.Struct] = struct.Struct("<cII")
+RUN_RECORD: Final[struct.Struct] = struct.Struct("<cI")
+RUN_COUNT: Final[struct.Struct] = struct.Struct("<I")
+INDEX_TYPECODE: Final[str] = "I"
+INDEX_SIZE: Final[int] = array(INDEX_TYPECODE).itemsize
+
+# The writer state is checkpointed next to the log after this many records, so
+# reopening a log only replays the records written since its last checkpoint
+CHECKPOINT_SUFFIX: Final[str] = ".checkpoint"
+CHECKPOINT_EVERY_RECORDS: Final[int] = 256
+
+Record = tuple[bytes, Union[int, tuple[array, array]]]
+
+
+@dataclass
+class _WriterState:
+    member_index: dict[int, int] = field(default_factory=dict)
+    current: set[int] = field(default_factory=set)
+    num_snapshots: int = 0
+    end_offset: int = 0
+    run_offset: Union[int, None] = None
+    run_length: int = 0
+    # Snapshot counts of closed presence stretches, and where each open one started
+    closed_counts: dict[int, int] = field(default_factory=dict)
+    present_since: dict[int, int] = field(default_factory=dict)
+    records_since_checkpoint: int = 0
+
+    def apply_delta(self, joins: Iterable[int], leaves: Iterable[int]) -> None:
+        for index in leaves:
+            since: int = self.present_since.pop(index)
+            self.closed_counts[index] = self.closed_counts.get(index, 0) + self.num_snapshots - since  # fmt: skip
+            self.current.discard(index)
+        for index in joins:
+            self.present_since[index] = self.num_snapshots
+            self.current.add(index)
+        self.num_snapshots += 1
+
+
+def _to_indices(values: list[int]) -> array:
+    indices: array = array(INDEX_TYPECODE, values)
+    if sys.byteorder != "little":
+        indices.byteswap()
+    return indices
+
+
+def _from_indices(data: bytes) -> array:
+    indices: array = array(INDEX_TYPECODE)
+    indices.frombytes(data)
+    if sys.byteorder != "little":
+        indices.byteswap()
+    return indices
+
+
+class SnapshotLog:
+    """Append-only, delta/run-length encoded log of member snapshots
+
+    Member ids are interned into a per-log index the first time they are seen.
+    A snapshot is stored as the joins/leaves since the previous one, and runs of
+    unchanged membership (the common case during a lecture) collapse into a
+    single counter. Appending writes only the new record, or rewrites the four
+    byte counter of the trailing run. A trailing record that was only partially
+    written (e.g. the process died mid-write) is ignored when reading.
+
+    The writer state, including per-member counts, is checkpointed every
+    `CHECKPOINT_EVERY_RECORDS` records (and on `checkpoint`), so reopening a log
+    after a restart costs the same however long the session already is.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.checkpoint_path = path + CHECKPOINT_SUFFIX
+        self._state: Union[_WriterState, None] = None
+
+    def _read(self, offset: int = 0) -> bytes:
+        try:
+            with open(self.path, "rb") as handle:
+                handle.seek(offset)
+                return handle.read()
+        except FileNotFoundError:
+            return b""
+
+    @staticmethod
+    def _records(data: bytes) -> Iterator[tuple[Record, int, int]]:
+        """Yield every complete record with its start and end offsets"""
+        position: int = 0
+        while position < len(data):
+            (record_type,) = RECORD_TYPE.unpack_from(data, position)
+            if record_type == INTERN:
+                end: int = position + INTERN_RECORD.size
+                if end > len(data):
+                    return
+                _, member_id = INTERN_RECORD.unpack_from(data, position)
+                yield (INTERN, member_id), position, end
+            elif record_type == DELTA:
+                start: int = position + DELTA_HEADER.size
+                if start > len(data):
+                    return
+                _, num_joins, num_leaves = DELTA_HEADER.unpack_from(data, position)
+                middle: int = start + num_joins * INDEX_SIZE
+                end: int = middle + num_leaves * INDEX_SIZE
+                if end > len(data):
+                    return
+                joins: array = _from_indices(data[start:middle])
+                leaves: array = _from_indices(data[middle:end])
+                yield (DELTA, (joins, leaves)), position, end
+            elif record_type == RUN:
+                end: int = position + RUN_RECORD.size
+                if end > len(data):
+                    return
+                _, count = RUN_RECORD.unpack_from(data, position)
+                yield (RUN, count), position, end
+            else:
+                return  # Torn or unknown trailing bytes
+
+            position = end
+
+    def _load_checkpoint(self) -> _WriterState:
+        """The last checkpointed writer state, or an empty one if it's missing or doesn't match the log"""
+        try:
+            with open(self.checkpoint_path, "rb") as handle:
+                state: _WriterState = _WriterState(**pickle.load(handle))
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError, TypeError):
+            return _WriterState()
+
+        try:
+            log_size: int = os.path.getsize(self.path)
+        except FileNotFoundError:
+            log_size = 0
+        if state.end_offset > log_size:
+            return _WriterState()  # The log was cleared or lost writes since
+
+        # The trailing run may have been extended in place after the checkpoint
+        if state.run_offset is not None:
+            run = next(self._records(self._read(state.run_offset)), None)
+            if run is None:
+                return _WriterState()
+            (_, run_length), _, _ = run
+            state.num_snapshots += run_length - state.run_length
+            state.run_length = run_length
+        return state
+
+    def checkpoint(self) -> None:
+        if self._state is None:
+            return
+
+        temporary_path: str = self.checkpoint_path + ".tmp"
+        with open(temporary_path, "wb") as handle:
+            pickle.dump(asdict(self._state) | {"records_since_checkpoint": 0}, handle)
+        os.replace(temporary_path, self.checkpoint_path)
+        self._state.records_since_checkpoint = 0
+
+    def _writer_state(self) -> _WriterState:
+        if self._state is not None:
+            return self._state
+
+        state: _WriterState = self._load_checkpoint()
+        checkpoint_offset: int = state.end_offset
+        for (record_type, payload), start, end in self._records(self._read(checkpoint_offset)):  # fmt: skip
+            if record_type == INTERN:
+                state.member_index[payload] = len(state.member_index)
+            elif record_type == DELTA:
+                state.apply_delta(*payload)
+                state.run_offset = None
+            elif record_type == RUN:
+                state.num_snapshots += payload
+                state.run_offset = checkpoint_offset + start
+                state.run_length = payload
+            state.end_offset = checkpoint_offset + end
+            state.records_since_checkpoint += 1
+
+        # Drop any torn trailing record so new records aren't appended after garbage
+        if os.path.exists(self.path) and os.path.getsize(self.path) != state.end_offset:
+            os.truncate(self.path, state.end_offset)
+
+        self._state = state
+        return state
+
+    def append(self, member_ids: list[int]) -> None:
+        self.extend([member_ids])
+
+    def extend(self, snapshots: Iterable[list[int]]) -> None:
+        """Append snapshots with a single write
+
+        A run that started before this batch and grew during it has its count
+        rewritten in place once, every other record goes into the one append.
+        """
+        state: _WriterState = self._writer_state()
+        batch_offset: int = state.end_offset
+        batch: bytearray = bytearray()
+        # (offset, length) of a run already on disk that this batch extended
+        grown_run: Union[tuple[int, int], None] = None
+
+        for member_ids in snapshots:
+            record: bytearray = bytearray()
+            indices: set[int] = set()
+            for member in member_ids:
+                index: Union[int, None] = state.member_index.get(member)
+                if index is None:
+                    index = len(state.member_index)
+                    state.member_index[member] = index
+                    record += INTERN_RECORD.pack(INTERN, member)
+                indices.add(index)
+
+            if state.num_snapshots > 0 and indices == state.current:
+                if state.run_offset is not None:
+                    state.run_length += 1
+                    state.num_snapshots += 1
+                    if state.run_offset >= batch_offset:
+                        RUN_COUNT.pack_into(batch, state.run_offset - batch_offset + 1, state.run_length)  # fmt: skip
+                    else:
+                        grown_run = (state.run_offset, state.run_length)
+                    continue
+
+                run_offset: Union[int, None] = state.end_offset + len(record)
+                record += RUN_RECORD.pack(RUN, 1)
+            else:
+                run_offset: Union[int, None] = None
+                joins: list[int] = sorted(indices.difference(state.current))
+                leaves: list[int] = sorted(state.current.difference(indices))
+                record += DELTA_HEADER.pack(DELTA, len(joins), len(leaves))
+                record += _to_indices(joins + leaves).tobytes()
+
+            batch += record
+            state.end_offset += len(record)
+            if run_offset is None:
+                state.apply_delta(joins, leaves)
+            else:
+                state.num_snapshots += 1
+                state.run_length = 1
+            state.run_offset = run_offset
+            state.records_since_checkpoint += 1
+
+        if grown_run is not None:
+            grown_offset, grown_length = grown_run
+            with open(self.path, "r+b") as handle:
+                handle.seek(grown_offset + 1)
+                handle.write(RUN_COUNT.pack(grown_length))
+        if batch:
+            with open(self.path, "ab") as handle:
+                handle.write(batch)
+
+        if state.records_since_checkpoint >= CHECKPOINT_EVERY_RECORDS:
+            self.checkpoint()
+
+    def sync(self) -> None:
+        """fsync the log, so its snapshots survive the machine going down and not just the bot"""
+        if os.path.exists(self.path):
+            with open(self.path, "ab") as handle:
+                os.fsync(handle.fileno())
+
+    def __iter__(self) -> Iterator[list[int]]:
+        members: list[int] = []
+        current: set[int] = set()
+        snapshot: list[int] = []
+        for (record_type, payload), _, _ in self._records(self._read()):
+            if record_type == INTERN:
+                members.append(payload)
+            elif record_type == DELTA:
+                joins, leaves = payload
+                current.update(joins)
+                current.difference_update(leaves)
+                snapshot = [members[index] for index in current]
+                yield snapshot
+            elif record_type == RUN:
+                for _ in range(payload):
+                    yield snapshot
+
+    def read(self) -> list[list[int]]:
+        return list(self)
+
+    @property
+    def num_snapshots(self) -> int:
+        return self._writer_state().num_snapshots
+
+    def member_counts(self) -> tuple[int, dict[int, int]]:
+        """Number of snapshots and per-member snapshot counts, without materialising any snapshot
+
+        Counts are kept up to date by the writer state, so this only replays the
+        records written since the last checkpoint the first time it's called.
+        """
+        state: _WriterState = self._writer_state()
+        return state.num_snapshots, {
+            member: state.closed_counts.get(index, 0)
+            + (
+                state.num_snapshots - state.present_since[index]
+                if index in state.present_since
+                else 0
+            )  # fmt: skip
+            for member, index in state.member_index.items()
+        }
+
+    def member_intervals(self) -> tuple[int, dict[int, list[tuple[int, int]]]]:
+        """Number of snapshots and each member's [joined, left) snapshot index ranges, in the same O(deltas) as `member_counts`"""
+        members: list[int] = []
+        intervals: dict[int, list[tuple[int, int]]] = {}
+        present_since: dict[int, int] = {}
+        num_snapshots: int = 0
+        for (record_type, payload), _, _ in self._records(self._read()):
+            if record_type == INTERN:
+                members.append(payload)
+            elif record_type == DELTA:
+                joins, leaves = payload
+                for index in leaves:
+                    intervals.setdefault(index, []).append((present_since.pop(index), num_snapshots))  # fmt: skip
+                for index in joins:
+                    present_since[index] = num_snapshots
+                num_snapshots += 1
+            elif record_type == RUN:
+                num_snapshots += payload
+
+        for index, since in present_since.items():
+            intervals.setdefault(index, []).append((since, num_snapshots))
+
+        return num_snapshots, {
+            members[index]: member_ranges for index, member_ranges in intervals.items()
+        }
+
+    def truncate(self) -> None:
+        with open(self.path, "wb"):
+            pass
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+        self._state = _WriterState()
+
+    def size(self) -> int:
+        try:
+            return os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0
@@ -0,0 +1,155 @@
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Final, Iterable, Union
+
+# `MAGIC`, a `<d` unix timestamp (the first snapshot's), then one `<Q`
+# millisecond offset from it per snapshot, never decreasing
+MAGIC: Final[bytes] = b"STIMES\x02\xff"
+EPOCH_HEADER: Final[struct.Struct] = struct.Struct("<8sd")
+OFFSET_TYPECODE: Final[str] = "Q"
+OFFSET_SIZE: Final[int] = array(OFFSET_TYPECODE).itemsize
+
+# Files written before the magic stored `<I` offsets, which overflow 49.7 days
+# after the epoch. They start with the (positive) epoch itself, whose last byte
+# is never the magic's `\xff`, and are rewritten in the current format on load
+LEGACY_EPOCH_HEADER: Final[struct.Struct] = struct.Struct("<d")
+LEGACY_OFFSET_TYPECODE: Final[str] = "I"
+
+
+def _to_bytes(offsets: array) -> bytes:
+    if sys.byteorder != "little":
+        offsets = array(OFFSET_TYPECODE, offsets)
+        offsets.byteswap()
+    return offsets.tobytes()
+
+
+def _from_bytes(typecode: str, data: bytes) -> array:
+    """Whole little-endian items of `data`, a partially written trailing one is dropped"""
+    offsets: array = array(typecode)
+    end: int = len(data) // offsets.itemsize * offsets.itemsize
+    offsets.frombytes(data[:end])
+    if sys.byteorder != "little":
+        offsets.byteswap()
+    return offsets
+
+
+class SnapshotTimes:
+    """Append-only time index for one session's snapshots, next to its `SnapshotLog`
+
+    Eight bytes per snapshot, with offsets that never decrease so a time range
+    maps to a snapshot index range with two binary searches. The offsets are
+    loaded once and kept in memory alongside the file. A trailing offset that was
+    only partially written is dropped.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._epoch: Union[float, None] = None
+        self._offsets: Union[array, None] = None
+
+    def _load(self) -> array:
+        if self._offsets is not None:
+            return self._offsets
+
+        self._offsets = array(OFFSET_TYPECODE)
+        try:
+            with open(self.path, "rb") as handle:
+                data: bytes = handle.read()
+        except FileNotFoundError:
+            return self._offsets
+
+        if not data.startswith(MAGIC):
+            return self._load_legacy(data)
+        if len(data) < EPOCH_HEADER.size:
+            os.truncate(self.path, 0)
+            return self._offsets
+
+        _, self._epoch = EPOCH_HEADER.unpack_from(data)
+        start: int = EPOCH_HEADER.size
+        self._offsets = _from_bytes(OFFSET_TYPECODE, data[start:])
+        end: int = start + len(self._offsets) * OFFSET_SIZE
+        if end != len(data):
+            os.truncate(self.path, end)
+        return self._offsets
+
+    def _load_legacy(self, data: bytes) -> array:
+        if len(data) < LEGACY_EPOCH_HEADER.size:
+            os.truncate(self.path, 0)
+            return self._offsets
+
+        (self._epoch,) = LEGACY_EPOCH_HEADER.unpack_from(data)
+        start: int = LEGACY_EPOCH_HEADER.size
+        self._offsets = array(OFFSET_TYPECODE, _from_bytes(LEGACY_OFFSET_TYPECODE, data[start:]))  # fmt: skip
+        converted_path: str = self.path + ".converted"
+        with open(converted_path, "wb") as handle:
+            handle.write(EPOCH_HEADER.pack(MAGIC, self._epoch))
+            handle.write(_to_bytes(self._offsets))
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(converted_path, self.path)
+        return self._offsets
+
+    def __len__(self) -> int:
+        return len(self._load())
+
+    def append(self, taken_at: float) -> None:
+        self.extend([taken_at])
+
+    def extend(self, taken_ats: Iterable[float]) -> None:
+        offsets: array = self._load()
+        added: array = array(OFFSET_TYPECODE)
+        for taken_at in taken_ats:
+            if self._epoch is None:
+                self._epoch = taken_at
+                with open(self.path, "wb") as handle:
+                    handle.write(EPOCH_HEADER.pack(MAGIC, taken_at))
+
+            previous: int = added[-1] if added else offsets[-1] if offsets else 0
+            added.append(max(round((taken_at - self._epoch) * 1_000), previous))
+
+        if added:
+            with open(self.path, "ab") as handle:
+                handle.write(_to_bytes(added))
+            offsets.extend(added)
+
+    def sync(self) -> None:
+        if os.path.exists(self.path):
+            with open(self.path, "ab") as handle:
+                os.fsync(handle.fileno())
+
+    def resize(self, num_snapshots: int) -> None:
+        """Match the snapshot log after a crash between writing one and the other
+
+        Extra offsets are dropped and missing ones repeat the last time.
+        """
+        offsets: array = self._load()
+        if len(offsets) > num_snapshots:
+            del offsets[num_snapshots:]
+            os.truncate(self.path, EPOCH_HEADER.size + num_snapshots * OFFSET_SIZE)
+        elif offsets and len(offsets) < num_snapshots:
+            padding: array = array(OFFSET_TYPECODE, [offsets[-1]] * (num_snapshots - len(offsets)))  # fmt: skip
+            with open(self.path, "ab") as handle:
+                handle.write(_to_bytes(padding))
+            offsets.extend(padding)
+
+    def read(self) -> list[float]:
+        offsets: array = self._load()
+        return [self._epoch + offset / 1_000 for offset in offsets]
+
+    def index_range(self, start: float, end: float) -> tuple[int, int]:
+        """Indices of the first snapshot taken at or after `start`, and of the first one after `end`"""
+        offsets: array = self._load()
+        if self._epoch is None:
+            return 0, 0
+        start_offset: float = (start - self._epoch) * 1_000
+        end_offset: float = (end - self._epoch) * 1_000
+        return bisect_left(offsets, start_offset), bisect_right(offsets, end_offset)
+
+    def clear(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self._epoch = None
+        self._offsets = array(OFFSET_TYPECODE)
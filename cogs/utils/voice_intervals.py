@@ -0,0 +1,150 @@
+from typing import Any, Iterable, Union
+
+import cogs.utils.clock as clock
+
+
+class VoiceIntervalTracker:
+    """Exact time-in-channel for one session, built from voice join/leave events
+
+    Members with an open interval are currently in the channel. Nothing is
+    recomputed while membership is stable; totals only change when a member
+    joins or leaves, or when `reconcile` corrects for missed gateway events.
+    """
+
+    def __init__(self, channel_id: int) -> None:
+        self.channel_id = channel_id
+        self.started_at: Union[float, None] = None
+        self.stopped_at: Union[float, None] = None
+        self.last_reconciled_at: Union[float, None] = None
+        self.open_intervals: dict[int, float] = {}
+        self.totals: dict[int, float] = {}
+        self.first_joined: dict[int, float] = {}
+        self.last_left: dict[int, float] = {}
+
+    @property
+    def is_running(self) -> bool:
+        return self.started_at is not None and self.stopped_at is None
+
+    def start(self, member_ids: Iterable[int], now: Union[float, None] = None) -> None:
+        now = clock.now() if now is None else now
+        if self.started_at is None:
+            self.started_at = now
+        else:
+            # Resuming a stopped session, don't count the time it was stopped. Everything
+            # seen before it stopped moves with `started_at`, so late joins and early
+            # leaves are still measured against the time the session actually ran
+            stopped_for: float = now - self.stopped_at
+            self.started_at += stopped_for
+            for seen in (self.first_joined, self.last_left):
+                for member in seen:
+                    seen[member] += stopped_for
+        self.stopped_at = None
+        self.last_reconciled_at = now
+        for member in member_ids:
+            self.member_joined(member, now)
+
+    def stop(self, now: Union[float, None] = None) -> None:
+        now = clock.now() if now is None else now
+        for member in list(self.open_intervals):
+            self.member_left(member, now)
+        self.stopped_at = now
+
+    def member_joined(self, member_id: int, now: Union[float, None] = None) -> None:
+        if member_id in self.open_intervals:
+            return
+        now = clock.now() if now is None else now
+        self.open_intervals[member_id] = now
+        self.totals.setdefault(member_id, 0.0)
+        self.first_joined.setdefault(member_id, now)
+
+    def member_left(self, member_id: int, now: Union[float, None] = None) -> None:
+        joined_at: Union[float, None] = self.open_intervals.pop(member_id, None)
+        if joined_at is None:
+            return
+        now = clock.now() if now is None else now
+        self.totals[member_id] += max(0.0, now - joined_at)
+        self.last_left[member_id] = now
+
+    def reconcile(
+        self, member_ids: Iterable[int], now: Union[float, None] = None
+    ) -> int:
+        """Fix up intervals against the channel's actual member list
+
+        A member who is present without an open interval (missed join) is opened
+        now. A member with an open interval who is gone (missed leave) is closed
+        at the last time they were verified present, so a lost event can never
+        inflate their total by more than one reconciliation period.
+        Returns the number of corrections made.
+        """
+        now = clock.now() if now is None else now
+        present: set[int] = set(member_ids)
+        corrections: int = 0
+
+        for member in present.difference(self.open_intervals):
+            self.member_joined(member, now)
+            corrections += 1
+
+        for member in set(self.open_intervals).difference(present):
+            last_verified: float = max(
+                self.open_intervals[member], self.last_reconciled_at or 0.0
+            )
+            self.member_left(member, last_verified)
+            corrections += 1
+
+        self.last_reconciled_at = now
+        return corrections
+
+    def session_duration(self, now: Union[float, None] = None) -> float:
+        if self.started_at is None:
+            return 0.0
+        end: float = self.stopped_at or (clock.now() if now is None else now)
+        return max(0.0, end - self.started_at)
+
+    def time_in_channel(self, member_id: int, now: Union[float, None] = None) -> float:
+        total: float = self.totals.get(member_id, 0.0)
+        if member_id in self.open_intervals:
+            total += (clock.now() if now is None else now) - self.open_intervals[member_id]  # fmt: skip
+        return total
+
+    def seen_between(
+        self, member_id: int, now: Union[float, None] = None
+    ) -> tuple[float, float]:
+        """When a member first joined and last left (or now, if they're still in the channel)"""
+        if member_id in self.open_intervals:
+            last_seen: float = self.stopped_at or (clock.now() if now is None else now)
+        else:
+            last_seen: float = self.last_left.get(member_id, self.stopped_at or 0.0)
+        return self.first_joined.get(member_id, self.started_at or 0.0), last_seen
+
+    def attendance_ratios(self, now: Union[float, None] = None) -> dict[int, float]:
+        duration: float = self.session_duration(now)
+        if duration == 0:
+            return {member: 0.0 for member in self.totals}
+        return {
+            member: min(1.0, self.time_in_channel(member, now) / duration)
+            for member in self.totals
+        }
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "channel_id": self.channel_id,
+            "started_at": self.started_at,
+            "stopped_at": self.stopped_at,
+            "last_reconciled_at": self.last_reconciled_at,
+            "open_intervals": self.open_intervals,
+            "totals": self.totals,
+            "first_joined": self.first_joined,
+            "last_left": self.last_left,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "VoiceIntervalTracker":
+        tracker: VoiceIntervalTracker = cls(data["channel_id"])
+        tracker.started_at = data["started_at"]
+        tracker.stopped_at = data["stopped_at"]
+        tracker.last_reconciled_at = data["last_reconciled_at"]
+        tracker.open_intervals = dict(data["open_intervals"])
+        tracker.totals = dict(data["totals"])
+        tracker.first_joined = dict(data.get("first_joined", {}))
+        tracker.last_left = dict(data.get("last_left", {}))
+        return tracker
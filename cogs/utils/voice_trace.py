@@ -0,0 +1,104 @@
+"""Trace files of what the bot saw happen in a guild, for replaying a class offline
+
+A trace is JSON lines, one event per line in the order they happened, each with
+the `clock.now()` timestamp it was recorded at under `"at"`:
+
+    {"event": "settings", "guild": 1, "settings": {...}}   every `BotSettings` field, instructors as a list
+    {"event": "channels", "channels": {"<id>": {"name": ..., "members": [...]}}}
+    {"event": "voice", "member": 1, "before": 10, "after": null}
+    {"event": "command", "command": "attendance start", "user": 1, "options": {...}}
+
+`channels` is every voice channel's members, recorded whenever the bot becomes
+ready. Command options are stored as given, except channels and members which
+are stored as `{"channel": id}` and `{"user": id}`.
+
+    recorder: TraceRecorder = TraceRecorder("trace.jsonl")
+    recorder.voice(member.id, before_channel, after_channel)
+    for event in read_trace("trace.jsonl"): ...
+"""
+
+import json
+from dataclasses import asdict
+from typing import IO, Any, Final, Iterator, Union
+
+import cogs.utils.clock as clock
+from cogs.utils.bot_settings import BotSettings
+
+VERSION: Final[int] = 1
+
+# Application command option types, from Discord's API
+SUB_COMMAND: Final[int] = 1
+SUB_COMMAND_GROUP: Final[int] = 2
+USER: Final[int] = 6
+CHANNEL: Final[int] = 7
+
+
+def command_options(data: dict[str, Any]) -> tuple[str, dict[str, Any]]:
+    """The qualified name and options of an application command interaction's raw data"""
+    names: list[str] = [data["name"]]
+    options: list[dict[str, Any]] = data.get("options", [])
+    while len(options) == 1 and options[0]["type"] in (SUB_COMMAND, SUB_COMMAND_GROUP):
+        names.append(options[0]["name"])
+        options = options[0].get("options", [])
+
+    values: dict[str, Any] = {}
+    for option in options:
+        if option["type"] == CHANNEL:
+            values[option["name"]] = {"channel": int(option["value"])}
+        elif option["type"] == USER:
+            values[option["name"]] = {"user": int(option["value"])}
+        else:
+            values[option["name"]] = option["value"]
+    return " ".join(names), values
+
+
+def settings_payload(settings: BotSettings) -> dict[str, Any]:
+    payload: dict[str, Any] = asdict(settings)
+    payload["instructors"] = sorted(settings.instructors)
+    return payload
+
+
+class TraceRecorder:
+    """Appends events to a trace file, one line per event as it happens"""
+
+    def __init__(self, path: str) -> None:
+        # Line buffered, a crash loses at most the event being written
+        self.file: IO[str] = open(path, "a", buffering=1)
+
+    def write(self, event: str, **fields: Any) -> None:
+        self.file.write(json.dumps({"event": event, "at": clock.now(), **fields}) + "\n")  # fmt: skip
+
+    def settings(self, guild_id: Union[int, None], settings: BotSettings) -> None:
+        self.write(
+            "settings",
+            version=VERSION,
+            guild=guild_id,
+            settings=settings_payload(settings),
+        )
+
+    def channels(self, channels: dict[int, tuple[str, list[int]]]) -> None:
+        self.write(
+            "channels",
+            channels={
+                str(channel_id): {"name": name, "members": members}
+                for channel_id, (name, members) in channels.items()
+            },
+        )
+
+    def voice(
+        self, member_id: int, before: Union[int, None], after: Union[int, None]
+    ) -> None:
+        self.write("voice", member=member_id, before=before, after=after)
+
+    def command(self, command: str, user_id: int, options: dict[str, Any]) -> None:
+        self.write("command", command=command, user=user_id, options=options)
+
+    def close(self) -> None:
+        self.file.close()
+
+
+def read_trace(path: str) -> Iterator[dict[str, Any]]:
+    with open(path) as file:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
@@ -1,39 +1,45 @@
-from io import StringIO
+import asyncio
+import io
+import logging
+import os
 from time import time
-from typing import Any
+from typing import Any, Callable, Union
 from uuid import uuid4
 
 import discord
-import requests
 from discord import ButtonStyle, Embed, app_commands
 from discord.ext import commands
 from discord.ui.item import Item
-from requests import Response
 
 import cogs.utils.constants as constants
 import cogs.utils.interaction_checks as interaction_checks
+from cogs.utils.csv_export import attendance_csv_text, export_attendance_csv
 from cogs.utils.embed_generator import create_embed, create_embed_error
+from cogs.utils.member_attendance import MemberAttendance
+from cogs.utils.mystbin import MystbinError, MystbinUploader, get_uploader
+
+logger: logging.Logger = logging.getLogger("cogs.views.attendance_export")
 
 
 class AttendanceExportButtons(discord.ui.View):
     def __init__(
         self,
         client: commands.Bot,
-        attendance_data: dict,
+        attendance_data: list[MemberAttendance],
         timeout: int = constants.BUTTON_VIEW_TIMEOUT,
+        build_session_export: Union[Callable[[], bytes], None] = None,
     ) -> None:
         self.client = client
         self.attendance_data = attendance_data
+        # Builds the raw session export, only available for polling sessions
+        self.build_session_export = build_session_export
         self.message = None
         super().__init__(timeout=timeout)
+        if build_session_export is None:
+            self.remove_item(self.generate_session_export_button)
 
     async def attendance_data_to_csv(self) -> str:
-        csv_str: str = f"{constants.CSV_HEADERS}\n"
-
-        for member, did_attend in self.attendance_data.items():
-            csv_str += f"{member},{did_attend}\n"
-
-        return csv_str
+        return await asyncio.to_thread(attendance_csv_text, self.attendance_data)
 
     @discord.ui.button(label="Generate CSV", style=discord.ButtonStyle.blurple)
     async def generate_csv_button(
@@ -41,16 +47,34 @@ class AttendanceExportButtons(discord.ui.View):
         interaction: discord.Interaction,
         button: discord.ui.Button,
     ) -> None:
+        # A big class can take longer to export than Discord waits for a response
+        await interaction.response.defer(ephemeral=True, thinking=True)
         button.disabled = True
         await interaction.message.edit(view=self)
 
-        csv: str = await self.attendance_data_to_csv()
+        size_limit: int = (
+            interaction.guild.filesize_limit
+            if interaction.guild
+            else constants.DEFAULT_ATTACHMENT_SIZE_LIMIT_BYTES
+        )
+        # Built off the event loop, a big class can spill the export to disk
+        export_file, is_compressed = await asyncio.to_thread(
+            export_attendance_csv, self.attendance_data, size_limit
+        )
         timestamp: int = int(time())
-        filename: str = f"attendance_export_{timestamp}.csv"
-        string_io_file: StringIO = StringIO(csv)
+        filename: str = f"attendance_export_{timestamp}.csv{'.gz' if is_compressed else ''}"  # fmt: skip
 
-        await interaction.response.send_message(
-            file=discord.File(string_io_file, filename=filename),
+        if is_compressed and export_file.seek(0, os.SEEK_END) > size_limit:
+            export_file.close()
+            embed: Embed = await create_embed_error(
+                "Sorry, this export is too large to attach even when compressed. Try uploading it to Mystbin instead"
+            )
+            await interaction.followup.send(embed=embed)
+            return
+
+        export_file.seek(0)
+        await interaction.followup.send(
+            file=discord.File(export_file, filename=filename),
         )
 
     @discord.ui.button(
@@ -61,6 +85,8 @@ class AttendanceExportButtons(discord.ui.View):
         interaction: discord.Interaction,
         button: discord.ui.Button,
     ) -> None:
+        # Uploads can take a while (and retry), so acknowledge the interaction first
+        await interaction.response.defer(thinking=True)
         button.disabled = True
         await interaction.message.edit(view=self)
 
@@ -69,23 +95,51 @@ class AttendanceExportButtons(discord.ui.View):
         filename: str = f"attendance_export_{timestamp}.csv"
         password: str = uuid4().hex[:12]  # Create sudo-random password for paste
 
-        json: dict = {
-            "password": password,
-            "files": [{"content": csv, "filename": filename}],
-        }
-        response: Response = requests.put(constants.MYSTBIN_PASTE_API, json=json)
-        if response.status_code != 201:
+        uploader: MystbinUploader = get_uploader()
+        try:
+            paste_id: str = await uploader.create_paste(
+                [{"content": csv, "filename": filename}], password=password
+            )
+        except MystbinError as error:
+            logger.warning(error)
             embed: Embed = await create_embed_error(
                 "Sorry, there seemed to have been an issue uploading this file to Mystbin"
             )
-            await interaction.response.send_message(embed=embed)
+            await interaction.followup.send(embed=embed)
             return
 
-        paste_id: str = response.json()["id"]
         embed: Embed = await create_embed(
-            f"Your CSV has been uploaded with the password ||`{password}`||\n\nhttps://mystb.in/{paste_id}"
+            f"Your CSV has been uploaded with the password ||`{password}`||\n\n{uploader.paste_url(paste_id)}"
+        )
+        await interaction.followup.send(embed=embed)
+
+    @discord.ui.button(label="Export Raw Session", style=discord.ButtonStyle.blurple)
+    async def generate_session_export_button(
+        self,
+        interaction: discord.Interaction,
+        button: discord.ui.Button,
+    ) -> None:
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        button.disabled = True
+        await interaction.message.edit(view=self)
+
+        size_limit: int = (
+            interaction.guild.filesize_limit
+            if interaction.guild
+            else constants.DEFAULT_ATTACHMENT_SIZE_LIMIT_BYTES
+        )
+        session_export: bytes = await asyncio.to_thread(self.build_session_export)
+        if len(session_export) > size_limit:
+            embed: Embed = await create_embed_error(
+                "Sorry, this session is too large to attach. Try a report over part of the session instead"
+            )
+            await interaction.followup.send(embed=embed)
+            return
+
+        timestamp: int = int(time())
+        await interaction.followup.send(
+            file=discord.File(io.BytesIO(session_export), filename=f"attendance_session_{timestamp}.atmx"),  # fmt: skip
         )
-        await interaction.response.send_message(embed=embed)
 
     async def interaction_check(self, interaction: discord.Interaction) -> bool:
         if await interaction_checks.user_is_instructor_or_owner(
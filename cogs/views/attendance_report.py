@@ -0,0 +1,154 @@
+from typing import Callable, Union
+
+import discord
+from discord import ButtonStyle, Embed
+from discord.ext import commands
+
+import cogs.utils.constants as constants
+from cogs.enums.report_filter import ReportFilter
+from cogs.utils.embed_generator import create_embed_error
+from cogs.utils.member_attendance import MemberAttendance
+from cogs.utils.report_pages import ReportPages
+from cogs.views.attendance_export import AttendanceExportButtons
+
+EMPTY_PAGE_MESSAGES: dict[ReportFilter, str] = {
+    ReportFilter.ALL: "No students attended this session",
+    ReportFilter.ATTENDED: "No students met the attendance rate",
+    ReportFilter.ABSENT: "No students were absent",
+}
+
+
+class JumpToPageModal(discord.ui.Modal, title="Jump to page"):
+    page = discord.ui.TextInput(label="Page", max_length=6)
+
+    def __init__(self, view: "AttendanceReportView") -> None:
+        super().__init__()
+        self.view = view
+        self.page.placeholder = f"1 - {view.num_pages}"
+
+    async def on_submit(self, interaction: discord.Interaction) -> None:
+        value: str = self.page.value.strip()
+        if not value.isdigit() or not 1 <= int(value) <= self.view.num_pages:
+            embed: Embed = await create_embed_error(
+                f"Pick a page between 1 and {self.view.num_pages}"
+            )
+            await interaction.response.send_message(embed=embed, ephemeral=True)
+            return
+
+        await self.view.show_page(interaction, int(value) - 1)
+
+
+class AttendanceReportView(AttendanceExportButtons):
+    """An attendance report shown one page at a time, with the export buttons underneath
+
+    The result is computed once by the report command; paging and filtering only
+    render the members on the page being looked at.
+    """
+
+    def __init__(
+        self,
+        client: commands.Bot,
+        attendance_data: list[MemberAttendance],
+        header_embed: Embed,
+        timeout: int = constants.BUTTON_VIEW_TIMEOUT,
+        build_session_export: Union[Callable[[], bytes], None] = None,
+    ) -> None:
+        super().__init__(client, attendance_data, timeout, build_session_export)
+        self.header_embed = header_embed
+        self.pages: ReportPages = ReportPages(
+            attendance_data,
+            constants.MAXIMUM_MESSAGE_EMBED_CHARACTERS
+            - len(header_embed)
+            - constants.REPORT_PAGE_FOOTER_RESERVE,
+        )
+        self.report_filter: ReportFilter = ReportFilter.ALL
+        self.page: int = 0
+
+    @property
+    def num_pages(self) -> int:
+        return self.pages.num_pages(self.report_filter)
+
+    def render(self) -> list[Embed]:
+        descriptions: list[str] = self.pages.render(self.report_filter, self.page)
+        embeds: list[Embed] = [self.header_embed] + [
+            Embed(description=description) for description in descriptions
+        ]
+        if not descriptions:
+            embeds.append(Embed(description=EMPTY_PAGE_MESSAGES[self.report_filter]))
+
+        num_rows: int = len(self.pages.rows(self.report_filter))
+        shown: str = "total" if self.report_filter is ReportFilter.ALL else self.report_filter.value  # fmt: skip
+        embeds[-1].set_footer(text=f"Page {self.page + 1}/{self.num_pages} · {num_rows} {shown}")  # fmt: skip
+
+        is_first: bool = self.page == 0
+        is_last: bool = self.page >= self.num_pages - 1
+        self.first_page_button.disabled = is_first
+        self.previous_page_button.disabled = is_first
+        self.next_page_button.disabled = is_last
+        self.last_page_button.disabled = is_last
+        self.jump_to_page_button.label = f"{self.page + 1}/{self.num_pages}"
+        self.jump_to_page_button.disabled = self.num_pages == 1
+
+        return embeds
+
+    async def show_page(self, interaction: discord.Interaction, page: int) -> None:
+        self.page = min(max(page, 0), self.num_pages - 1)
+        await interaction.response.edit_message(embeds=self.render(), view=self)
+
+    @discord.ui.button(label="≪", style=ButtonStyle.gray, row=1)
+    async def first_page_button(
+        self, interaction: discord.Interaction, button: discord.ui.Button
+    ) -> None:
+        await self.show_page(interaction, 0)
+
+    @discord.ui.button(label="<", style=ButtonStyle.gray, row=1)
+    async def previous_page_button(
+        self, interaction: discord.Interaction, button: discord.ui.Button
+    ) -> None:
+        await self.show_page(interaction, self.page - 1)
+
+    @discord.ui.button(label="1/1", style=ButtonStyle.gray, row=1)
+    async def jump_to_page_button(
+        self, interaction: discord.Interaction, button: discord.ui.Button
+    ) -> None:
+        await interaction.response.send_modal(JumpToPageModal(self))
+
+    @discord.ui.button(label=">", style=ButtonStyle.gray, row=1)
+    async def next_page_button(
+        self, interaction: discord.Interaction, button: discord.ui.Button
+    ) -> None:
+        await self.show_page(interaction, self.page + 1)
+
+    @discord.ui.button(label="≫", style=ButtonStyle.gray, row=1)
+    async def last_page_button(
+        self, interaction: discord.Interaction, button: discord.ui.Button
+    ) -> None:
+        await self.show_page(interaction, self.num_pages - 1)
+
+    @discord.ui.select(
+        placeholder="Show all students",
+        options=[
+            discord.SelectOption(label="All students", value=ReportFilter.ALL.value),
+            discord.SelectOption(
+                label="Attended only", value=ReportFilter.ATTENDED.value
+            ),  # fmt: skip
+            discord.SelectOption(label="Absent only", value=ReportFilter.ABSENT.value),
+        ],
+        row=2,
+    )
+    async def filter_select(
+        self, interaction: discord.Interaction, select: discord.ui.Select
+    ) -> None:
+        self.report_filter = ReportFilter(select.values[0])
+        for option in select.options:
+            option.default = option.value == self.report_filter.value
+        await self.show_page(interaction, 0)
+
+    async def on_timeout(self) -> None:
+        for child in self.children:
+            if isinstance(child, discord.ui.Button):
+                child.style = ButtonStyle.gray
+            child.disabled = True
+        message: Union[discord.Message, None] = self.message
+        if message is not None:
+            await message.edit(view=self)
@@ -1,23 +1,37 @@
 import asyncio
 import logging
 import os
-import shelve
+from typing import Union
 
 import discord
 from discord.ext import commands
 from dotenv import load_dotenv
 
 import cogs.utils.constants as constants
-
-
-class AttendanceBot(commands.Bot):
-    def __init__(self) -> None:
-        client_intents = discord.Intents.default()
-
+import cogs.utils.sharding as sharding
+import cogs.utils.shelve_utils as shelve_utils
+from cogs.enums.gateway_profile import GatewayProfile
+from cogs.enums.snapshot_durability import SnapshotDurability
+from cogs.enums.storage_backend import StorageBackendType
+from cogs.utils.command_tree import TimedCommandTree
+from cogs.utils.gateway_profile import client_options
+from cogs.utils.mystbin import close_uploader
+
+
+class AttendanceBot(commands.AutoShardedBot):
+    def __init__(
+        self,
+        profile: GatewayProfile,
+        shard_count: Union[int, None] = None,
+        shard_ids: Union[list[int], None] = None,
+    ) -> None:
         super().__init__(
             command_prefix=commands.when_mentioned,
-            intents=client_intents,
             help_command=None,
+            tree_cls=TimedCommandTree,
+            shard_count=shard_count,
+            shard_ids=shard_ids,
+            **client_options(profile),
         )
 
     async def load_extensions(self) -> None:
@@ -32,40 +46,42 @@ class AttendanceBot(commands.Bot):
 async def main() -> None:
     load_dotenv()
 
-    # Set up simple persistence
-    with shelve.open(constants.SHELVE_DATABASE_NAME) as handle:
-        if "instructors" not in handle:
-            handle["instructors"] = []
-
-        if "minimum_attendance_rate" not in handle:
-            handle["minimum_attendance_rate"] = constants.DEFAULT_MINIMUM_ATTENDANCE_RATE_PERCENTAGE  # fmt: skip
-
-        if "snapshot_interval" not in handle:
-            handle["snapshot_interval"] = constants.DEFAULT_SNAPSHOT_INTERVAL_SECONDS  # fmt: skip
-
-        if "auto_clear_snapshots_on_new_session" not in handle:
-            handle["auto_clear_snapshots_on_new_session"] = constants.DEFAULT_AUTO_CLEAR_SNAPSHOTS_ON_NEW_SESSION  # fmt: skip
-
-        if "auto_clear_snapshots_after_attendance_report" not in handle:
-            handle["auto_clear_snapshots_after_attendance_report"] = constants.DEFAULT_AUTO_CLEAR_SNAPSHOTS_AFTER_ATTENDANCE_REPORT  # fmt: skip
-
-        if "important_attendance_responses_are_ephemeral" not in handle:
-            handle["important_attendance_responses_are_ephemeral"] = constants.DEFAULT_IMPORTANT_ATTENDANCE_RESPONSES_ARE_EPHEMERAL  # fmt: skip
-
-        # Always reset snapshots when bot is restarted
-        handle["snapshots"] = []
-
-        """
-        instructors: list[int]
-        - list of ints (user ids) that are later used to retrieve full discord.User objects
-
-        snapshots: list[int]
-        - list of ints (user ids) that were in the VC (in attendance) when the snapshot was taken
-        """
+    guild_ids: list[int] = sharding.served_guild_ids()
+    if not guild_ids:
+        raise RuntimeError(
+            "No guild to serve, set GUILD_ID (or GUILD_IDS) to guilds on this process's shards"
+        )
 
-    client: AttendanceBot = AttendanceBot()
-    async with client:
-        await client.start(os.getenv("DISCORD_BOT_TOKEN"))
+    # Set up persistence, each guild's settings are kept in memory from here on.
+    # Shard processes share the storage service listening on STORAGE_SOCKET
+    durability: SnapshotDurability = SnapshotDurability(
+        os.getenv("SNAPSHOT_DURABILITY") or constants.DEFAULT_SNAPSHOT_DURABILITY
+    )
+    socket_path: Union[str, None] = os.getenv("STORAGE_SOCKET")
+    if socket_path:
+        shelve_utils.connect_storage(socket_path, guild_ids, durability)
+    else:
+        shelve_utils.open_storage(
+            StorageBackendType(
+                os.getenv("STORAGE_BACKEND") or constants.DEFAULT_STORAGE_BACKEND
+            ),
+            durability,
+        )
+    await asyncio.gather(*(shelve_utils.load_settings(guild_id) for guild_id in guild_ids))  # fmt: skip
+
+    client: AttendanceBot = AttendanceBot(
+        GatewayProfile(
+            os.getenv("GATEWAY_PROFILE") or constants.DEFAULT_GATEWAY_PROFILE
+        ),
+        shard_count=sharding.shard_count(),
+        shard_ids=sharding.shard_ids(),
+    )
+    try:
+        async with client:
+            await client.start(os.getenv("DISCORD_BOT_TOKEN"))
+    finally:
+        await close_uploader()
+        await shelve_utils.close_storage()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,175 @@
+"""Just enough of discord.py's client, channel and interaction objects to drive the real cogs offline
+
+Used by `tools.replay_trace` and `tools.load_test`. Interactions record what was
+sent in response, and when the interaction was first acknowledged. Commands and
+buttons are run the way discord.py runs them, check first:
+
+    interaction: FakeInteraction = FakeInteraction(FakeMember(1))
+    await invoke_command(cog, cog.show_instructors, interaction)
+    await press_button(view, view.generate_csv_button, interaction)
+"""
+
+import time
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+from typing import Any, Union
+
+import discord
+from discord import app_commands
+from discord.ext import commands
+
+import cogs.utils.constants as constants
+
+BOT_ID: int = 2
+GUILD_ID: int = 3
+
+
+@dataclass
+class FakeMember:
+    id: int
+
+    @property
+    def mention(self) -> str:
+        return f"<@{self.id}>"
+
+
+@dataclass
+class FakeChannel:
+    id: int
+    name: str
+    members: list[FakeMember] = field(default_factory=list)
+    guild_id: int = GUILD_ID
+
+    @property
+    def mention(self) -> str:
+        return f"<#{self.id}>"
+
+    @property
+    def guild(self) -> SimpleNamespace:
+        return SimpleNamespace(id=self.guild_id)
+
+
+class FakeTask:
+    """Stands in for the presence cog's task loop"""
+
+    def __init__(self) -> None:
+        self.running: bool = False
+
+    def is_running(self) -> bool:
+        return self.running
+
+    def start(self) -> None:
+        self.running = True
+
+    def cancel(self) -> None:
+        self.running = False
+
+
+class FakeClient:
+    def __init__(
+        self,
+        channels: Union[dict[int, FakeChannel], None] = None,
+        owner_ids: Union[set[int], None] = None,
+    ) -> None:
+        self.application_id: int = BOT_ID
+        self.channels: dict[int, FakeChannel] = channels if channels is not None else {}  # fmt: skip
+        self.owner_ids: set[int] = owner_ids or set()
+        self.presence = SimpleNamespace(presence_task=FakeTask())
+
+    def is_ready(self) -> bool:
+        return True
+
+    async def is_owner(self, user: FakeMember) -> bool:
+        return user.id in self.owner_ids
+
+    def get_channel(self, channel_id: int) -> Union[FakeChannel, None]:
+        return self.channels.get(channel_id)
+
+    def get_cog(self, name: str) -> Any:
+        return self.presence if name == "presence" else None
+
+
+class FakeResponse:
+    def __init__(self) -> None:
+        self.embeds: list[discord.Embed] = []
+        self.files: list[discord.File] = []
+        self.view: Union[discord.ui.View, None] = None
+        # `time.perf_counter()` of the first response or defer
+        self.responded_at: Union[float, None] = None
+
+    def is_done(self) -> bool:
+        return self.responded_at is not None
+
+    def acknowledge(self) -> None:
+        if self.responded_at is None:
+            self.responded_at = time.perf_counter()
+
+    async def send_message(self, *args: Any, **kwargs: Any) -> None:
+        self.acknowledge()
+        self.embeds += kwargs.get("embeds") or ([kwargs["embed"]] if "embed" in kwargs else [])  # fmt: skip
+        if "file" in kwargs:
+            self.files.append(kwargs["file"])
+        self.view = kwargs.get("view", self.view)
+
+    async def defer(self, *args: Any, **kwargs: Any) -> None:
+        self.acknowledge()
+
+
+class FakeFollowup:
+    def __init__(self, response: FakeResponse) -> None:
+        self.response = response
+
+    async def send(self, *args: Any, **kwargs: Any) -> None:
+        await self.response.send_message(*args, **kwargs)
+
+
+class FakeMessage:
+    async def edit(self, *args: Any, **kwargs: Any) -> None:
+        pass
+
+
+class FakeInteraction:
+    def __init__(self, user: FakeMember, guild_id: int = GUILD_ID) -> None:
+        self.user = user
+        self.guild_id = guild_id
+        self.response: FakeResponse = FakeResponse()
+        self.followup: FakeFollowup = FakeFollowup(self.response)
+        self.message: FakeMessage = FakeMessage()
+        self.channel = SimpleNamespace(
+            mention="#fake",
+            permissions_for=lambda member: SimpleNamespace(send_messages=True),
+        )
+        self.guild = SimpleNamespace(
+            id=guild_id,
+            get_member=FakeMember,
+            filesize_limit=constants.DEFAULT_ATTACHMENT_SIZE_LIMIT_BYTES,
+        )
+
+    async def original_response(self) -> FakeMessage:
+        return self.message
+
+
+async def invoke_command(
+    cog: commands.Cog,
+    command: app_commands.Command,
+    interaction: FakeInteraction,
+    **options: Any,
+) -> None:
+    """Check the user may run the command, then run it, errors go to the cog's handler"""
+    try:
+        if not await cog.interaction_check(interaction):
+            raise app_commands.CheckFailure()
+        await command.callback(cog, interaction, **options)
+    except app_commands.AppCommandError as error:
+        await cog.cog_app_command_error(interaction, error)
+
+
+async def press_button(
+    view: discord.ui.View, button: discord.ui.Button, interaction: FakeInteraction
+) -> None:
+    """Like `View._scheduled_task`, check the user may press the button, then run its callback"""
+    try:
+        if await view.interaction_check(interaction):
+            await button.callback(interaction)
+    except Exception as error:
+        await view.on_error(interaction, error, button)
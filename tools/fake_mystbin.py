@@ -0,0 +1,81 @@
+"""A local stand-in for the Mystbin paste API, for testing exports without hitting mystb.in
+
+Point the bot at it with `MYSTBIN_BASE_API=http://127.0.0.1:8090` and
+`MYSTBIN_BASE_URL=http://127.0.0.1:8090/paste` in .env, then run it from the repo root with
+`python3 -m tools.fake_mystbin`. `--fail-first` and `--delay` simulate an unreliable or slow API.
+"""
+
+import argparse
+import asyncio
+import time
+from email.utils import formatdate
+from uuid import uuid4
+
+from aiohttp import web
+
+import cogs.utils.constants as constants
+
+PASTES: web.AppKey = web.AppKey("pastes", dict)
+STATE: web.AppKey = web.AppKey("state", dict)
+
+
+async def create_paste(request: web.Request) -> web.Response:
+    state: dict = request.app[STATE]
+    state["requests"] += 1
+    payload: dict = await request.json()
+    await asyncio.sleep(state["delay"])
+
+    if state["requests"] <= state["fail_first"]:
+        # As an HTTP date, the form of Retry-After that's easy to mishandle
+        return web.json_response(
+            {"error": "Simulated outage"},
+            status=503,
+            headers={"Retry-After": formatdate(time.time(), usegmt=True)},
+        )
+
+    files: list = payload.get("files")
+    if not files or not all("content" in file and "filename" in file for file in files):
+        return web.json_response({"error": "Invalid files"}, status=400)
+
+    paste_id: str = uuid4().hex[:10]
+    request.app[PASTES][paste_id] = payload
+    return web.json_response(
+        {"id": paste_id, "created_at": time.time(), "expires": None}, status=201
+    )
+
+
+async def get_paste(request: web.Request) -> web.Response:
+    payload: dict = request.app[PASTES].get(request.match_info["paste_id"])
+    if payload is None:
+        return web.json_response({"error": "Unknown paste"}, status=404)
+    if payload.get("password") not in (None, request.query.get("password")):
+        return web.json_response({"error": "Wrong password"}, status=401)
+
+    return web.Response(
+        text="\n".join(file["content"] for file in payload["files"]),
+        content_type="text/plain",
+    )
+
+
+def create_app(fail_first: int = 0, delay: float = 0.0) -> web.Application:
+    app: web.Application = web.Application()
+    app[PASTES] = {}
+    app[STATE] = {"requests": 0, "fail_first": fail_first, "delay": delay}
+    app.router.add_put(constants.MYSTBIN_PASTE_ENDPOINT, create_paste)
+    app.router.add_get(f"{constants.MYSTBIN_PASTE_ENDPOINT}/{{paste_id}}", get_paste)
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--fail-first", type=int, default=0, help="Respond 503 to this many uploads first")  # fmt: skip
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds to wait before responding")  # fmt: skip
+    args = parser.parse_args()
+
+    web.run_app(create_app(args.fail_first, args.delay), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Round-trip checks for the on-disk storage formats, at the edges they have broken on before
+
+Every check writes one of the formats (to a temporary directory) and reads it back:
+
+- snapshot times more than 2^32 ms (49.7 days) after a session's first snapshot
+- snapshot times files written with the old 32-bit offsets, converted on load
+- session exports of a session that long, and version 1 exports with 32-bit times
+- a session archived again after being resumed, with fewer members than before
+- compacting a shelve file no dbm module recognises
+
+Run from the repo root with `python3 -m tools.format_checks`, it exits with 1
+if any check failed.
+"""
+
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from typing import Callable
+
+import cogs.utils.session_export as session_export
+from cogs.storage.shelve_backend import ShelveBackend
+from cogs.storage.sqlite_backend import SqliteBackend
+from cogs.utils.attendance_matrix import AttendanceMatrix
+from cogs.utils.session_export import SessionExport, write_session_export
+from cogs.utils.snapshot_times import SnapshotTimes
+
+EPOCH: float = 1_700_000_000.0
+# Past where a uint32 millisecond offset overflows
+LONG_SESSION_SECONDS: float = 2**32 / 1_000 + 24 * 60 * 60
+
+
+def check_long_session_times(directory: str) -> None:
+    taken_ats: list[float] = [EPOCH, EPOCH + 3.0, EPOCH + LONG_SESSION_SECONDS]
+    path: str = os.path.join(directory, "long.times")
+    snapshot_times: SnapshotTimes = SnapshotTimes(path)
+    snapshot_times.extend(taken_ats[:2])
+    snapshot_times.append(taken_ats[2])
+
+    reloaded: SnapshotTimes = SnapshotTimes(path)
+    assert reloaded.read() == taken_ats, reloaded.read()
+    assert reloaded.index_range(EPOCH + 4.0, EPOCH + LONG_SESSION_SECONDS) == (2, 3)
+
+
+def check_legacy_times(directory: str) -> None:
+    path: str = os.path.join(directory, "legacy.times")
+    with open(path, "wb") as handle:
+        handle.write(struct.pack("<d", EPOCH))
+        handle.write(array("I", [0, 3_000, 6_000]).tobytes())
+        handle.write(b"\x00\x01")  # A partially written offset
+
+    assert SnapshotTimes(path).read() == [EPOCH, EPOCH + 3.0, EPOCH + 6.0]
+    converted: SnapshotTimes = SnapshotTimes(path)
+    converted.append(EPOCH + LONG_SESSION_SECONDS)
+    assert SnapshotTimes(path).read() == [EPOCH, EPOCH + 3.0, EPOCH + 6.0, EPOCH + LONG_SESSION_SECONDS]  # fmt: skip
+
+
+def check_long_session_export(_: str) -> None:
+    taken_ats: list[float] = [EPOCH, EPOCH + 3.0, EPOCH + LONG_SESSION_SECONDS]
+    matrix: AttendanceMatrix = AttendanceMatrix.from_snapshots([[1, 2], [2], [1]])
+    loaded: SessionExport = SessionExport(write_session_export(matrix, taken_ats, {}))
+    assert loaded.times() == taken_ats, loaded.times()
+    assert [loaded.is_present(0, snapshot) for snapshot in range(3)] == [True, False, True]  # fmt: skip
+
+
+def check_version_1_export(_: str) -> None:
+    taken_ats: list[float] = [EPOCH, EPOCH + 3.0]
+    matrix: AttendanceMatrix = AttendanceMatrix.from_snapshots([[1], [1]])
+    # The version 1 writer, only the times section and the version differ
+    session_export.VERSION, version = 1, session_export.VERSION
+    try:
+        export: bytes = write_session_export(matrix, taken_ats, {})
+    finally:
+        session_export.VERSION = version
+    assert SessionExport(export).times() == taken_ats
+
+
+def check_rearchived_session(directory: str) -> None:
+    session: dict = {"archive_id": 1, "ended_at": EPOCH}
+    for backend in (
+        ShelveBackend(os.path.join(directory, "archive"), directory),
+        SqliteBackend(os.path.join(directory, "archive.sqlite")),
+    ):
+        backend.archive_session(session, {1: (1.0, True), 2: (0.5, False)})
+        # Resumed and stopped again, member 2 didn't come back
+        backend.archive_session(session | {"ended_at": EPOCH + 60}, {1: (0.8, True)})
+        name: str = type(backend).__name__
+        assert [row[1:] for row in backend.member_history(1)] == [(0.8, True)], name
+        assert backend.member_history(2) == [], name
+        backend.close()
+
+
+def check_unrecognised_compaction(directory: str) -> None:
+    path: str = os.path.join(directory, "unknown")
+    with open(path, "wb") as handle:
+        handle.write(b"not a dbm database")
+
+    backend: ShelveBackend = ShelveBackend(path, directory)
+    backend.compact()
+    with open(path, "rb") as handle:
+        assert handle.read() == b"not a dbm database"
+
+
+CHECKS: list[Callable[[str], None]] = [
+    check_long_session_times,
+    check_legacy_times,
+    check_long_session_export,
+    check_version_1_export,
+    check_rearchived_session,
+    check_unrecognised_compaction,
+]
+
+
+def main() -> None:
+    failed: bool = False
+    for check in CHECKS:
+        with tempfile.TemporaryDirectory() as directory:
+            try:
+                check(directory)
+            except Exception as error:
+                failed = True
+                print(f"{check.__name__:<32}{error!r}")
+            else:
+                print(f"{check.__name__:<32}ok")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""Concurrent interaction load test of the real cogs, through the stand-ins in `tools.fake_discord`
+
+Hundreds of instructors and owners use one command or export button at a time,
+`--concurrency` interactions in flight, while a polling session takes real
+snapshots in the background. Each scenario reports the latency to the first
+response (what Discord's 3 second deadline applies to) and to completion, and
+how late a ticker coroutine woke up meanwhile: a blocking call anywhere on the
+event loop shows up as lag here, as it would for the gateway heartbeat.
+
+The export buttons are pressed on the report of a finished session, uploads go
+to `tools.fake_mystbin` running on its own thread. Storage is a real backend in
+a temporary directory.
+
+Run from the repo root with `python3 -m tools.load_test`
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any, Awaitable, Callable
+
+from aiohttp import web
+
+import cogs.utils.clock as clock
+import cogs.utils.constants as constants
+import cogs.utils.shelve_utils as shelve_utils
+from benchmarks.event_loop_lag import measure_lag
+from benchmarks.snapshot_storage import generate_session
+from cogs.attendance import AttendanceCommandsCog
+from cogs.enums.snapshot_durability import SnapshotDurability
+from cogs.enums.storage_backend import StorageBackendType
+from cogs.enums.tracking_mode import TrackingMode
+from cogs.instructor import InstructorCommandsCog
+from cogs.utils.mystbin import close_uploader
+from cogs.utils.sessions import AttendanceSession
+from tools.fake_discord import (
+    GUILD_ID,
+    FakeChannel,
+    FakeClient,
+    FakeInteraction,
+    FakeMember,
+    invoke_command,
+    press_button,
+)
+from tools.fake_mystbin import create_app
+
+LIVE_CHANNEL_ID: int = 100
+FINISHED_CHANNEL_ID: int = 200
+
+Scenario = Callable[[FakeInteraction], Awaitable[None]]
+
+
+@dataclass
+class ScenarioResult:
+    first_response: list[float] = field(default_factory=list)
+    completed: list[float] = field(default_factory=list)
+    lags: list[float] = field(default_factory=list)
+    unanswered: int = 0
+    errors: int = 0
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered: list[float] = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def start_fake_mystbin(delay: float) -> tuple[str, Callable[[], None]]:
+    """Serve `tools.fake_mystbin` from its own thread and event loop, returning its URL and a stop function"""
+    loop: asyncio.AbstractEventLoop = asyncio.new_event_loop()
+    runner: web.AppRunner = web.AppRunner(create_app(delay=delay), access_log=None)
+    loop.run_until_complete(runner.setup())
+    site: web.TCPSite = web.TCPSite(runner, "127.0.0.1", 0)
+    loop.run_until_complete(site.start())
+    port: int = runner.addresses[0][1]
+    thread: threading.Thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+
+    def stop() -> None:
+        asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+    return f"http://127.0.0.1:{port}", stop
+
+
+async def run_scenario(
+    scenario: Scenario,
+    users: list[FakeMember],
+    requests: int,
+    concurrency: int,
+    tick: float,
+) -> ScenarioResult:
+    result: ScenarioResult = ScenarioResult()
+    semaphore: asyncio.Semaphore = asyncio.Semaphore(concurrency)
+
+    async def interact(index: int) -> None:
+        async with semaphore:
+            interaction: FakeInteraction = FakeInteraction(users[index % len(users)])
+            started_at: float = time.perf_counter()
+            try:
+                await scenario(interaction)
+            except Exception:
+                result.errors += 1
+            result.completed.append(time.perf_counter() - started_at)
+            if interaction.response.responded_at is None:
+                result.unanswered += 1
+            else:
+                result.first_response.append(interaction.response.responded_at - started_at)  # fmt: skip
+
+    async def work() -> None:
+        await asyncio.gather(*(interact(index) for index in range(requests)))
+
+    _, result.lags = await measure_lag(work, tick)
+    return result
+
+
+async def prepare_finished_session(
+    cog: AttendanceCommandsCog, channel: FakeChannel, args: argparse.Namespace
+) -> None:
+    """A stopped polling session with `--hours` of history, for the report and its export buttons"""
+    num_snapshots: int = int(args.hours * 3600 / args.interval)
+    started_at: float = clock.now() - args.hours * 3600
+    session: AttendanceSession = AttendanceSession(
+        channel_id=channel.id,
+        snapshot_interval=args.interval,
+        tracking_mode=TrackingMode.POLLING,
+        started_at=started_at,
+        stopped_at=started_at + num_snapshots * args.interval,
+        archive_id=int(started_at * 1_000),
+    )
+    cog.sessions[channel.id] = session
+    for index, snapshot in enumerate(generate_session(args.class_size, num_snapshots, args.churn)):  # fmt: skip
+        await shelve_utils.take_member_snapshot(channel.id, snapshot, started_at + index * args.interval)  # fmt: skip
+    await shelve_utils.persist_snapshots(channel.id)
+    await shelve_utils.save_sessions(cog.sessions)
+
+
+async def run(args: argparse.Namespace) -> dict[str, ScenarioResult]:
+    shelve_utils.open_storage(StorageBackendType(args.backend), SnapshotDurability(args.durability))  # fmt: skip
+    await shelve_utils.load_settings(GUILD_ID)
+    await shelve_utils.set_snapshot_interval(GUILD_ID, args.interval)
+
+    # Alternate instructors and owners, owners go through the slower `is_owner` check
+    users: list[FakeMember] = [FakeMember(10_000 + index) for index in range(args.users)]  # fmt: skip
+    instructors: list[FakeMember] = users[::2]
+    for user in instructors:
+        await shelve_utils.add_instructor(GUILD_ID, user.id)
+    client: FakeClient = FakeClient(owner_ids={user.id for user in users[1::2]})
+
+    live: FakeChannel = FakeChannel(LIVE_CHANNEL_ID, "live", [instructors[0], *map(FakeMember, range(1, args.class_size))])  # fmt: skip
+    finished: FakeChannel = FakeChannel(FINISHED_CHANNEL_ID, "finished")
+    client.channels.update({live.id: live, finished.id: finished})
+
+    attendance: AttendanceCommandsCog = AttendanceCommandsCog(client)
+    instructor: InstructorCommandsCog = InstructorCommandsCog(client)
+    await attendance.cog_load()
+    await prepare_finished_session(attendance, finished, args)
+
+    report: FakeInteraction = FakeInteraction(instructors[0])
+    await invoke_command(attendance, attendance.get_attendance, report, channel=finished)  # fmt: skip
+    view: Any = report.response.view
+    view.stop()
+    await invoke_command(attendance, attendance.start_session, FakeInteraction(instructors[0]), channel=live)  # fmt: skip
+
+    scenarios: dict[str, Scenario] = {
+        "attendance stats": partial(
+            invoke_command,
+            attendance,
+            attendance.get_stats_for_current_session,
+            channel=live,
+        ),
+        "instructor show": partial(
+            invoke_command, instructor, instructor.show_instructors
+        ),
+        "attendance get": partial(
+            invoke_command, attendance, attendance.get_attendance, channel=finished
+        ),
+        "Generate CSV": partial(press_button, view, view.generate_csv_button),
+        "Upload to Mystbin": partial(press_button, view, view.generate_mystbin_button),
+        "Export Raw Session": partial(
+            press_button, view, view.generate_session_export_button
+        ),
+    }
+    results: dict[str, ScenarioResult] = {}
+    try:
+        for name, scenario in scenarios.items():
+            if args.only and name not in args.only:
+                continue
+            results[name] = await run_scenario(scenario, users, args.requests, args.concurrency, args.tick)  # fmt: skip
+    finally:
+        await attendance.stop_session_tracking(attendance.sessions[live.id])
+        await attendance.cog_unload()
+        await close_uploader()
+        await shelve_utils.close_storage()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=400, help="Half instructors, half owners")  # fmt: skip
+    parser.add_argument("--requests", type=int, default=1_000, help="Interactions per scenario")  # fmt: skip
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--class-size", type=int, default=300)
+    parser.add_argument("--hours", type=float, default=3.0, help="Length of the reported session")  # fmt: skip
+    parser.add_argument("--interval", type=int, default=constants.DEFAULT_SNAPSHOT_INTERVAL_SECONDS)  # fmt: skip
+    parser.add_argument("--churn", type=float, default=0.0005)
+    parser.add_argument("--tick", type=float, default=0.005, help="Seconds between lag measurements")  # fmt: skip
+    parser.add_argument("--mystbin-delay", type=float, default=0.05, help="Seconds the fake Mystbin takes per upload")  # fmt: skip
+    parser.add_argument("--backend", choices=[backend.value for backend in StorageBackendType], default=StorageBackendType.SHELVE.value)  # fmt: skip
+    parser.add_argument("--durability", choices=[durability.value for durability in SnapshotDurability], default=constants.DEFAULT_SNAPSHOT_DURABILITY)  # fmt: skip
+    parser.add_argument("--only", nargs="+", help="Only run these scenarios")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    base_url, stop_mystbin = start_fake_mystbin(args.mystbin_delay)
+    os.environ["MYSTBIN_BASE_API"] = base_url
+    os.environ["MYSTBIN_BASE_URL"] = f"{base_url}{constants.MYSTBIN_PASTE_ENDPOINT}"
+
+    working_directory: str = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            results: dict[str, ScenarioResult] = asyncio.run(run(args))
+        finally:
+            os.chdir(working_directory)
+            stop_mystbin()
+
+    print(
+        f"{args.users} users, {args.requests} interactions per scenario, {args.concurrency} at a time, "
+        f"{args.class_size} members, {args.backend} backend\n"
+    )
+    print(f"{'scenario':<20}{'first p50':>11}{'first p99':>11}{'done p50':>10}{'done p99':>10}{'lag p99':>9}{'lag max':>9}{'failed':>8}")  # fmt: skip
+    for name, result in results.items():
+        failed: int = result.errors + result.unanswered
+        print(
+            f"{name:<20}"
+            f"{percentile(result.first_response, 0.5) * 1_000:>8.1f} ms{percentile(result.first_response, 0.99) * 1_000:>8.1f} ms"
+            f"{percentile(result.completed, 0.5) * 1_000:>7.1f} ms{percentile(result.completed, 0.99) * 1_000:>7.1f} ms"
+            f"{percentile(result.lags, 0.99) * 1_000:>6.1f} ms{max(result.lags, default=0.0) * 1_000:>6.1f} ms{failed:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
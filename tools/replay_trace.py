@@ -0,0 +1,444 @@
+"""Replays a voice trace against the attendance cog on a simulated clock, to check reports offline
+
+The trace (recorded by `cogs.trace`, or generated with `--synthetic`) is fed into
+`AttendanceCommandsCog` through a fake guild: voice events move fake members
+between fake channels and are passed to its `on_voice_state_update`, commands call
+the command callbacks directly (skipping the instructor check). Recorded settings
+are applied to the fake guild, whichever guild they were recorded in. Storage is
+a real backend in a temporary directory.
+
+The event loop runs on a simulated clock that jumps straight to the next timer
+whenever nothing is left to do (and no storage call is in flight), and
+`cogs.utils.clock` reads from it, so an 8-hour class replays in seconds. Every
+report is checked against each member's exact time in the channel, from the trace.
+
+Run from the repo root with `python3 -m tools.replay_trace trace.jsonl`, or
+`python3 -m tools.replay_trace --synthetic --hours 8` for a generated class.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import selectors
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Any, Callable, Iterable, Iterator, Union
+
+import discord
+
+import cogs.utils.clock as clock
+import cogs.utils.shelve_utils as shelve_utils
+from cogs.attendance import AttendanceCommandsCog
+from cogs.enums.snapshot_durability import SnapshotDurability
+from cogs.enums.storage_backend import StorageBackendType
+from cogs.enums.tracking_mode import TrackingMode
+from cogs.utils.bot_settings import BotSettings
+from cogs.utils.member_attendance import MemberAttendance
+from cogs.utils.sessions import AttendanceSession
+from cogs.utils.voice_trace import read_trace, settings_payload
+from tools.fake_discord import (
+    GUILD_ID,
+    FakeChannel,
+    FakeClient,
+    FakeInteraction,
+    FakeMember,
+)
+
+INSTRUCTOR_ID: int = 1
+CHANNEL_ID: int = 10
+
+SETTING_SETTERS: dict[str, Callable[[int, Any], Any]] = {
+    "minimum_attendance_rate": shelve_utils.set_attendace_rate,
+    "snapshot_interval": shelve_utils.set_snapshot_interval,
+    "auto_clear_snapshots_on_new_session": shelve_utils.set_auto_clear_on_new_session,
+    "auto_clear_snapshots_after_attendance_report": shelve_utils.set_auto_clear_after_attendance_report,
+    "important_attendance_responses_are_ephemeral": shelve_utils.set_important_attendance_responses_are_ephemeral,
+    "tracking_mode": lambda guild_id, mode: shelve_utils.set_tracking_mode(
+        guild_id, TrackingMode(mode)
+    ),
+}
+
+
+class SimulatedSelector(selectors.BaseSelector):
+    """Wraps the loop's real selector, waiting is done by moving the simulated clock forward"""
+
+    def __init__(self, is_busy: Callable[[], bool]) -> None:
+        self.selector: selectors.BaseSelector = selectors.DefaultSelector()
+        self.is_busy = is_busy
+        self.now: float = 0.0
+
+    def register(self, fileobj: Any, events: int, data: Any = None) -> selectors.SelectorKey:  # fmt: skip
+        return self.selector.register(fileobj, events, data)
+
+    def unregister(self, fileobj: Any) -> selectors.SelectorKey:
+        return self.selector.unregister(fileobj)
+
+    def modify(self, fileobj: Any, events: int, data: Any = None) -> selectors.SelectorKey:  # fmt: skip
+        return self.selector.modify(fileobj, events, data)
+
+    def get_map(self) -> Any:
+        return self.selector.get_map()
+
+    def close(self) -> None:
+        self.selector.close()
+
+    def select(self, timeout: Union[float, None] = None) -> list:
+        # A storage call will wake the loop through its self-pipe, wait for it for real
+        if timeout is None or timeout <= 0 or self.is_busy():
+            return self.selector.select(timeout)
+
+        ready: list = self.selector.select(0)
+        if not ready:
+            self.now += timeout
+        return ready
+
+
+class SimulatedTimeLoop(asyncio.SelectorEventLoop):
+    def __init__(self) -> None:
+        self.simulated: SimulatedSelector = SimulatedSelector(
+            shelve_utils.storage_is_busy
+        )
+        super().__init__(self.simulated)
+
+    def time(self) -> float:
+        return self.simulated.now
+
+
+@dataclass
+class ReportCheck:
+    """How far a report's ratios were from each member's exact time in the channel"""
+
+    command: str
+    class_size: int
+    max_error: float
+    mismatched: list[int]
+
+
+class Presence:
+    """Every member's exact time in each channel, rebuilt from the trace as it's replayed"""
+
+    def __init__(self) -> None:
+        # channel id -> member id -> [joined at, left at or None]
+        self.intervals: dict[int, dict[int, list[list[Union[float, None]]]]] = {}
+
+    def join(self, channel_id: int, member_id: int, at: float) -> None:
+        self.intervals.setdefault(channel_id, {}).setdefault(member_id, []).append([at, None])  # fmt: skip
+
+    def leave(self, channel_id: int, member_id: int, at: float) -> None:
+        for interval in self.intervals.get(channel_id, {}).get(member_id, []):
+            if interval[1] is None:
+                interval[1] = at
+
+    def seconds(
+        self, channel_id: int, member_id: int, windows: list[tuple[float, float]]
+    ) -> float:
+        total: float = 0.0
+        for joined_at, left_at in self.intervals.get(channel_id, {}).get(member_id, []):  # fmt: skip
+            left_at = float("inf") if left_at is None else left_at
+            for start, end in windows:
+                total += max(0.0, min(end, left_at) - max(start, joined_at))
+        return total
+
+    def members(self, channel_id: int) -> Iterable[int]:
+        return self.intervals.get(channel_id, {}).keys()
+
+
+def tracked_windows(
+    session: AttendanceSession, start: float, end: float
+) -> list[tuple[float, float]]:
+    """The parts of `start` to `end` the session was tracking, between its gaps"""
+    windows: list[tuple[float, float]] = []
+    for interrupted_at, resumed_at in sorted(session.gaps):
+        if interrupted_at > start:
+            windows.append((start, min(interrupted_at, end)))
+        start = max(start, resumed_at)
+    if end > start:
+        windows.append((start, end))
+    return windows
+
+
+class Replay:
+    def __init__(self, cog: AttendanceCommandsCog, client: FakeClient) -> None:
+        self.cog = cog
+        self.client = client
+        self.presence: Presence = Presence()
+        self.commands: dict[str, Any] = {
+            command.qualified_name: command for command in cog.walk_app_commands()
+        }
+        self.timings: dict[str, list[float]] = {}
+        self.checks: list[ReportCheck] = []
+        # The header embed of every report
+        self.reports: list[discord.Embed] = []
+        self.skipped: dict[str, int] = {}
+        self.replayed: int = 0
+
+    def channel(self, channel_id: int, name: Union[str, None] = None) -> FakeChannel:
+        if channel_id not in self.client.channels:
+            self.client.channels[channel_id] = FakeChannel(channel_id, name or str(channel_id))  # fmt: skip
+        return self.client.channels[channel_id]
+
+    async def apply(self, event: dict[str, Any]) -> None:
+        self.replayed += 1
+        match event["event"]:
+            case "settings":
+                await self.apply_settings(event["settings"])
+            case "channels":
+                self.set_channels(event["channels"], event["at"])
+            case "voice":
+                await self.move(event["member"], event["before"], event["after"], event["at"])  # fmt: skip
+            case "command":
+                await self.run_command(event["command"], event["user"], event["options"])  # fmt: skip
+
+    async def apply_settings(self, settings: dict[str, Any]) -> None:
+        for key, setter in SETTING_SETTERS.items():
+            if key in settings:
+                await setter(GUILD_ID, settings[key])
+        instructors: set[int] = set(settings.get("instructors", []))
+        for instructor in shelve_utils.get_instructors(GUILD_ID) - instructors:
+            await shelve_utils.remove_instructor(GUILD_ID, instructor)
+        for instructor in instructors:
+            await shelve_utils.add_instructor(GUILD_ID, instructor)
+
+    def set_channels(self, channels: dict[str, dict[str, Any]], at: float) -> None:
+        for channel_id, recorded in channels.items():
+            channel: FakeChannel = self.channel(int(channel_id), recorded["name"])
+            before: set[int] = {member.id for member in channel.members}
+            after: set[int] = set(recorded["members"])
+            for member in before - after:
+                self.presence.leave(channel.id, member, at)
+            for member in after - before:
+                self.presence.join(channel.id, member, at)
+            channel.members = [FakeMember(member) for member in recorded["members"]]
+
+    async def move(
+        self,
+        member_id: int,
+        before: Union[int, None],
+        after: Union[int, None],
+        at: float,
+    ) -> None:
+        member: FakeMember = FakeMember(member_id)
+        before_channel: Union[FakeChannel, None] = self.channel(before) if before is not None else None  # fmt: skip
+        after_channel: Union[FakeChannel, None] = self.channel(after) if after is not None else None  # fmt: skip
+        if before_channel is not None:
+            before_channel.members = [existing for existing in before_channel.members if existing.id != member_id]  # fmt: skip
+            self.presence.leave(before_channel.id, member_id, at)
+        if after_channel is not None:
+            after_channel.members.append(member)
+            self.presence.join(after_channel.id, member_id, at)
+
+        await self.cog.on_voice_state_update(
+            member,
+            SimpleNamespace(channel=before_channel),
+            SimpleNamespace(channel=after_channel),
+        )
+
+    def option(self, value: Any) -> Any:
+        if isinstance(value, dict) and "channel" in value:
+            return self.channel(value["channel"])
+        if isinstance(value, dict) and "user" in value:
+            return FakeMember(value["user"])
+        return value
+
+    async def run_command(
+        self, name: str, user_id: int, options: dict[str, Any]
+    ) -> None:
+        command: Any = self.commands.get(name)
+        if command is None:
+            self.skipped[name] = self.skipped.get(name, 0) + 1
+            return
+
+        arguments: dict[str, Any] = {key: self.option(value) for key, value in options.items()}  # fmt: skip
+        # Report on the session as it was before the command ran, auto clear may remove it
+        reported: Union[AttendanceSession, None] = None
+        if name == "attendance get":
+            reported = self.reported_session(arguments.get("channel"))
+
+        interaction: FakeInteraction = FakeInteraction(FakeMember(user_id))
+        started_at: float = time.perf_counter()
+        await command.callback(self.cog, interaction, **arguments)
+        self.timings.setdefault(name, []).append(time.perf_counter() - started_at)
+
+        view: Any = interaction.response.view
+        if view is not None:
+            view.stop()
+            self.reports.append(interaction.response.embeds[0])
+            if reported is not None:
+                self.checks.append(self.check_report(name, reported, view.attendance_data, arguments))  # fmt: skip
+
+    def reported_session(
+        self, channel: Union[FakeChannel, None]
+    ) -> Union[AttendanceSession, None]:
+        if channel is not None:
+            return self.cog.sessions.get(channel.id)
+        stopped: list[AttendanceSession] = [session for session in self.cog.sessions.values() if not session.is_running]  # fmt: skip
+        return stopped[0] if len(stopped) == 1 else None
+
+    def check_report(
+        self,
+        name: str,
+        session: AttendanceSession,
+        attendance_data: list[MemberAttendance],
+        arguments: dict[str, Any],
+    ) -> ReportCheck:
+        start: float = session.started_at
+        end: float = session.stopped_at
+        if arguments.get("from_minute") is not None:
+            start = max(start, session.started_at + arguments["from_minute"] * 60)
+        if arguments.get("to_minute") is not None:
+            end = min(end, session.started_at + arguments["to_minute"] * 60)
+        windows: list[tuple[float, float]] = tracked_windows(session, start, end)
+        tracked: float = sum(window_end - window_start for window_start, window_end in windows)  # fmt: skip
+
+        attendance_rate: float = shelve_utils.get_attendance_rate(GUILD_ID)
+        reported: dict[int, MemberAttendance] = {record.member_id: record for record in attendance_data}  # fmt: skip
+        students: set[int] = set(self.presence.members(session.channel_id)) - shelve_utils.get_instructors(GUILD_ID)  # fmt: skip
+        max_error: float = 0.0
+        mismatched: list[int] = []
+        for member in sorted(students | set(reported)):
+            expected: float = self.presence.seconds(session.channel_id, member, windows) / tracked if tracked else 0.0  # fmt: skip
+            record: Union[MemberAttendance, None] = reported.get(member)
+            ratio: float = record.attendance_ratio if record is not None else 0.0
+            max_error = max(max_error, abs(ratio - expected))
+            if (ratio >= attendance_rate) != (expected >= attendance_rate):
+                mismatched.append(member)
+        return ReportCheck(name, len(attendance_data), max_error, mismatched)
+
+
+def synthetic_trace(args: argparse.Namespace) -> Iterator[dict[str, Any]]:
+    """One class in one channel: students trickle in, some step out for a while, some leave early"""
+    rng: random.Random = random.Random(args.seed)
+    began_at: float = time.time()
+    class_start: float = began_at + 60
+    class_end: float = class_start + args.hours * 3600
+
+    settings: BotSettings = BotSettings(
+        instructors={INSTRUCTOR_ID},
+        snapshot_interval=args.interval,
+        tracking_mode=args.tracking_mode,
+    )
+    events: list[dict[str, Any]] = [
+        {"event": "settings", "at": began_at, "guild": GUILD_ID, "settings": settings_payload(settings)},  # fmt: skip
+        {"event": "channels", "at": began_at, "channels": {str(CHANNEL_ID): {"name": "classroom", "members": []}}},  # fmt: skip
+        {"event": "voice", "at": began_at + 30, "member": INSTRUCTOR_ID, "before": None, "after": CHANNEL_ID},  # fmt: skip
+        {"event": "command", "at": class_start, "command": "attendance start", "user": INSTRUCTOR_ID, "options": {"channel": {"channel": CHANNEL_ID}}},  # fmt: skip
+        {"event": "command", "at": class_end, "command": "attendance stop", "user": INSTRUCTOR_ID, "options": {"channel": {"channel": CHANNEL_ID}}},  # fmt: skip
+        {"event": "command", "at": class_end + 30, "command": "attendance get", "user": INSTRUCTOR_ID, "options": {"channel": {"channel": CHANNEL_ID}}},  # fmt: skip
+        {"event": "voice", "at": class_end + 90, "member": INSTRUCTOR_ID, "before": CHANNEL_ID, "after": None},  # fmt: skip
+    ]
+    if args.tracking_mode == TrackingMode.POLLING.value:
+        # Reports over part of a session are only available for polling sessions
+        events.append({"event": "command", "at": class_end + 60, "command": "attendance get", "user": INSTRUCTOR_ID, "options": {"channel": {"channel": CHANNEL_ID}, "from_minute": 0, "to_minute": 60}})  # fmt: skip
+
+    for student in range(1_000, 1_000 + args.members):
+        joined_at: float = class_start + rng.uniform(-300, 900 if rng.random() < 0.8 else 2700)  # fmt: skip
+        leaves_at: float = class_end - (rng.uniform(0, 3600) if rng.random() < 0.15 else -rng.uniform(0, 60))  # fmt: skip
+        while joined_at < leaves_at:
+            left_at: float = min(joined_at + rng.expovariate(args.breaks_per_hour / 3600), leaves_at)  # fmt: skip
+            events.append({"event": "voice", "at": joined_at, "member": student, "before": None, "after": CHANNEL_ID})  # fmt: skip
+            events.append({"event": "voice", "at": left_at, "member": student, "before": CHANNEL_ID, "after": None})  # fmt: skip
+            joined_at = left_at + rng.uniform(60, 1200)
+
+    return iter(sorted(events, key=lambda event: event["at"]))
+
+
+async def replay(
+    events: list[dict[str, Any]],
+    backend: StorageBackendType,
+    durability: SnapshotDurability,
+) -> Replay:
+    # Simulated time starts at the trace's first event
+    loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+    origin: float = events[0]["at"] - loop.time()
+    clock.set_source(lambda: origin + loop.time())
+    utcnow: Callable[[], datetime] = discord.utils.utcnow
+    discord.utils.utcnow = lambda: datetime.fromtimestamp(clock.now(), timezone.utc)
+
+    shelve_utils.open_storage(backend, durability)
+    await shelve_utils.load_settings(GUILD_ID)
+    client: FakeClient = FakeClient()
+    cog: AttendanceCommandsCog = AttendanceCommandsCog(client)
+    await cog.cog_load()
+    replayer: Replay = Replay(cog, client)
+    try:
+        for event in events:
+            await asyncio.sleep(max(event["at"] - clock.now(), 0.0))
+            await replayer.apply(event)
+    finally:
+        await cog.cog_unload()
+        await shelve_utils.close_storage()
+        discord.utils.utcnow = utcnow
+        clock.set_source(None)
+    return replayer
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("trace", nargs="?", help="A trace recorded with TRACE_FILE")
+    parser.add_argument("--synthetic", action="store_true", help="Replay a generated class instead")  # fmt: skip
+    parser.add_argument("--save", help="Write the generated trace to this file")
+    parser.add_argument("--hours", type=float, default=8.0)
+    parser.add_argument("--members", type=int, default=40)
+    parser.add_argument("--interval", type=int, default=3)
+    parser.add_argument("--breaks-per-hour", type=float, default=0.5)
+    parser.add_argument("--tracking-mode", choices=[mode.value for mode in TrackingMode], default=TrackingMode.POLLING.value)  # fmt: skip
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backend", choices=[backend.value for backend in StorageBackendType], default=StorageBackendType.SHELVE.value)  # fmt: skip
+    parser.add_argument("--durability", choices=[durability.value for durability in SnapshotDurability], default=SnapshotDurability.BATCHED.value)  # fmt: skip
+    parser.add_argument("--show-reports", action="store_true")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+    if not args.synthetic and not args.trace:
+        parser.error("give a trace file or --synthetic")
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+
+    if args.synthetic:
+        events: list[dict[str, Any]] = list(synthetic_trace(args))
+        if args.save:
+            with open(args.save, "w") as file:
+                file.writelines(json.dumps(event) + "\n" for event in events)
+    else:
+        events: list[dict[str, Any]] = list(read_trace(args.trace))
+    if not events:
+        parser.error("the trace is empty")
+
+    working_directory: str = os.getcwd()
+    loop: SimulatedTimeLoop = SimulatedTimeLoop()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            started_at: float = time.perf_counter()
+            replayer: Replay = loop.run_until_complete(
+                replay(events, StorageBackendType(args.backend), SnapshotDurability(args.durability))  # fmt: skip
+            )
+            duration: float = time.perf_counter() - started_at
+        finally:
+            os.chdir(working_directory)
+            loop.close()
+
+    simulated: float = events[-1]["at"] - events[0]["at"]
+    print(f"Replayed {replayer.replayed} events, {simulated / 3600:.2f} hours in {duration:.2f} seconds ({simulated / max(duration, 1e-9):,.0f}x)")  # fmt: skip
+    for name, count in sorted(replayer.skipped.items()):
+        print(f"  skipped {count} `{name}` command(s), not an attendance command")
+
+    print(f"\n{'command':<22}{'calls':>6}{'mean ms':>10}{'max ms':>10}")
+    for name, timings in sorted(replayer.timings.items()):
+        print(f"{name:<22}{len(timings):>6}{sum(timings) / len(timings) * 1_000:>10.1f}{max(timings) * 1_000:>10.1f}")  # fmt: skip
+
+    print(f"\n{'report':<22}{'class':>6}{'max error':>11}  mismatched at the attendance rate")  # fmt: skip
+    for check in replayer.checks:
+        print(f"{check.command:<22}{check.class_size:>6}{check.max_error:>11.2%}  {', '.join(map(str, check.mismatched)) or '-'}")  # fmt: skip
+
+    if args.show_reports:
+        for header in replayer.reports:
+            print(f"\n{header.title}{header.description}")
+
+
+if __name__ == "__main__":
+    main()
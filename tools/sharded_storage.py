@@ -0,0 +1,298 @@
+"""Run the storage service with several shard processes against it, locally, and check what each shard sees
+
+Starts `cogs.storage.service` in a temporary directory, then `--shards` processes
+that each serve the guilds `cogs.utils.sharding` assigns to their shard out of
+`--guilds`. Every shard adds an instructor and sets an attendance rate in each
+of its guilds, runs polling sessions in them through `shelve_utils`
+(`--sessions-per-guild` at once, snapshots pipelined) and archives them. Then it
+checks:
+
+- its guilds only have its own instructor and attendance rate
+- it can't read the settings or the snapshots of a guild it doesn't serve
+- it can't make database-wide calls like `compact` or `drop_archived_sessions`
+- a member's history only has the archived sessions of its own guilds
+- another connection serving its guilds is told to reload their settings when it changes one
+- it only loads its own guilds' sessions, with every snapshot it took
+- another shard clearing all of its sessions leaves this shard's alone
+
+Run from the repo root with `python3 -m tools.sharded_storage`, it exits with 1
+if any check failed.
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from multiprocessing.synchronize import Barrier
+from typing import Any
+
+import cogs.utils.sharding as sharding
+import cogs.utils.shelve_utils as shelve_utils
+from cogs.enums.storage_backend import StorageBackendType
+from cogs.storage.remote import SETTINGS_CHANGED, RemoteStorage, StorageServiceError
+from cogs.enums.tracking_mode import TrackingMode
+from cogs.utils.bot_settings import BotSettings
+from cogs.utils.session_archive import ArchivedSession
+from cogs.utils.sessions import AttendanceSession
+
+INSTRUCTOR_ID: int = 10_000
+SETTINGS_TIMEOUT_SECONDS: float = 5.0
+
+
+def guild_ids(num_guilds: int) -> list[int]:
+    """Snowflake-shaped ids, spread over shards the way Discord spreads guilds"""
+    return [(index << 22) + index for index in range(1, num_guilds + 1)]
+
+
+def channel_id(guild_id: int, index: int) -> int:
+    return guild_id * 100 + index
+
+
+def attendance_rate(guild_id: int) -> float:
+    return (guild_id % 97) / 100
+
+
+async def check_settings_events(
+    socket_path: str, served: list[int], failures: list[str]
+) -> None:
+    """Change a setting in each guild and wait for a second connection serving them to hear about it"""
+    changed: set[int] = set()
+    listener: RemoteStorage = RemoteStorage(
+        socket_path,
+        served,
+        on_event=lambda event, guild_id: changed.add(guild_id) if event == SETTINGS_CHANGED else None,  # fmt: skip
+    )
+    await listener.call("size")  # Connects, and says which guilds it serves
+    for guild_id in served:
+        await shelve_utils.set_snapshot_interval(guild_id, shelve_utils.get_snapshot_interval(guild_id))  # fmt: skip
+
+    deadline: float = time.monotonic() + SETTINGS_TIMEOUT_SECONDS
+    while changed != set(served):
+        if time.monotonic() > deadline:
+            failures.append(f"another connection was only told about settings changes in {sorted(changed)}")  # fmt: skip
+            break
+        await asyncio.sleep(0.05)
+    await listener.close()
+
+
+async def check_isolation(
+    others: list[int],
+    sessions: dict[int, AttendanceSession],
+    member_id: int,
+    failures: list[str],
+) -> None:
+    """Check the service keeps this shard to its own guilds' settings, sessions and archive"""
+    if others:
+        try:
+            await shelve_utils.load_settings(others[0])
+            failures.append(f"read the settings of guild {others[0]} it doesn't serve")
+        except StorageServiceError:
+            pass
+        try:
+            await shelve_utils.get_snapshot_times(channel_id(others[0], 0))
+            failures.append(f"read the snapshots of guild {others[0]} it doesn't serve")
+        except StorageServiceError:
+            pass
+    for call in (shelve_utils.compact_storage(), shelve_utils.drop_archived_sessions(time.time())):  # fmt: skip
+        try:
+            await call
+            failures.append(f"made the database-wide call {call.__name__}")
+        except StorageServiceError:
+            pass
+    history_guilds: list[int] = [entry.session.guild_id for entry in await shelve_utils.get_member_history(member_id)]  # fmt: skip
+    if sorted(history_guilds) != sorted(session.guild_id for session in sessions.values()):  # fmt: skip
+        failures.append(f"member history has sessions of guilds {sorted(set(history_guilds))}")  # fmt: skip
+
+
+async def run_shard(
+    shard_id: int, socket_path: str, barrier: Barrier, args: argparse.Namespace
+) -> dict[str, Any]:
+    served: list[int] = sharding.served_guild_ids()
+    shelve_utils.connect_storage(socket_path, served)
+    for guild_id in served:
+        await shelve_utils.load_settings(guild_id)
+        await shelve_utils.add_instructor(guild_id, INSTRUCTOR_ID + shard_id)
+        await shelve_utils.set_attendace_rate(guild_id, attendance_rate(guild_id))
+
+    started_at: float = time.time()
+    sessions: dict[int, AttendanceSession] = {
+        channel_id(guild_id, index): AttendanceSession(
+            channel_id=channel_id(guild_id, index),
+            snapshot_interval=args.interval,
+            tracking_mode=TrackingMode.POLLING,
+            guild_id=guild_id,
+            is_running=True,
+            started_at=started_at,
+            archive_id=channel_id(guild_id, index),
+        )
+        for guild_id in served
+        for index in range(args.sessions_per_guild)
+    }
+    await shelve_utils.save_sessions(sessions)
+
+    start: float = time.perf_counter()
+    members: list[int] = list(range(args.members))
+    for snapshot in range(args.snapshots):
+        taken_at: float = started_at + snapshot * args.interval
+        await asyncio.gather(*(shelve_utils.take_member_snapshot(session_id, members, taken_at) for session_id in sessions))  # fmt: skip
+        if snapshot % args.checkpoint_every == 0:
+            await shelve_utils.save_sessions(sessions)
+    await shelve_utils.persist_snapshots()
+    snapshot_seconds: float = time.perf_counter() - start
+
+    for session in sessions.values():
+        session.is_running = False
+        session.stopped_at = started_at + args.snapshots * args.interval
+        await shelve_utils.archive_session(
+            ArchivedSession(
+                archive_id=session.archive_id,
+                channel_id=session.channel_id,
+                started_at=session.started_at,
+                ended_at=session.stopped_at,
+                tracking_mode=session.tracking_mode.value,
+                snapshot_interval=session.snapshot_interval,
+                minimum_attendance_rate=0.5,
+                class_size=len(members),
+                guild_id=session.guild_id,
+            ),
+            {member: (1.0, True) for member in members},
+        )
+    await shelve_utils.save_sessions(sessions)
+
+    loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+    failures: list[str] = []
+    await loop.run_in_executor(None, barrier.wait)
+
+    for guild_id in served:
+        settings: BotSettings = await shelve_utils.load_settings(guild_id)
+        if settings.instructors != {INSTRUCTOR_ID + shard_id}:
+            failures.append(f"guild {guild_id} has instructors {sorted(settings.instructors)}")  # fmt: skip
+        if settings.minimum_attendance_rate != attendance_rate(guild_id):
+            failures.append(f"guild {guild_id} has attendance rate {settings.minimum_attendance_rate}")  # fmt: skip
+    others: list[int] = [guild_id for guild_id in guild_ids(args.guilds) if guild_id not in served]  # fmt: skip
+    await check_isolation(others, sessions, members[0], failures)
+    await check_settings_events(socket_path, served, failures)
+
+    loaded: dict[int, AttendanceSession] = await shelve_utils.get_sessions()
+    if set(loaded) != set(sessions):
+        failures.append(f"loaded {len(loaded)} sessions instead of its {len(sessions)}")  # fmt: skip
+    for session_id in sessions:
+        num_snapshots: int = len(await shelve_utils.get_snapshot_times(session_id))
+        if num_snapshots != args.snapshots:
+            failures.append(f"session {session_id} has {num_snapshots} snapshots instead of {args.snapshots}")  # fmt: skip
+
+    # The first shard clears everything it has, nobody else's sessions may go with it
+    await loop.run_in_executor(None, barrier.wait)
+    if shard_id == 0:
+        await shelve_utils.clear_all_sessions()
+    await loop.run_in_executor(None, barrier.wait)
+    if shard_id != 0 and set(await shelve_utils.get_sessions()) != set(sessions):
+        failures.append("lost sessions when another shard cleared its own")
+
+    await shelve_utils.close_storage()
+    return {
+        "guilds": len(served),
+        "sessions": len(sessions),
+        "snapshot_seconds": snapshot_seconds,
+        "failures": failures,
+    }
+
+
+def shard_process(
+    shard_id: int,
+    socket_path: str,
+    barrier: Barrier,
+    results: multiprocessing.Queue,
+    args: argparse.Namespace,
+) -> None:
+    os.environ["GUILD_IDS"] = ",".join(map(str, guild_ids(args.guilds)))
+    os.environ["SHARD_COUNT"] = str(args.shards)
+    os.environ["SHARD_IDS"] = str(shard_id)
+    try:
+        result: dict[str, Any] = asyncio.run(run_shard(shard_id, socket_path, barrier, args))  # fmt: skip
+    except Exception as error:
+        result = {"guilds": 0, "sessions": 0, "snapshot_seconds": 0.0, "failures": [repr(error)]}  # fmt: skip
+        barrier.abort()
+    results.put((shard_id, result))
+
+
+def wait_for_socket(path: str, service: subprocess.Popen) -> None:
+    while not os.path.exists(path):
+        if service.poll() is not None:
+            raise RuntimeError("The storage service exited before it started listening")
+        time.sleep(0.05)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--guilds", type=int, default=8)
+    parser.add_argument("--sessions-per-guild", type=int, default=2)
+    parser.add_argument("--members", type=int, default=50)
+    parser.add_argument("--snapshots", type=int, default=200, help="Per session")
+    parser.add_argument("--interval", type=int, default=3)
+    parser.add_argument("--checkpoint-every", type=int, default=20, help="Snapshots between `save_sessions` checkpoints")  # fmt: skip
+    parser.add_argument("--backend", choices=[backend.value for backend in StorageBackendType], default=StorageBackendType.SHELVE.value)  # fmt: skip
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    repo_root: str = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        socket_path: str = os.path.join(directory, "storage.sock")
+        service: subprocess.Popen = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "cogs.storage.service",
+                "--socket",
+                socket_path,
+                "--backend",
+                args.backend,
+            ],  # fmt: skip
+            cwd=directory,
+            env=os.environ
+            | {"PYTHONPATH": repo_root, "GUILD_ID": "", "GUILD_IDS": ""},  # fmt: skip
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        try:
+            wait_for_socket(socket_path, service)
+            barrier: Barrier = context.Barrier(args.shards)
+            results: multiprocessing.Queue = context.Queue()
+            shards: list = [
+                context.Process(
+                    target=shard_process,
+                    args=(shard_id, socket_path, barrier, results, args),
+                )  # fmt: skip
+                for shard_id in range(args.shards)
+            ]
+            for shard in shards:
+                shard.start()
+            shard_results: dict[int, dict[str, Any]] = dict(results.get() for _ in shards)  # fmt: skip
+            for shard in shards:
+                shard.join()
+        finally:
+            service.send_signal(signal.SIGINT)
+            _, service_log = service.communicate()
+
+    print(f"{args.shards} shards, {args.guilds} guilds, {args.sessions_per_guild} sessions per guild, {args.snapshots} snapshots each, {args.backend} backend\n")  # fmt: skip
+    print(f"{'shard':<7}{'guilds':>7}{'sessions':>10}{'snapshots/s':>13}  result")
+    failed: bool = False
+    for shard_id, result in sorted(shard_results.items()):
+        rate: float = result["sessions"] * args.snapshots / result["snapshot_seconds"] if result["snapshot_seconds"] else 0.0  # fmt: skip
+        status: str = "; ".join(result["failures"]) or "ok"
+        failed = failed or bool(result["failures"])
+        print(f"{shard_id:<7}{result['guilds']:>7}{result['sessions']:>10}{rate:>13.0f}  {status}")  # fmt: skip
+    for line in service_log.splitlines():
+        if "Answered" in line:
+            print(f"\n{line[line.index('Answered'):]}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()